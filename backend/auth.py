@@ -1,14 +1,18 @@
-from fastapi import Depends, HTTPException, status, APIRouter
+from fastapi import Depends, HTTPException, Request, status, APIRouter
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel, constr
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Callable, Optional, List, Dict, Any, Tuple
 from motor.motor_asyncio import AsyncIOMotorClient
 from .utils import api_response
 from .security import generate_csrf_token
+import asyncio
 import os
+import threading
+import time
 import uuid
 from dotenv import load_dotenv
 
@@ -20,9 +24,19 @@ SECRET_KEY = os.environ.get("SECRET_KEY", "your-secret-key-here-change-in-produc
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
 
+# Verified principals are cached per token to skip the users lookup.
+# A TTL of 0 disables the cache.
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX = int(os.environ.get("AUTH_CACHE_MAX", "10000"))
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt runs in a bounded worker pool so logins never block the event loop
+HASH_WORKERS = int(os.environ.get("AUTH_HASH_WORKERS", "2"))
+HASH_QUEUE_MAX = int(os.environ.get("AUTH_HASH_QUEUE_MAX", "32"))
+HASH_PER_IP = int(os.environ.get("AUTH_HASH_PER_IP", "2"))
+
 # Token URL
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
@@ -67,17 +81,143 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+
+_hash_pool: Optional[ThreadPoolExecutor] = None
+_hash_lock = threading.Lock()
+_hash_inflight_by_ip: Dict[str, int] = {}
+hash_metrics: Dict[str, float] = {
+    "queued": 0,
+    "running": 0,
+    "completed": 0,
+    "rejected_queue_full": 0,
+    "rejected_per_ip": 0,
+    "wait_ms_total": 0.0,
+    "wait_ms_max": 0.0,
+}
+
+
+def _get_hash_pool() -> ThreadPoolExecutor:
+    """Return the shared password hashing pool."""
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ThreadPoolExecutor(
+            max_workers=HASH_WORKERS, thread_name_prefix="pwd-hash"
+        )
+    return _hash_pool
+
+
+async def _run_hash(fn: Callable[..., Any], *args: Any, client_ip: Optional[str] = None) -> Any:
+    """Run a password hashing call in the pool, enforcing queue and per-IP limits."""
+    with _hash_lock:
+        if hash_metrics["queued"] + hash_metrics["running"] >= HASH_QUEUE_MAX:
+            hash_metrics["rejected_queue_full"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service busy, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        if client_ip is not None:
+            if _hash_inflight_by_ip.get(client_ip, 0) >= HASH_PER_IP:
+                hash_metrics["rejected_per_ip"] += 1
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many concurrent authentication attempts",
+                    headers={"Retry-After": "1"},
+                )
+            _hash_inflight_by_ip[client_ip] = _hash_inflight_by_ip.get(client_ip, 0) + 1
+        hash_metrics["queued"] += 1
+    enqueued = time.perf_counter()
+    # "started" or "abandoned", whichever happens first; an abandoned job
+    # (the request was cancelled while queued) gives back its queue slot
+    state: Dict[str, str] = {}
+
+    def job() -> Any:
+        waited = (time.perf_counter() - enqueued) * 1000
+        with _hash_lock:
+            if state.setdefault("status", "started") == "abandoned":
+                return None
+            hash_metrics["queued"] -= 1
+            hash_metrics["running"] += 1
+            hash_metrics["wait_ms_total"] += waited
+            hash_metrics["wait_ms_max"] = max(hash_metrics["wait_ms_max"], waited)
+        try:
+            return fn(*args)
+        finally:
+            with _hash_lock:
+                hash_metrics["running"] -= 1
+                hash_metrics["completed"] += 1
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_hash_pool(), job)
+    finally:
+        with _hash_lock:
+            if state.setdefault("status", "abandoned") == "abandoned":
+                hash_metrics["queued"] -= 1
+        if client_ip is not None:
+            with _hash_lock:
+                remaining = _hash_inflight_by_ip.get(client_ip, 1) - 1
+                if remaining > 0:
+                    _hash_inflight_by_ip[client_ip] = remaining
+                else:
+                    _hash_inflight_by_ip.pop(client_ip, None)
+
+
+async def averify_password(plain_password, hashed_password, client_ip: Optional[str] = None):
+    return await _run_hash(verify_password, plain_password, hashed_password, client_ip=client_ip)
+
+
+async def aget_password_hash(password, client_ip: Optional[str] = None):
+    return await _run_hash(get_password_hash, password, client_ip=client_ip)
+
 async def get_user(username: str):
     user = await db.users.find_one({"username": username})
     if user:
         return UserInDB(**user)
     return None
 
-async def authenticate_user(username: str, password: str):
+# token key -> (expiry on the monotonic clock, user)
+_PRINCIPAL_CACHE: Dict[str, Tuple[float, UserInDB]] = {}
+
+
+def _token_cache_key(payload: Dict[str, Any]) -> Optional[str]:
+    """Return the cache key for a decoded token (``jti`` or ``sub`` + ``iat``)."""
+    if payload.get("jti"):
+        return str(payload["jti"])
+    if payload.get("iat") is not None:
+        return f"{payload.get('sub')}:{payload['iat']}"
+    return None
+
+
+def _cache_principal(key: str, user: UserInDB, payload: Dict[str, Any]) -> None:
+    expires = time.monotonic() + AUTH_CACHE_TTL
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        # Never keep a principal around longer than its token is valid
+        expires = min(expires, time.monotonic() + exp - time.time())
+    if len(_PRINCIPAL_CACHE) >= AUTH_CACHE_MAX:
+        _PRINCIPAL_CACHE.pop(next(iter(_PRINCIPAL_CACHE)))
+    _PRINCIPAL_CACHE[key] = (expires, user)
+
+
+def invalidate_user_cache(username: Optional[str] = None, user_id: Optional[str] = None) -> None:
+    """Drop cached principals for a user, or every entry when no user is given."""
+    if username is None and user_id is None:
+        _PRINCIPAL_CACHE.clear()
+        return
+    stale = [
+        key
+        for key, (_, user) in _PRINCIPAL_CACHE.items()
+        if user.username == username or user.id == user_id
+    ]
+    for key in stale:
+        _PRINCIPAL_CACHE.pop(key, None)
+
+
+async def authenticate_user(username: str, password: str, client_ip: Optional[str] = None):
     user = await get_user(username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await averify_password(password, user.hashed_password, client_ip=client_ip):
         return False
     return user
 
@@ -88,6 +228,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    to_encode.setdefault("iat", datetime.utcnow())
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -105,19 +247,40 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
+    key = _token_cache_key(payload) if AUTH_CACHE_TTL > 0 else None
+    if key is not None:
+        cached = _PRINCIPAL_CACHE.get(key)
+        if cached and cached[0] > time.monotonic() and cached[1].username == username:
+            return cached[1]
     user = await get_user(username=token_data.username)
     if user is None:
         raise credentials_exception
+    if key is not None:
+        _cache_principal(key, user, payload)
     return user
 
+def token_subject(authorization: Optional[str]) -> Optional[str]:
+    """Return the ``sub`` of a valid bearer token without a database lookup."""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization[7:].strip(), SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
 async def get_current_active_user(current_user: UserInDB = Depends(get_current_user)):
     return current_user
 
 # Create router
 auth_router = APIRouter(prefix="/api/auth", tags=["auth"])
 
+def _client_ip(request: Request) -> Optional[str]:
+    return request.client.host if request.client else None
+
+
 @auth_router.post("/register", response_model=UserPublic)
-async def register_user(user_create: UserCreate):
+async def register_user(user_create: UserCreate, request: Request):
     # Check if username already exists
     existing_user = await get_user(user_create.username)
     if existing_user:
@@ -128,7 +291,9 @@ async def register_user(user_create: UserCreate):
     
     # Create new user
     user_id = str(uuid.uuid4())
-    hashed_password = get_password_hash(user_create.password)
+    hashed_password = await aget_password_hash(
+        user_create.password, client_ip=_client_ip(request)
+    )
     
     user_in_db = UserInDB(
         id=user_id,
@@ -149,8 +314,12 @@ async def register_user(user_create: UserCreate):
     ))
 
 @auth_router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = await authenticate_user(form_data.username, form_data.password)
+async def login_for_access_token(
+    request: Request, form_data: OAuth2PasswordRequestForm = Depends()
+):
+    user = await authenticate_user(
+        form_data.username, form_data.password, client_ip=_client_ip(request)
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -195,6 +364,18 @@ async def refresh_access_token(current_user: UserInDB = Depends(get_current_acti
         }
     )
 
+@auth_router.get("/hash-metrics")
+async def password_hash_metrics():
+    """Expose queue depth and wait times of the password hashing pool."""
+    with _hash_lock:
+        metrics = dict(hash_metrics)
+    completed = metrics["completed"] or 1
+    metrics["wait_ms_avg"] = round(metrics["wait_ms_total"] / completed, 2)
+    metrics["workers"] = HASH_WORKERS
+    metrics["queue_max"] = HASH_QUEUE_MAX
+    return api_response(metrics)
+
+
 @auth_router.get("/me", response_model=UserPublic)
 async def read_users_me(current_user: UserInDB = Depends(get_current_active_user)):
     return api_response(UserPublic(
@@ -214,6 +395,7 @@ async def update_user_preferences(
         {"id": current_user.id},
         {"$set": {"preferences": preferences}}
     )
+    invalidate_user_cache(user_id=current_user.id)
     return api_response({"message": "Preferences updated successfully"})
 
 @auth_router.get("/preferences")
@@ -221,5 +403,5 @@ async def get_user_preferences(
     current_user: UserInDB = Depends(get_current_active_user)
 ):
     """Get user preferences"""
-    user = await db.users.find_one({"id": current_user.id})
+    user = await db.users.find_one({"id": current_user.id}, {"preferences": 1})
     return api_response({"preferences": user.get("preferences", {})})
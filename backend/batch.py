@@ -0,0 +1,128 @@
+"""Expansion of batch generation requests into individual jobs."""
+
+from __future__ import annotations
+
+import itertools
+import os
+import secrets
+import shlex
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+BATCH_MAX_JOBS = int(os.environ.get("CJ_BATCH_MAX_JOBS", "100"))
+SEED_CODE = "seed"
+
+
+def _code(code: str) -> str:
+    return code.lstrip("-")
+
+
+def compose_prompt(clean_prompt: str, params: Dict[str, str]) -> str:
+    """Rebuild prompt text from a cleaned prompt and shortcode parameters."""
+    parts = [clean_prompt] if clean_prompt else []
+    for key, value in params.items():
+        parts.append(f"--{key} {shlex.quote(str(value))}")
+    return " ".join(parts)
+
+
+def batch_size(
+    seeds: Sequence[Any],
+    values: Dict[str, Sequence[str]],
+    x_values: Sequence[str] = (),
+    y_values: Sequence[str] = (),
+) -> int:
+    size = max(len(seeds), 1) * max(len(x_values), 1) * max(len(y_values), 1)
+    for options in values.values():
+        size *= max(len(options), 1)
+    return size
+
+
+def expand_batch(
+    params: Dict[str, str],
+    *,
+    seeds: Sequence[int] = (),
+    values: Optional[Dict[str, Sequence[str]]] = None,
+    x_axis: Optional[Tuple[str, Sequence[str]]] = None,
+    y_axis: Optional[Tuple[str, Sequence[str]]] = None,
+) -> List[Dict[str, Any]]:
+    """Expand base shortcode ``params`` into one entry per job.
+
+    Every combination of ``values`` (code -> candidate values), the X/Y axis
+    values and ``seeds`` becomes a job. Each entry carries the merged
+    ``params``, the ``variation`` applied on top of the base prompt and the
+    ``cell`` (x index, y index) it belongs to in the grid. Jobs sharing a
+    variation are adjacent so they run back to back on warm caches.
+    """
+    values = {_code(k): list(v) for k, v in (values or {}).items() if v}
+    x_code, x_values = (_code(x_axis[0]), list(x_axis[1])) if x_axis else (None, [None])
+    y_code, y_values = (_code(y_axis[0]), list(y_axis[1])) if y_axis else (None, [None])
+    codes = list(values)
+    combos = list(itertools.product(*(values[c] for c in codes)))
+    seed_list: List[Optional[int]] = list(seeds) or [None]
+
+    jobs: List[Dict[str, Any]] = []
+    for yi, y_value in enumerate(y_values):
+        for xi, x_value in enumerate(x_values):
+            for combo in combos:
+                for seed in seed_list:
+                    variation: Dict[str, str] = dict(zip(codes, combo))
+                    if x_code is not None:
+                        variation[x_code] = x_value
+                    if y_code is not None:
+                        variation[y_code] = y_value
+                    if seed is not None:
+                        variation[SEED_CODE] = str(seed)
+                    jobs.append(
+                        {
+                            "params": {**params, **variation},
+                            "variation": variation,
+                            "cell": [xi if x_code else None, yi if y_code else None],
+                        }
+                    )
+    return jobs
+
+
+def sweep_seeds(count: int, start: Optional[int] = None) -> List[int]:
+    """Return ``count`` consecutive seeds from ``start``, or random ones."""
+    if start is None:
+        return [secrets.randbelow(2**32) for _ in range(count)]
+    return list(range(start, start + count))
+
+
+def aggregate_progress(batch: Dict[str, Any], jobs: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Summarise the state of every job in ``batch`` for one progress stream."""
+    entries = []
+    total = 0.0
+    completed = 0
+    for job_id in batch["jobs"]:
+        job = jobs.get(job_id) or {"status": "missing", "progress": 100}
+        status = job["status"]
+        progress = job.get("progress", 0)
+        if status in ("done", "cancelled", "failed", "missing"):
+            completed += 1
+        # Cancelled and failed jobs will not progress further; count them as finished
+        total += 100 if status in ("cancelled", "failed") else progress
+        entries.append(
+            {
+                "job_id": job_id,
+                "status": status,
+                "progress": progress,
+                "variation": job.get("variation"),
+                "cell": job.get("cell"),
+            }
+        )
+    count = len(batch["jobs"])
+    if completed == count:
+        status = "done"
+    elif any(e["status"] != "queued" for e in entries):
+        status = "generating"
+    else:
+        status = "queued"
+    return {
+        "batch_id": batch["id"],
+        "status": status,
+        "progress": round(total / count, 1) if count else 100,
+        "completed": completed,
+        "total": count,
+        "axes": batch.get("axes"),
+        "jobs": entries,
+    }
@@ -1,31 +1,78 @@
 import secrets
 import os
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+from http.cookies import SimpleCookie
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import cookie_parser
 from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 CSRF_HEADER = "x-csrf-token"
 CSRF_COOKIE = "csrf_token"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+
+class CSRFMiddleware:
+    """Simple CSRF protection via double-submit cookie.
 
-class CSRFMiddleware(BaseHTTPMiddleware):
-    """Simple CSRF protection via double-submit cookie."""
+    Implemented as a plain ASGI middleware so streaming and file responses
+    pass through without the extra task and buffering of
+    ``BaseHTTPMiddleware``.
+    """
 
-    def __init__(self, app, *, cookie_secure: bool = False):
-        super().__init__(app)
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        cookie_secure: bool = False,
+        enabled: Optional[bool] = None,
+        exempt_paths: Tuple[str, ...] = (),
+    ) -> None:
+        self.app = app
         self.cookie_secure = cookie_secure
+        self.exempt_paths = exempt_paths
+        if enabled is None:
+            enabled = os.environ.get("DISABLE_CSRF", "false").lower() != "true"
+        self.enabled = enabled
 
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        cookie = cookie_parser(headers.get("cookie", "")).get(CSRF_COOKIE)
         if (
-            request.method not in ("GET", "HEAD", "OPTIONS", "TRACE")
-            and os.environ.get("DISABLE_CSRF", "false").lower() != "true"
+            self.enabled
+            and scope["method"] not in SAFE_METHODS
+            and scope["path"] not in self.exempt_paths
         ):
-            cookie = request.cookies.get(CSRF_COOKIE)
-            header = request.headers.get(CSRF_HEADER)
-            if not cookie or not header or cookie != header:
-                return Response(status_code=400, content="Invalid CSRF token")
-        response = await call_next(request)
+            header = headers.get(CSRF_HEADER)
+            if not cookie or not header or not secrets.compare_digest(cookie.encode("utf-8"), header.encode("utf-8")):
+                response = Response(status_code=400, content="Invalid CSRF token")
+                await response(scope, receive, send)
+                return
+
+        if cookie:
+            await self.app(scope, receive, send)
+            return
+
         # Set token if missing
-        if CSRF_COOKIE not in request.cookies:
-            token = secrets.token_urlsafe(16)
-            response.set_cookie(CSRF_COOKIE, token, secure=self.cookie_secure, httponly=False)
-        return response
+        set_cookie = self._cookie_header(secrets.token_urlsafe(16))
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("set-cookie", set_cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+    def _cookie_header(self, token: str) -> str:
+        cookie: SimpleCookie = SimpleCookie()
+        cookie[CSRF_COOKIE] = token
+        cookie[CSRF_COOKIE]["path"] = "/"
+        cookie[CSRF_COOKIE]["samesite"] = "lax"
+        if self.cookie_secure:
+            cookie[CSRF_COOKIE]["secure"] = True
+        return cookie.output(header="").strip()
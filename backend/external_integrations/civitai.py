@@ -35,6 +35,18 @@ if CACHE_DIR:
 # In-memory cache
 _CACHE: Dict[str, Tuple[float, Any]] = {}
 _last_request_time = 0.0
+# Cache and throttle shared with other worker processes, if any
+_SHARED: Optional[Any] = None
+
+
+def use_shared_state(state: Any) -> None:
+    """Share the response cache and request throttle through ``state``.
+
+    ``state`` is a :class:`backend.shared_state.SharedState`; ``None``
+    goes back to per-process caching.
+    """
+    global _SHARED
+    _SHARED = state
 
 
 def _cache_key(path: str, params: Optional[Dict[str, Any]], api_key: Optional[str]) -> str:
@@ -74,8 +86,14 @@ async def fetch_json(
                 data = json.load(fh)
             _CACHE[key] = (now, data)
             return data
-
-    wait = MIN_INTERVAL - (now - _last_request_time)
+    if _SHARED is not None:
+        data = await _SHARED.cache_get(key, CACHE_TTL)
+        if data is not None:
+            _CACHE[key] = (now, data)
+            return data
+        wait = await _SHARED.reserve("civitai", MIN_INTERVAL)
+    else:
+        wait = MIN_INTERVAL - (now - _last_request_time)
     if wait > 0:
         await asyncio.sleep(wait)
 
@@ -96,6 +114,8 @@ async def fetch_json(
 
     _last_request_time = time.monotonic()
     _CACHE[key] = (now, data)
+    if _SHARED is not None:
+        await _SHARED.cache_set(key, data)
     if CACHE_DIR:
         cache_file = os.path.join(CACHE_DIR, hashlib.sha256(key.encode()).hexdigest() + ".json")
         try:
@@ -113,4 +133,4 @@ async def civitai_get(
     return await fetch_json(endpoint, params=params)
 
 
-__all__ = ["fetch_json", "civitai_get"]
+__all__ = ["fetch_json", "civitai_get", "use_shared_state"]
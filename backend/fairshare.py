@@ -0,0 +1,237 @@
+"""Per-user weighted fair-share admission in front of ComfyUI submission."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+# Jobs admitted past the fair queue at once, per ComfyUI instance. Admitted
+# jobs wait in the per-instance cache-affinity queue, which bounds how many
+# are actually in flight on the GPU.
+ADMIT_PER_INSTANCE = int(os.environ.get("CJ_ADMIT_PER_INSTANCE", "4"))
+# Admitted jobs a single user may hold at once
+USER_MAX_ACTIVE = int(os.environ.get("CJ_USER_MAX_ACTIVE", "2"))
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse ``"alice=2,bob=0.5"`` into a weight per user."""
+    weights: Dict[str, float] = {}
+    for item in spec.split(","):
+        user, _, weight = item.partition("=")
+        if user.strip() and weight.strip():
+            weights[user.strip()] = float(weight)
+    return weights
+
+
+USER_WEIGHTS = parse_weights(os.environ.get("CJ_USER_WEIGHTS", ""))
+
+
+class JobCancelled(Exception):
+    """Raised in a waiting job when it is cancelled before admission."""
+
+
+class _Waiter:
+    __slots__ = ("job_id", "user", "cost", "priority", "seq", "future")
+
+    def __init__(self, job_id: str, user: str, cost: float, priority: int, seq: int, future: asyncio.Future) -> None:
+        self.job_id = job_id
+        self.user = user
+        self.cost = cost
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+
+    def sort_key(self) -> Tuple[int, int]:
+        return (-self.priority, self.seq)
+
+
+class _Flow:
+    __slots__ = ("queue", "finish", "active")
+
+    def __init__(self) -> None:
+        self.queue: List[_Waiter] = []
+        self.finish = 0.0
+        self.active: List[_Waiter] = []
+
+
+class FairShareQueue:
+    """Start-time fair queuing across users with per-user caps.
+
+    Each user is a flow with its own queue, ordered by priority then
+    arrival. When capacity frees up, the backlogged user with the smallest
+    start tag ``max(virtual_time, user_finish)`` is admitted next and its
+    finish tag advances by ``cost / weight``, so over time users receive
+    admissions in proportion to their weights no matter how many jobs each
+    one queues.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        user_cap: int = USER_MAX_ACTIVE,
+        weights: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.capacity = max(1, capacity)
+        self.user_cap = max(1, user_cap)
+        self.weights = dict(USER_WEIGHTS if weights is None else weights)
+        self._flows: Dict[str, _Flow] = {}
+        self._where: Dict[str, _Waiter] = {}
+        self._admitted = 0
+        self._vtime = 0.0
+        self._seq = 0
+        self.stats = {"admitted": 0, "cancelled": 0}
+
+    def weight(self, user: str) -> float:
+        return max(self.weights.get(user, 1.0), 1e-6)
+
+    @asynccontextmanager
+    async def slot(
+        self, job_id: str, user: str, cost: float = 1.0, priority: int = 0
+    ) -> AsyncIterator[None]:
+        """Wait until the job is admitted; raises :class:`JobCancelled`."""
+        self._seq += 1
+        waiter = _Waiter(job_id, user, cost, priority, self._seq, asyncio.get_running_loop().create_future())
+        flow = self._flows.setdefault(user, _Flow())
+        flow.queue.append(waiter)
+        flow.queue.sort(key=_Waiter.sort_key)
+        self._where[job_id] = waiter
+        self._dispatch()
+        try:
+            await waiter.future
+        except BaseException:
+            if waiter in flow.queue:
+                flow.queue.remove(waiter)
+                self._where.pop(job_id, None)
+            elif waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                self._release(waiter)
+            raise
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    def _release(self, waiter: _Waiter) -> None:
+        flow = self._flows.get(waiter.user)
+        if flow is not None and waiter in flow.active:
+            flow.active.remove(waiter)
+            self._admitted -= 1
+        self._where.pop(waiter.job_id, None)
+        self._dispatch()
+
+    def _prune(self) -> None:
+        # Admissions held by jobs whose event loop is gone are never released
+        for flow in self._flows.values():
+            stale = [w for w in flow.active if w.future.get_loop().is_closed()]
+            for waiter in stale:
+                flow.active.remove(waiter)
+                self._where.pop(waiter.job_id, None)
+                self._admitted -= 1
+            for waiter in [w for w in flow.queue if w.future.get_loop().is_closed()]:
+                flow.queue.remove(waiter)
+                self._where.pop(waiter.job_id, None)
+
+    def _dispatch(self) -> None:
+        self._prune()
+        while self._admitted < self.capacity:
+            candidates = [
+                (max(self._vtime, flow.finish), flow.queue[0].seq, user)
+                for user, flow in self._flows.items()
+                if flow.queue and len(flow.active) < self.user_cap
+            ]
+            if not candidates:
+                break
+            start, _, user = min(candidates)
+            flow = self._flows[user]
+            waiter = flow.queue.pop(0)
+            self._vtime = start
+            flow.finish = start + waiter.cost / self.weight(user)
+            flow.active.append(waiter)
+            self._admitted += 1
+            self.stats["admitted"] += 1
+            _resolve(waiter.future, None)
+        # Forget idle users so the table does not grow without bound
+        for user in [u for u, f in self._flows.items() if not f.queue and not f.active]:
+            if self._flows[user].finish <= self._vtime:
+                del self._flows[user]
+
+    # -- management API -----------------------------------------------------
+
+    def cancel(self, job_id: str) -> bool:
+        """Drop a job that has not been admitted yet; False if it was."""
+        waiter = self._where.get(job_id)
+        flow = self._flows.get(waiter.user) if waiter else None
+        if waiter is None or flow is None or waiter not in flow.queue:
+            return False
+        flow.queue.remove(waiter)
+        self._where.pop(job_id, None)
+        self.stats["cancelled"] += 1
+        _resolve(waiter.future, JobCancelled(job_id))
+        return True
+
+    def reprioritize(self, job_id: str, priority: int) -> bool:
+        """Move a waiting job within its user's queue; False if not waiting."""
+        waiter = self._where.get(job_id)
+        flow = self._flows.get(waiter.user) if waiter else None
+        if waiter is None or flow is None or waiter not in flow.queue:
+            return False
+        waiter.priority = priority
+        flow.queue.sort(key=_Waiter.sort_key)
+        self._dispatch()
+        return True
+
+    def owner(self, job_id: str) -> Optional[str]:
+        waiter = self._where.get(job_id)
+        return waiter.user if waiter else None
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Estimated number of waiting jobs admitted before this one.
+
+        Replays the start tags of every queued job, ignoring per-user caps;
+        ``None`` once the job has been admitted.
+        """
+        waiter = self._where.get(job_id)
+        flow = self._flows.get(waiter.user) if waiter else None
+        if waiter is None or flow is None or waiter not in flow.queue:
+            return None
+        tags = []
+        for user, other in self._flows.items():
+            start = max(self._vtime, other.finish)
+            for queued in other.queue:
+                tags.append((start, queued.seq, queued.job_id))
+                start += queued.cost / self.weight(user)
+        tags.sort()
+        return next(i for i, tag in enumerate(tags) if tag[2] == job_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "active": self._admitted,
+            "user_cap": self.user_cap,
+            "waiting": sum(len(f.queue) for f in self._flows.values()),
+            "users": {
+                user: {
+                    "waiting": len(flow.queue),
+                    "active": len(flow.active),
+                    "weight": self.weight(user),
+                }
+                for user, flow in self._flows.items()
+            },
+            **self.stats,
+        }
+
+
+def _resolve(future: asyncio.Future, exc: Optional[BaseException]) -> None:
+    if future.done() or future.get_loop().is_closed():
+        return
+    setter = future.set_result if exc is None else future.set_exception
+    value = None if exc is None else exc
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if future.get_loop() is running:
+        setter(value)
+    else:
+        future.get_loop().call_soon_threadsafe(setter, value)
@@ -0,0 +1,263 @@
+"""Batched ingestion of browser log events."""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import io
+import json
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .utils import LOG_FRONTEND_PATH, dumps_json
+
+# Lines are appended every FLUSH_INTERVAL seconds or once MAX_LINES are pending
+FLUSH_INTERVAL = float(os.environ.get("CJ_FRONTEND_LOG_FLUSH", "1"))
+MAX_LINES = int(os.environ.get("CJ_FRONTEND_LOG_MAX_LINES", "1000"))
+# Per-client token bucket: sustained events per second and burst size
+RATE = float(os.environ.get("CJ_FRONTEND_LOG_RATE", "20"))
+BURST = float(os.environ.get("CJ_FRONTEND_LOG_BURST", "100"))
+MAX_CLIENTS = 10000
+MAX_BATCH_EVENTS = 500
+MAX_BATCH_BYTES = 1024 * 1024  # after decompression
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for part in spec.split(","):
+        level, _, rate = part.partition("=")
+        if level.strip() and rate.strip():
+            rates[level.strip().lower()] = float(rate)
+    return rates
+
+
+# Fraction of events kept per level; unknown levels use the "info" rate
+SAMPLE_RATES = _parse_rates(os.environ.get("CJ_FRONTEND_LOG_SAMPLE", "error=1,warn=1,info=0.2,debug=0"))
+
+
+class BatchError(ValueError):
+    """Raised for batch bodies that cannot be decoded."""
+
+
+def decode_batch(body: bytes, content_encoding: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Parse a batch body: a JSON list of events or ``{"events": [...]}``.
+
+    gzip bodies are recognised by ``Content-Encoding`` or by their magic
+    bytes (``sendBeacon`` cannot set headers) and are inflated up to
+    ``MAX_BATCH_BYTES``.
+    """
+    if (content_encoding or "").lower() == "gzip" or body[:2] == b"\x1f\x8b":
+        try:
+            with gzip.GzipFile(fileobj=io.BytesIO(body)) as fh:
+                body = fh.read(MAX_BATCH_BYTES + 1)
+        except (OSError, EOFError) as exc:
+            raise BatchError(f"invalid gzip body: {exc}")
+    if len(body) > MAX_BATCH_BYTES:
+        raise BatchError("batch too large")
+    try:
+        data = json.loads(body)
+    except ValueError as exc:
+        raise BatchError(f"invalid JSON: {exc}")
+    if isinstance(data, dict):
+        data = data.get("events")
+    if not isinstance(data, list):
+        raise BatchError("expected a list of events")
+    return [e for e in data[:MAX_BATCH_EVENTS] if isinstance(e, dict)]
+
+
+def _count(value: Any) -> int:
+    """The ``count`` of a client event, treating anything unusable as 1."""
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError, OverflowError):
+        return 1
+
+
+def _encode(entry: Dict[str, Any]) -> Optional[bytes]:
+    """One JSON line, or ``None`` when the entry cannot be serialised at all."""
+    try:
+        return dumps_json(entry) + b"\n"
+    except TypeError:
+        # orjson rejects integers wider than 64 bits, for example
+        try:
+            return json.dumps(entry, default=str).encode("utf-8") + b"\n"
+        except (TypeError, ValueError):
+            return None
+
+
+class TokenBuckets:
+    """Per-client token buckets, least recently seen clients evicted first."""
+
+    def __init__(self, rate: float = RATE, burst: float = BURST, max_clients: int = MAX_CLIENTS) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, client: str, wanted: int) -> int:
+        """Take up to ``wanted`` tokens for ``client``; returns how many were granted."""
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        granted = min(wanted, int(tokens))
+        self._buckets[client] = (tokens - granted, now)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return granted
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class BufferedLogWriter:
+    """Append JSON lines to a file in batches from a background task."""
+
+    def __init__(
+        self, path: str = LOG_FRONTEND_PATH, interval: float = FLUSH_INTERVAL, max_lines: int = MAX_LINES
+    ) -> None:
+        self.path = path
+        self.interval = interval
+        self.max_lines = max_lines
+        self._lines: List[bytes] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"lines": 0, "flushes": 0, "failures": 0, "unencodable": 0}
+
+    def _bind(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._task = None
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._lines:
+                await self.flush()
+
+    async def write(self, entries: List[Dict[str, Any]]) -> None:
+        lines = [_encode(e) for e in entries]
+        self.stats["unencodable"] += lines.count(None)
+        self._lines.extend(line for line in lines if line is not None)
+        self._bind()
+        if self.interval <= 0 or len(self._lines) >= self.max_lines:
+            await self.flush()
+
+    def _append(self, data: bytes) -> None:
+        with open(self.path, "ab") as fh:
+            fh.write(data)
+
+    async def flush(self) -> None:
+        lines, self._lines = self._lines, []
+        if not lines:
+            return
+        try:
+            await asyncio.to_thread(self._append, b"".join(lines))
+        except OSError:
+            self.stats["failures"] += 1
+            logging.exception("Failed to write frontend logs to %s", self.path)
+            return
+        self.stats["lines"] += len(lines)
+        self.stats["flushes"] += 1
+
+    async def stop(self) -> None:
+        if self._task is not None and self._loop is asyncio.get_running_loop():
+            self._task.cancel()
+        self._task = None
+        await self.flush()
+
+    @property
+    def pending(self) -> int:
+        return len(self._lines)
+
+
+class FrontendLogIngest:
+    """Collapse, sample and rate-limit browser events before writing them.
+
+    Repeats of the same level and message within a batch become one entry
+    with a ``count``. Each level is kept at its ``SAMPLE_RATES`` fraction
+    (kept entries carry their ``sample_rate``), and every client gets a
+    token bucket so a browser stuck in an error loop cannot flood the log.
+    """
+
+    def __init__(
+        self,
+        writer: Optional[BufferedLogWriter] = None,
+        limiter: Optional[TokenBuckets] = None,
+        sample_rates: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.writer = BufferedLogWriter() if writer is None else writer
+        self.limiter = TokenBuckets() if limiter is None else limiter
+        self.sample_rates = SAMPLE_RATES if sample_rates is None else sample_rates
+        self.stats = {
+            "batches": 0,
+            "received": 0,
+            "collapsed": 0,
+            "sampled_out": 0,
+            "rate_limited": 0,
+            "written": 0,
+        }
+
+    def _rate(self, level: str) -> float:
+        return self.sample_rates.get(level, self.sample_rates.get("info", 1.0))
+
+    async def ingest(self, client: str, events: List[Dict[str, Any]]) -> Dict[str, int]:
+        self.stats["batches"] += 1
+        self.stats["received"] += len(events)
+        merged: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        for event in events:
+            level = str(event.get("level") or "info").lower()
+            key = (level, str(event.get("message", "")))
+            if key in merged:
+                merged[key]["count"] = merged[key].get("count", 1) + _count(event.get("count", 1))
+            else:
+                merged[key] = dict(event, level=level)
+                if "count" in event:
+                    merged[key]["count"] = _count(event["count"])
+        collapsed = len(events) - len(merged)
+
+        kept = []
+        sampled_out = 0
+        for (level, _), event in merged.items():
+            rate = self._rate(level)
+            if rate < 1 and random.random() >= rate:
+                sampled_out += 1
+                continue
+            if rate < 1:
+                event["sample_rate"] = rate
+            kept.append(event)
+
+        granted = self.limiter.take(client, len(kept))
+        rate_limited = len(kept) - granted
+        now = datetime.utcnow().isoformat()
+        await self.writer.write(
+            # The server-derived client wins over anything the browser sent
+            [{"timestamp": now, "event": {**event, "client": client}} for event in kept[:granted]]
+        )
+        result = {
+            "accepted": granted,
+            "collapsed": collapsed,
+            "sampled_out": sampled_out,
+            "rate_limited": rate_limited,
+        }
+        for name in ("collapsed", "sampled_out", "rate_limited"):
+            self.stats[name] += result[name]
+        self.stats["written"] += granted
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "clients": len(self.limiter),
+            "pending_lines": self.writer.pending,
+            "flushes": self.writer.stats["flushes"],
+            "write_failures": self.writer.stats["failures"],
+            "unencodable": self.writer.stats["unencodable"],
+        }
@@ -0,0 +1,215 @@
+"""Incremental mirror of ComfyUI's ``/history`` into the SQL tables."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import httpx
+from sqlalchemy import select
+
+from .models import AsyncSessionLocal, ImageOutput, Prompt, bulk_insert
+
+HISTORY_SYNC_INTERVAL = float(os.environ.get("CJ_HISTORY_SYNC_INTERVAL", "15"))
+HISTORY_PAGE_SIZE = int(os.environ.get("CJ_HISTORY_PAGE_SIZE", "50"))
+HISTORY_TIMEOUT = float(os.environ.get("CJ_HISTORY_TIMEOUT", "30"))
+# Output kinds ComfyUI lists per node; "temp" previews are not mirrored
+OUTPUT_KEYS = ("images", "gifs", "videos")
+
+
+def prompt_text(entry: Dict[str, Any]) -> str:
+    """Return the first text-encoder prompt of a history entry's graph."""
+    prompt = entry.get("prompt") or []
+    graph = prompt[2] if len(prompt) > 2 and isinstance(prompt[2], dict) else {}
+    for node in graph.values():
+        if not isinstance(node, dict) or "TextEncode" not in str(node.get("class_type")):
+            continue
+        text = (node.get("inputs") or {}).get("text")
+        if isinstance(text, str):
+            return text
+    return ""
+
+
+def executed_at(entry: Dict[str, Any]) -> str:
+    """ISO timestamp of when ComfyUI started executing the entry."""
+    for event, data in (entry.get("status") or {}).get("messages") or []:
+        if event == "execution_start" and isinstance(data, dict) and "timestamp" in data:
+            return datetime.utcfromtimestamp(data["timestamp"] / 1000).isoformat()
+    return datetime.utcnow().isoformat()
+
+
+def output_files(entry: Dict[str, Any]) -> List[str]:
+    """Paths, relative to ComfyUI's output folder, of an entry's saved files."""
+    files = []
+    for node_output in (entry.get("outputs") or {}).values():
+        for key in OUTPUT_KEYS:
+            for item in node_output.get(key) or []:
+                if item.get("type", "output") != "output" or not item.get("filename"):
+                    continue
+                subfolder = item.get("subfolder") or ""
+                files.append(f"{subfolder}/{item['filename']}" if subfolder else item["filename"])
+    return files
+
+
+class HistoryMirror:
+    """Copy new ComfyUI history entries of one instance into SQL.
+
+    ComfyUI keeps history in insertion order and pages it with ``offset``
+    and ``max_items``. The mirror remembers how far it has read and the id
+    of the last entry at that point. On each pass it checks that id is
+    still just before the cursor (ComfyUI trims the oldest entries past
+    its size limit and forgets everything on restart), re-anchors if not,
+    and then pages forward over new entries only. Prompt ids submitted
+    through the proxy are fetched directly with ``/history/{prompt_id}``.
+    """
+
+    def __init__(self, base_url: str, page_size: int = HISTORY_PAGE_SIZE) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.page_size = max(1, page_size)
+        self.cursor = 0
+        self.last_id: Optional[str] = None
+        self.pending: Set[str] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self.stats: Dict[str, Any] = {
+            "passes": 0,
+            "mirrored": 0,
+            "requests": 0,
+            "reanchored": 0,
+            "errors": 0,
+            "last_sync": None,
+            "last_error": None,
+        }
+
+    def track(self, prompt_id: str) -> None:
+        """Fetch ``prompt_id`` directly on the next pass."""
+        self.pending.add(prompt_id)
+
+    async def _get(self, client: httpx.AsyncClient, path: str, **params: Any) -> Dict[str, Any]:
+        self.stats["requests"] += 1
+        resp = await client.get(f"{self.base_url}{path}", params=params or None)
+        resp.raise_for_status()
+        return resp.json() or {}
+
+    async def _anchor(self, client: httpx.AsyncClient) -> int:
+        """Return the offset of the first entry not read yet."""
+        if self.last_id is None:
+            return 0
+        start = max(0, self.cursor - self.page_size)
+        window = list(await self._get(client, "/history", max_items=self.page_size, offset=start))
+        if self.last_id in window:
+            offset = start + window.index(self.last_id) + 1
+        else:
+            # Trimmed past the window or cleared: rescan, known ids are skipped
+            offset = 0
+        if offset != self.cursor:
+            self.stats["reanchored"] += 1
+        return offset
+
+    async def _store(self, entries: Dict[str, Any]) -> int:
+        if not entries:
+            return 0
+        async with AsyncSessionLocal() as session:
+            known = set(
+                (await session.scalars(select(Prompt.id).where(Prompt.id.in_(list(entries))))).all()
+            )
+        prompts, outputs = [], []
+        for prompt_id, entry in entries.items():
+            if prompt_id in known:
+                continue
+            created = executed_at(entry)
+            prompts.append(
+                {
+                    "id": prompt_id,
+                    "text": prompt_text(entry),
+                    "workflow_id": None,
+                    "created_at": created,
+                    "source": self.base_url,
+                }
+            )
+            outputs.extend(
+                {
+                    # Stable ids keep a re-mirrored entry from duplicating rows
+                    "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{self.base_url}/{prompt_id}/{path}")),
+                    "prompt_id": prompt_id,
+                    "file_path": path,
+                    "created_at": created,
+                }
+                for path in output_files(entry)
+            )
+        # Another worker may be mirroring the same instance
+        await bulk_insert(Prompt, prompts, ignore_conflicts=True)
+        await bulk_insert(ImageOutput, outputs, ignore_conflicts=True)
+        self.stats["mirrored"] += len(prompts)
+        return len(prompts)
+
+    def _bind(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def sync(self, client: Optional[httpx.AsyncClient] = None) -> int:
+        """Mirror entries added since the last pass; returns how many.
+
+        Passes over the same mirror run one at a time.
+        """
+        async with self._bind():
+            return await self._sync(client)
+
+    async def _sync(self, client: Optional[httpx.AsyncClient]) -> int:
+        owns_client = client is None
+        if owns_client:
+            client = httpx.AsyncClient(timeout=HISTORY_TIMEOUT)
+        added = 0
+        try:
+            for prompt_id in list(self.pending):
+                entry = await self._get(client, f"/history/{prompt_id}")
+                if prompt_id in entry:
+                    added += await self._store(entry)
+                    self.pending.discard(prompt_id)
+
+            offset = await self._anchor(client)
+            while True:
+                page = await self._get(client, "/history", max_items=self.page_size, offset=offset)
+                if not page:
+                    break
+                added += await self._store(page)
+                offset += len(page)
+                self.last_id = next(reversed(page))
+                if len(page) < self.page_size:
+                    break
+            self.cursor = offset
+        finally:
+            if owns_client:
+                await client.aclose()
+        self.stats["passes"] += 1
+        self.stats["last_sync"] = datetime.utcnow().isoformat()
+        return added
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "cursor": self.cursor,
+            "last_id": self.last_id,
+            "pending": len(self.pending),
+            **self.stats,
+        }
+
+
+async def sync_all(mirrors: Iterable[HistoryMirror]) -> int:
+    """Run one pass over every mirror, logging instead of raising errors."""
+    added = 0
+    for mirror in mirrors:
+        try:
+            added += await mirror.sync()
+        except (httpx.HTTPError, ValueError) as exc:
+            mirror.stats["errors"] += 1
+            mirror.stats["last_error"] = str(exc)
+            logging.warning("History sync from %s failed: %s", mirror.base_url, exc)
+    return added
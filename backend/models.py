@@ -1,8 +1,11 @@
 """SQLAlchemy models for relational workflow and action storage."""
 
 import os
+import time
 import uuid
-from sqlalchemy import create_engine, Column, String, Text, ForeignKey
+from typing import Any, Dict, List
+from sqlalchemy import create_engine, event, insert, inspect, text, Column, String, Text, ForeignKey
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 from datetime import datetime
 
@@ -15,6 +18,44 @@ engine = create_engine(DATABASE_URL, connect_args=connect_args)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Connection pool and SQLite tuning shared by the sync and async engines
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+def _async_url(url: str) -> str:
+    """Map a sync database URL to its asyncio driver equivalent."""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    for prefix in ("postgresql+psycopg2:", "postgresql:", "postgres:"):
+        if url.startswith(prefix):
+            return url.replace(prefix, "postgresql+asyncpg:", 1)
+    return url
+
+
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":"))
+
+
+def _apply_sqlite_pragmas(dbapi_conn: Any, _record: Any) -> None:
+    cursor = dbapi_conn.cursor()
+    if SQLITE_JOURNAL_MODE:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+if DATABASE_URL.startswith("sqlite") and not _is_memory_sqlite(DATABASE_URL):
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+
 Base = declarative_base()
 
 
@@ -27,6 +68,10 @@ class Workflow(Base):
     name = Column(String, nullable=False)
     description = Column(String, default="")
     data = Column(Text)
+    # API-format graph compiled from an editor-format ``data``, and the
+    # content hash of the ``data`` it was compiled from
+    compiled = Column(Text, nullable=True)
+    content_hash = Column(String, nullable=True)
 
     actions = relationship(
         "Action", back_populates="workflow", cascade="all, delete-orphan"
@@ -55,7 +100,9 @@ class Prompt(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     text = Column(Text, nullable=False)
     workflow_id = Column(String, ForeignKey("workflows.id"), nullable=True)
-    created_at = Column(String, default=lambda: datetime.utcnow().isoformat())
+    created_at = Column(String, default=lambda: datetime.utcnow().isoformat(), index=True)
+    # ComfyUI base URL for prompts mirrored from its history
+    source = Column(String, nullable=True)
 
     workflow = relationship("Workflow")
     outputs = relationship(
@@ -72,10 +119,132 @@ class ImageOutput(Base):
     prompt_id = Column(String, ForeignKey("prompts.id"), nullable=False)
     file_path = Column(String, nullable=False)
     created_at = Column(String, default=lambda: datetime.utcnow().isoformat())
+    blurhash = Column(String, nullable=True)
+    # Canonical hash of the patched workflow for deterministic generations
+    result_key = Column(String, nullable=True, index=True)
 
     prompt = relationship("Prompt", back_populates="outputs")
 
 
-def init_db() -> None:
-    """Create all tables for the configured engine."""
-    Base.metadata.create_all(bind=engine)
+# ---------------------------------------------------------------------------
+# Async data layer
+# ---------------------------------------------------------------------------
+
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_engine():
+    """Return the shared :class:`AsyncEngine`, creating it on first use."""
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        kwargs: Dict[str, Any] = {}
+        if not _is_memory_sqlite(ASYNC_DATABASE_URL):
+            kwargs.update(
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_pre_ping=not ASYNC_DATABASE_URL.startswith("sqlite"),
+            )
+        _async_engine = create_async_engine(ASYNC_DATABASE_URL, **kwargs)
+        if ASYNC_DATABASE_URL.startswith("sqlite") and not _is_memory_sqlite(ASYNC_DATABASE_URL):
+            event.listen(_async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    """Open a new :class:`AsyncSession` bound to the async engine."""
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_sessionmaker = async_sessionmaker(
+            get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _async_sessionmaker()
+
+
+def insert_ignoring_conflicts(model: Any) -> Any:
+    """``INSERT ... ON CONFLICT DO NOTHING`` for SQLite and PostgreSQL."""
+    dialect = get_async_engine().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"conflict-tolerant inserts are not supported on {dialect}")
+    return dialect_insert(model).on_conflict_do_nothing()
+
+
+async def bulk_insert(model: Any, rows: List[Dict[str, Any]], ignore_conflicts: bool = False) -> None:
+    """Insert many rows of ``model`` in a single executemany transaction.
+
+    Used for hot insert paths such as :class:`Prompt` and :class:`ImageOutput`
+    where one commit per row would mean one fsync per row on SQLite. With
+    ``ignore_conflicts`` rows whose key already exists are skipped.
+    """
+    if not rows:
+        return
+    rows = [column_defaults(model, row) for row in rows]
+    stmt = insert_ignoring_conflicts(model) if ignore_conflicts else insert(model)
+    async with AsyncSessionLocal() as session:
+        await session.execute(stmt, rows)
+        await session.commit()
+
+
+def column_defaults(model: Any, row: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill Python-side column defaults so every executemany row has the same keys."""
+    filled = dict(row)
+    for column in model.__table__.columns:
+        if column.name in filled or column.default is None:
+            continue
+        default = column.default.arg
+        filled[column.name] = default(None) if callable(default) else default
+    return filled
+
+
+async def dispose_async_engine() -> None:
+    """Close pooled async connections (called on application shutdown)."""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_sessionmaker = None
+
+
+def _add_missing_columns() -> None:
+    """Add nullable columns and indexes introduced after a table was first created."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}")
+                )
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def init_db(attempts: int = 3) -> None:
+    """Create all tables for the configured engine.
+
+    Workers started together race to create the schema; whichever loses
+    retries, and by then the checks see the other worker's tables.
+    """
+    for attempt in range(attempts):
+        try:
+            Base.metadata.create_all(bind=engine)
+            _add_missing_columns()
+            return
+        except DBAPIError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.1 * (attempt + 1))
@@ -0,0 +1,216 @@
+"""Cached ComfyUI node schemas (``/object_info``) for the workflow editors."""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import os
+import zlib
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .utils import PreSerialized, api_response, dumps_json
+
+# Seconds between checks for restarts and model folder changes
+OBJECT_INFO_REFRESH = float(os.environ.get("CJ_OBJECT_INFO_REFRESH", "60"))
+OBJECT_INFO_TIMEOUT = float(os.environ.get("CJ_OBJECT_INFO_TIMEOUT", "120"))
+SEARCH_LIMIT = 50
+
+
+def _input_names(schema: Dict[str, Any]) -> List[str]:
+    inputs = schema.get("input") or {}
+    return [name for group in ("required", "optional") for name in (inputs.get(group) or {})]
+
+
+def build_index(info: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Reduce ``/object_info`` to the fields the node search looks at."""
+    return [
+        {
+            "name": name,
+            "display_name": schema.get("display_name") or name,
+            "category": schema.get("category", ""),
+            "inputs": _input_names(schema),
+            "outputs": list(schema.get("output") or []),
+        }
+        for name, schema in info.items()
+        if isinstance(schema, dict)
+    ]
+
+
+def search_index(index: List[Dict[str, Any]], query: str, limit: int = SEARCH_LIMIT) -> List[Dict[str, Any]]:
+    """Rank nodes whose name, title, category or inputs match every query term.
+
+    Matches on the class name beat matches on the title, which beat
+    category and input names; exact and prefix matches rank highest.
+    """
+    terms = query.lower().split()
+    if not terms:
+        return []
+    scored = []
+    for entry in index:
+        name = entry["name"].lower()
+        title = entry["display_name"].lower()
+        category = entry["category"].lower()
+        inputs = [i.lower() for i in entry["inputs"]]
+        score = 0
+        for term in terms:
+            if term == name or term == title:
+                score += 100
+            elif name.startswith(term) or title.startswith(term):
+                score += 50
+            elif term in name or term in title:
+                score += 20
+            elif term in category:
+                score += 5
+            elif any(term in i for i in inputs):
+                score += 3
+            else:
+                break
+        else:
+            scored.append((-score, len(name), entry["name"], entry))
+    scored.sort(key=lambda item: item[:3])
+    return [item[3] for item in scored[:limit]]
+
+
+class ObjectInfoCache:
+    """``/object_info`` of one ComfyUI instance, fetched once and kept compressed.
+
+    ComfyUI rebuilds every node's schema on each ``/object_info`` request,
+    so the response is fetched once and stored as a gzipped API envelope
+    (served as-is to clients that accept gzip) plus one zlib blob per node
+    class. :meth:`check` refetches it when the instance was unreachable or
+    restarted through the API, or when the file listings of its model
+    folders change; requests keep being served from the previous copy
+    until the new one is ready.
+    """
+
+    def __init__(self, base_url: str) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.etag: Optional[str] = None
+        self.envelope_gz: Optional[bytes] = None
+        self.index: List[Dict[str, Any]] = []
+        self._nodes: Dict[str, bytes] = {}
+        self._fingerprint: Optional[str] = None
+        self._stale = False
+        self._inflight: Optional[asyncio.Future] = None
+        self.stats: Dict[str, Any] = {
+            "fetches": 0,
+            "checks": 0,
+            "raw_bytes": 0,
+            "stored_bytes": 0,
+            "last_error": None,
+        }
+
+    @property
+    def loaded(self) -> bool:
+        return self.envelope_gz is not None
+
+    def mark_stale(self) -> None:
+        """Refetch on the next :meth:`check`, e.g. after a restart request."""
+        self._stale = True
+
+    def _client(self, client: Optional[httpx.AsyncClient]) -> httpx.AsyncClient:
+        return client or httpx.AsyncClient(timeout=OBJECT_INFO_TIMEOUT)
+
+    async def _fetch(self, client: httpx.AsyncClient) -> None:
+        resp = await client.get(f"{self.base_url}/object_info")
+        resp.raise_for_status()
+        raw = resp.content
+        info = resp.json()
+        nodes = {
+            name: zlib.compress(dumps_json(schema), 6)
+            for name, schema in info.items()
+        }
+        envelope = api_response(PreSerialized(raw)).body
+        self.envelope_gz = gzip.compress(envelope, 6)
+        self._nodes = nodes
+        self.index = build_index(info)
+        self.etag = f'"{hashlib.sha256(raw).hexdigest()[:32]}"'
+        self._stale = False
+        self.stats["fetches"] += 1
+        self.stats["raw_bytes"] = len(raw)
+        self.stats["stored_bytes"] = len(self.envelope_gz) + sum(len(b) for b in nodes.values())
+
+    async def refresh(self, client: Optional[httpx.AsyncClient] = None) -> None:
+        """Fetch ``/object_info`` now; concurrent callers share one request."""
+        inflight = self._inflight
+        if inflight is not None and not inflight.done() and inflight.get_loop() is asyncio.get_running_loop():
+            await asyncio.shield(inflight)
+            return
+        self._inflight = asyncio.get_running_loop().create_future()
+        owns_client = client is None
+        client = self._client(client)
+        try:
+            await self._fetch(client)
+            self._inflight.set_result(None)
+        except BaseException as exc:
+            self.stats["last_error"] = str(exc)
+            self._inflight.set_exception(exc)
+            self._inflight.exception()  # retrieved here so it is never unobserved
+            raise
+        finally:
+            if owns_client:
+                await client.aclose()
+
+    async def ensure(self, client: Optional[httpx.AsyncClient] = None) -> None:
+        if not self.loaded:
+            await self.refresh(client)
+
+    async def fingerprint(self, client: httpx.AsyncClient) -> Optional[str]:
+        """Hash the file listings of every model folder ComfyUI reports.
+
+        ``None`` when the instance has no ``/models`` listing endpoint.
+        """
+        resp = await client.get(f"{self.base_url}/models")
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        digest = hashlib.sha256()
+        for folder in sorted(resp.json()):
+            listing = await client.get(f"{self.base_url}/models/{folder}")
+            listing.raise_for_status()
+            digest.update(folder.encode("utf-8"))
+            digest.update(listing.content)
+        return digest.hexdigest()
+
+    async def check(self, client: Optional[httpx.AsyncClient] = None) -> bool:
+        """Refetch the schemas if they may be outdated; True when refetched."""
+        if not self.loaded:
+            return False
+        owns_client = client is None
+        client = self._client(client)
+        self.stats["checks"] += 1
+        try:
+            try:
+                fingerprint = await self.fingerprint(client)
+            except (httpx.HTTPError, ValueError) as exc:
+                # Down or restarting: its node set may differ once it is back
+                self.stats["last_error"] = str(exc)
+                self._stale = True
+                return False
+            changed = self._fingerprint is not None and fingerprint != self._fingerprint
+            self._fingerprint = fingerprint
+            if not (changed or self._stale):
+                return False
+            await self.refresh(client)
+            return True
+        finally:
+            if owns_client:
+                await client.aclose()
+
+    def node(self, class_type: str) -> Optional[bytes]:
+        """JSON schema of one node class, or ``None`` if it is unknown."""
+        blob = self._nodes.get(class_type)
+        return zlib.decompress(blob) if blob is not None else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "loaded": self.loaded,
+            "etag": self.etag,
+            "nodes": len(self._nodes),
+            "stale": self._stale,
+            **self.stats,
+        }
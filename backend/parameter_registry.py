@@ -0,0 +1,126 @@
+"""Process-local cache of shortcode parameter mappings."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+from typing import Any, Callable, Dict, List, Tuple
+
+from .prompt_parser import MappingTable
+from .utils import PreSerialized, dumps_json
+
+
+def normalize_mapping(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the public representation of a stored parameter mapping."""
+    return {
+        "id": record.get("_id", record.get("id")),
+        "code": record.get("code"),
+        "node_id": record.get("node_id"),
+        "param_name": record.get("param_name"),
+        "value_template": record.get("value_template", "{value}"),
+        "injection_mode": record.get("injection_mode"),
+        "description": record.get("description", ""),
+    }
+
+
+class ParameterRegistry:
+    """Load parameter mappings once and keep them coherent with writes.
+
+    Every change bumps :attr:`version` and rebuilds both the immutable
+    :class:`MappingTable` used by the shortcode parser and the serialized
+    ``/api/parameters`` payload with its ETag. Listeners registered with
+    :meth:`subscribe` receive the new table after each change.
+    """
+
+    def __init__(self, get_collection: Callable[[], Any]) -> None:
+        # Resolved lazily so the Mongo client is only touched on first use
+        self._get_collection = get_collection
+        self.version = 0
+        self._mappings: Dict[str, Dict[str, Any]] = {}
+        self._loaded = False
+        self._table = MappingTable(())
+        self._payload = PreSerialized(b"[]")
+        self._etag = ""
+        self._listeners: List[Callable[[MappingTable], None]] = []
+
+    async def ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        records = await self._get_collection().find().to_list(None)
+        self._mappings = {}
+        for record in records:
+            mapping = normalize_mapping(record)
+            self._mappings[mapping["id"]] = mapping
+        self._loaded = True
+        self._rebuild()
+
+    def invalidate(self) -> None:
+        """Forget cached mappings so the next access reloads from storage."""
+        self._loaded = False
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        if not self._loaded:
+            return
+        mapping = normalize_mapping(record)
+        self._mappings[mapping["id"]] = mapping
+        self._rebuild()
+
+    def remove(self, mapping_id: str) -> None:
+        if not self._loaded or self._mappings.pop(mapping_id, None) is None:
+            return
+        self._rebuild()
+
+    def subscribe(self, callback: Callable[[MappingTable], None]) -> None:
+        self._listeners.append(callback)
+
+    async def table(self) -> MappingTable:
+        """Return the current immutable mapping table.
+
+        Generation must not fail because mappings are unavailable, so a load
+        error falls back to the last table built (empty before the first load).
+        """
+        try:
+            await self.ensure_loaded()
+        except Exception:
+            logging.exception("Could not load parameter mappings")
+        return self._table
+
+    async def snapshot(self) -> Tuple[PreSerialized, str]:
+        """Return the pre-serialized ``/api/parameters`` payload and its ETag."""
+        await self.ensure_loaded()
+        return self._payload, self._etag
+
+    def _rebuild(self) -> None:
+        mappings = list(self._mappings.values())
+        self.version += 1
+        self._table = MappingTable(mappings, version=self.version)
+        self._payload = PreSerialized(dumps_json(mappings))
+        # Content hash rather than version so the ETag is stable across workers
+        self._etag = '"params-%s"' % hashlib.sha1(self._payload).hexdigest()[:16]
+        for callback in list(self._listeners):
+            try:
+                callback(self._table)
+            except Exception:  # pragma: no cover - listener bugs must not break writes
+                logging.exception("Parameter registry listener failed")
+
+    async def watch(self) -> None:
+        """Follow a Mongo change stream, applying changes made by other processes.
+
+        Returns quietly when the collection or deployment has no change
+        streams (in-memory collections, standalone mongod).
+        """
+        try:
+            watch = getattr(self._get_collection(), "watch", None)
+            if watch is None:
+                return
+            async with watch(full_document="updateLookup") as stream:
+                async for change in stream:
+                    op = change.get("operationType")
+                    if op == "delete":
+                        self.remove(change["documentKey"]["_id"])
+                    elif op in ("insert", "replace", "update") and change.get("fullDocument"):
+                        self.upsert(change["fullDocument"])
+                    elif op in ("drop", "rename", "invalidate"):
+                        self.invalidate()
+        except Exception as exc:
+            logging.info("Parameter change stream unavailable: %s", exc)
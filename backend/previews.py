@@ -0,0 +1,321 @@
+"""Relay of ComfyUI latent previews to browser progress sockets."""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import logging
+import os
+import struct
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+from PIL import Image
+
+try:  # optional: without it the upstream preview listener is disabled
+    import websockets
+except ImportError:  # pragma: no cover - previews are simply not relayed
+    websockets = None
+
+PREVIEW_FPS = float(os.environ.get("CJ_PREVIEW_FPS", "10"))
+PREVIEW_MAX_FPS = float(os.environ.get("CJ_PREVIEW_MAX_FPS", "30"))
+PREVIEW_MIN_SIZE = 32
+PREVIEW_RECONNECT = float(os.environ.get("CJ_PREVIEW_RECONNECT", "5"))
+# Downscaled renders kept so clients asking for the same size share them
+SCALED_CACHE_MAX = 32
+# Finished prompts remembered so late subscribers still get the end event
+FINISHED_MAX = 256
+
+# ComfyUI binary socket framing: >I event type, then >I image type + bytes
+EVENT_PREVIEW_IMAGE = 1
+IMAGE_TYPES = {1: "JPEG", 2: "PNG"}
+
+
+class Frame:
+    __slots__ = ("seq", "image_type", "data")
+
+    def __init__(self, seq: int, image_type: int, data: bytes) -> None:
+        self.seq = seq
+        self.image_type = image_type
+        self.data = data
+
+
+def encode_frame(image_type: int, data: bytes) -> bytes:
+    """Frame image bytes the way ComfyUI sends ``PREVIEW_IMAGE`` events."""
+    return struct.pack(">II", EVENT_PREVIEW_IMAGE, image_type) + data
+
+
+def decode_frame(message: bytes) -> Optional[Frame]:
+    """Parse a ComfyUI binary socket message; ``None`` if not a preview."""
+    if len(message) < 8:
+        return None
+    event, image_type = struct.unpack(">II", message[:8])
+    if event != EVENT_PREVIEW_IMAGE or image_type not in IMAGE_TYPES:
+        return None
+    return Frame(0, image_type, bytes(message[8:]))
+
+
+def downscale(frame: Frame, max_size: int) -> bytes:
+    """Return ``frame`` fitted into ``max_size`` pixels, framed, as JPEG."""
+    with Image.open(io.BytesIO(frame.data)) as image:
+        if max(image.size) <= max_size:
+            return encode_frame(frame.image_type, frame.data)
+        image.thumbnail((max_size, max_size), Image.BILINEAR)
+        out = io.BytesIO()
+        image.convert("RGB").save(out, format="JPEG", quality=85)
+    return encode_frame(1, out.getvalue())
+
+
+class PreviewSubscriber:
+    """One browser socket receiving progress and previews of one prompt.
+
+    A dedicated task is the only writer to the socket. Progress messages
+    and preview frames both replace unsent ones (latest wins), and frames
+    go out at most ``fps`` times per second, so a slow socket only ever
+    delays itself.
+    """
+
+    def __init__(self, hub: "PreviewHub", key: str, ws: Any, fps: float, max_size: Optional[int]) -> None:
+        self.hub = hub
+        self.key = key
+        self.ws = ws
+        self.interval = 1.0 / min(max(fps, 0.1), PREVIEW_MAX_FPS)
+        self.max_size = max(max_size, PREVIEW_MIN_SIZE) if max_size else None
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+        self._latest: Optional[Frame] = None
+        self._message: Any = None
+        self._wake = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def offer(self, frame: Frame) -> None:
+        if self.closed:
+            return
+        if self._latest is not None:
+            self.dropped += 1
+        self._latest = frame
+        self._idle.clear()
+        self._wake.set()
+
+    def offer_json(self, data: Any) -> None:
+        if self.closed:
+            return
+        self._message = data
+        self._idle.clear()
+        self._wake.set()
+
+    async def flush(self, timeout: float = 1.0) -> None:
+        """Wait until queued messages are sent (or the socket is gone)."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_at = 0.0
+        try:
+            while not self.closed:
+                await self._wake.wait()
+                self._wake.clear()
+                if self._message is not None:
+                    message, self._message = self._message, None
+                    await self.ws.send_json(message)
+                if self._latest is not None:
+                    delay = next_at - loop.time()
+                    if delay > 0:
+                        try:
+                            # Sleep until the next frame slot, but not past a progress message
+                            await asyncio.wait_for(self._wake.wait(), delay)
+                            continue
+                        except asyncio.TimeoutError:
+                            pass
+                    frame, self._latest = self._latest, None
+                    await self.ws.send_bytes(await self.hub.render(frame, self.max_size))
+                    self.sent += 1
+                    next_at = loop.time() + self.interval
+                if self._message is None and self._latest is None:
+                    self._idle.set()
+        except Exception:  # disconnected; the progress handler cleans up
+            self.closed = True
+            self._idle.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self._idle.set()
+        if not self._task.done() and not self._task.get_loop().is_closed():
+            self._task.cancel()
+
+
+class PreviewHub:
+    """Fan out preview frames of each prompt to its subscribers."""
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[str, Set[PreviewSubscriber]] = {}
+        self._by_socket: Dict[int, PreviewSubscriber] = {}
+        self._scaled: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._current: Dict[str, str] = {}  # instance -> prompt being executed
+        self._tracked: Set[str] = set()
+        self._finished: "OrderedDict[str, bool]" = OrderedDict()
+        self.progress: Dict[str, Dict[str, Any]] = {}
+        self._seq = 0
+        self.stats = {"frames": 0, "unrouted": 0, "rendered": 0}
+
+    def subscribe(self, key: str, ws: Any, fps: float = PREVIEW_FPS, max_size: Optional[int] = None) -> PreviewSubscriber:
+        sub = PreviewSubscriber(self, key, ws, fps, max_size)
+        self._subscribers.setdefault(key, set()).add(sub)
+        self._by_socket[id(ws)] = sub
+        return sub
+
+    def subscriber(self, ws: Any) -> Optional[PreviewSubscriber]:
+        """The subscriber writing to ``ws``, if it asked for previews."""
+        return self._by_socket.get(id(ws))
+
+    def unsubscribe(self, sub: PreviewSubscriber) -> None:
+        sub.close()
+        self._by_socket.pop(id(sub.ws), None)
+        subs = self._subscribers.get(sub.key)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subscribers[sub.key]
+
+    def track(self, prompt_id: str) -> None:
+        """Expect previews for a prompt submitted through this backend."""
+        self._tracked.add(prompt_id)
+
+    def tracked(self, prompt_id: str) -> bool:
+        return prompt_id in self._tracked or prompt_id in self._finished
+
+    def finished(self, prompt_id: str) -> bool:
+        return prompt_id in self._finished
+
+    def publish(self, key: str, image_type: int, data: bytes) -> int:
+        """Offer a frame to every subscriber of ``key``; never blocks."""
+        self._seq += 1
+        frame = Frame(self._seq, image_type, data)
+        subs = self._subscribers.get(key, ())
+        for sub in list(subs):
+            sub.offer(frame)
+        self.stats["frames"] += 1
+        return len(subs)
+
+    async def render(self, frame: Frame, max_size: Optional[int]) -> bytes:
+        if max_size is None:
+            return encode_frame(frame.image_type, frame.data)
+        key = (frame.seq, max_size)
+        cached = self._scaled.get(key)
+        if cached is None:
+            cached = await asyncio.to_thread(downscale, frame, max_size)
+            self._scaled[key] = cached
+            self.stats["rendered"] += 1
+            while len(self._scaled) > SCALED_CACHE_MAX:
+                self._scaled.popitem(last=False)
+        return cached
+
+    # -- upstream ComfyUI socket ------------------------------------------
+
+    def feed_json(self, instance: str, message: Dict[str, Any]) -> None:
+        kind = message.get("type")
+        data = message.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+        if kind in ("execution_start", "executing", "progress"):
+            self._current[instance] = prompt_id
+        if kind == "progress":
+            self.progress[prompt_id] = {"value": data.get("value"), "max": data.get("max"), "node": data.get("node")}
+        done = (kind == "executing" and data.get("node") is None) or kind in (
+            "execution_success",
+            "execution_error",
+            "execution_interrupted",
+        )
+        if done:
+            self._current.pop(instance, None)
+            self._tracked.discard(prompt_id)
+            self.progress.pop(prompt_id, None)
+            self._finished[prompt_id] = True
+            while len(self._finished) > FINISHED_MAX:
+                self._finished.popitem(last=False)
+
+    def feed_binary(self, instance: str, message: bytes) -> None:
+        frame = decode_frame(message)
+        prompt_id = self._current.get(instance)
+        if frame is None or prompt_id is None:
+            self.stats["unrouted"] += 1
+            return
+        self.publish(prompt_id, frame.image_type, frame.data)
+
+    def snapshot(self) -> Dict[str, Any]:
+        subs = [s for group in self._subscribers.values() for s in group]
+        return {
+            "subscribers": len(subs),
+            "tracked": len(self._tracked),
+            "sent": sum(s.sent for s in subs),
+            "dropped": sum(s.dropped for s in subs),
+            **self.stats,
+        }
+
+
+class PreviewListener:
+    """Hold one ComfyUI ``/ws`` connection open and feed it into a hub.
+
+    Prompts submitted with :attr:`client_id` as their ``client_id`` have
+    their previews sent to this socket only.
+    """
+
+    def __init__(self, base_url: str, hub: PreviewHub) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.hub = hub
+        self.client_id = f"cj-{uuid.uuid4().hex}"
+        self.connected = False
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def ws_url(self) -> str:
+        scheme, _, rest = self.base_url.partition("://")
+        return f"{'wss' if scheme == 'https' else 'ws'}://{rest}/ws?clientId={self.client_id}"
+
+    def start(self) -> None:
+        """Start listening unless already running (or websockets is missing)."""
+        if websockets is None:
+            logging.warning("websockets is not installed; live previews are disabled")
+            return
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:  # a task of an earlier loop never runs again
+            self._loop = loop
+            self._task = None
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """Cancel the listener and wait until its socket is closed."""
+        task, self._task = self._task, None
+        if task is not None and self._loop is asyncio.get_running_loop():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self.connected = False
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with websockets.connect(self.ws_url, max_size=None) as sock:
+                    self.connected = True
+                    async for message in sock:
+                        if isinstance(message, bytes):
+                            self.hub.feed_binary(self.base_url, message)
+                        else:
+                            self.hub.feed_json(self.base_url, json.loads(message))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logging.warning("Preview socket to %s failed: %s", self.base_url, exc)
+            finally:
+                self.connected = False
+            await asyncio.sleep(PREVIEW_RECONNECT)
@@ -1,6 +1,7 @@
 import re
 import shlex
-from typing import Tuple, Dict, List, Any
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Tuple, Union
 
 # Pattern used for stripping shortcode tokens from a prompt string
 SHORTCODE_PATTERN = re.compile(
@@ -17,7 +18,11 @@ def parse_prompt(prompt: str) -> Tuple[str, Dict[str, str]]:
     params: Dict[str, str] = {}
     remaining: List[str] = []
 
-    tokens = shlex.split(prompt)
+    try:
+        tokens = shlex.split(prompt)
+    except ValueError:
+        # Unbalanced quotes, e.g. an apostrophe in "a cat's toy"
+        tokens = prompt.split()
     i = 0
     while i < len(tokens):
         token = tokens[i]
@@ -48,8 +53,32 @@ def parse_prompt(prompt: str) -> Tuple[str, Dict[str, str]]:
     return clean_prompt, params
 
 
+class MappingTable:
+    """Immutable, versioned lookup of parameter mappings keyed by shortcode.
+
+    Built once per registry change and shared by every prompt, so
+    :func:`tokens_to_patch` does not rebuild the lookup on each call.
+    """
+
+    __slots__ = ("version", "by_code")
+
+    def __init__(self, mappings: Iterable[Mapping[str, Any]], version: int = 0) -> None:
+        lookup = {
+            m["code"].lstrip("-"): MappingProxyType(dict(m)) for m in mappings
+        }
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "by_code", MappingProxyType(lookup))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("MappingTable is immutable")
+
+    def __len__(self) -> int:
+        return len(self.by_code)
+
+
 def tokens_to_patch(
-    tokens: Dict[str, str], mappings: List[Dict[str, Any]]
+    tokens: Dict[str, str],
+    mappings: Union[MappingTable, List[Dict[str, Any]]],
 ) -> List[Dict[str, Any]]:
     """Translate parsed tokens into JSON patch operations.
 
@@ -60,7 +89,10 @@ def tokens_to_patch(
     """
 
     patch_ops: List[Dict[str, Any]] = []
-    mapping_lookup = {m["code"].lstrip("-"): m for m in mappings}
+    if isinstance(mappings, MappingTable):
+        mapping_lookup = mappings.by_code
+    else:
+        mapping_lookup = {m["code"].lstrip("-"): m for m in mappings}
     for code, value in tokens.items():
         mapping = mapping_lookup.get(code)
         if not mapping:
@@ -101,3 +133,33 @@ def tokens_to_patch(
                 }
             )
     return patch_ops
+
+
+def apply_patches(
+    graph: Mapping[str, Any], patches: Iterable[Mapping[str, Any]]
+) -> Dict[str, Any]:
+    """Return a copy of an API-format ``graph`` with patch operations applied.
+
+    ``/nodes/{node_id}/properties/{param}`` paths address
+    ``graph[node_id]["inputs"][param]``. ``text_inject`` operations prepend
+    or append their value to the existing text; other operations replace it.
+    Patches for nodes missing from the graph are ignored.
+    """
+    patched = {
+        node_id: {**node, "inputs": dict(node.get("inputs") or {})}
+        for node_id, node in graph.items()
+    }
+    for op in patches:
+        parts = str(op.get("path", "")).strip("/").split("/")
+        if len(parts) != 4 or parts[0] != "nodes" or parts[1] not in patched:
+            continue
+        inputs = patched[parts[1]]["inputs"]
+        value = op.get("value")
+        if op.get("op") == "text_inject":
+            current = str(inputs.get(parts[3]) or "")
+            if op.get("mode") == "prepend":
+                value = f"{value} {current}".strip()
+            else:
+                value = f"{current} {value}".strip()
+        inputs[parts[3]] = value
+    return patched
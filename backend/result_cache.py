@@ -0,0 +1,149 @@
+"""Reuse of outputs for byte-identical deterministic generations."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional
+
+from sqlalchemy import select
+
+from .models import AsyncSessionLocal, ImageOutput
+from .scheduler import node_hashes
+
+RESULT_CACHE_MAX = int(os.environ.get("CJ_RESULT_CACHE_MAX", "1024"))
+
+# Nodes whose output depends on more than their inputs (remote fetches,
+# wildcard/random text, clocks). Extend with CJ_RESULT_CACHE_NONDETERMINISTIC.
+NONDETERMINISTIC_NODES = {
+    "LoadImageFromUrl",
+    "LoadImageFromURL",
+    "ImpactWildcardProcessor",
+    "ImpactWildcardEncode",
+    "DPRandomGenerator",
+    "RandomPrompt",
+    "Random Number",
+    "Seed (rgthree)",
+} | {
+    n.strip()
+    for n in os.environ.get("CJ_RESULT_CACHE_NONDETERMINISTIC", "").split(",")
+    if n.strip()
+}
+SEED_INPUTS = ("seed", "noise_seed")
+
+
+def nondeterminism(graph: Mapping[str, Mapping[str, Any]]) -> Optional[str]:
+    """Return why ``graph`` may not reproduce its outputs, or ``None``.
+
+    A workflow is deterministic when it has no node listed in
+    :data:`NONDETERMINISTIC_NODES` and every seed input is a fixed integer
+    (ComfyUI treats negative seeds as "randomize").
+    """
+    for node_id, node in graph.items():
+        class_type = node.get("class_type")
+        if class_type in NONDETERMINISTIC_NODES:
+            return f"node {node_id} ({class_type}) is non-deterministic"
+        inputs = node.get("inputs") or {}
+        for name in SEED_INPUTS:
+            if name not in inputs:
+                continue
+            value = inputs[name]
+            if isinstance(value, list):
+                continue  # linked from another node, which is hashed instead
+            try:
+                if int(value) < 0:
+                    return f"node {node_id} has a random {name}"
+            except (TypeError, ValueError):
+                return f"node {node_id} has a random {name}"
+    return None
+
+
+def result_key(
+    graph: Mapping[str, Mapping[str, Any]], extra: Optional[Mapping[str, Any]] = None
+) -> str:
+    """Canonical hash of a fully patched API-format workflow.
+
+    Built from the Merkle node hashes, so it ignores node ids, key order
+    and ``_meta`` titles. ``extra`` covers inputs that live outside the
+    graph, such as uploaded init images.
+    """
+    digest = hashlib.sha256()
+    for node_hash in sorted(node_hashes(graph).values()):
+        digest.update(node_hash.encode("ascii"))
+    for key in sorted(extra or {}):
+        digest.update(f"|{key}={extra[key]}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """LRU index from result key to the outputs that generation produced.
+
+    Only the ``max_entries`` most recently used keys are retained. Keys are
+    also stored on ``ImageOutput.result_key``, so the index is rebuilt from
+    the newest outputs after a restart.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._warm = False
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0, "uncacheable": 0}
+
+    async def _warm_up(self) -> None:
+        self._warm = True
+        if self.max_entries <= 0:
+            return
+        query = (
+            select(ImageOutput.result_key, ImageOutput.prompt_id, ImageOutput.file_path, ImageOutput.blurhash)
+            .where(ImageOutput.result_key.is_not(None))
+            .order_by(ImageOutput.created_at.desc())
+            .limit(self.max_entries * 4)
+        )
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(query)).all()
+        # Oldest first so the newest end up most recently used
+        for key, prompt_id, file_path, blurhash in reversed(rows):
+            entry = self._entries.get(key)
+            if entry is None or entry["prompt_id"] != prompt_id:
+                entry = {"prompt_id": prompt_id, "outputs": []}
+            entry["outputs"].append({"file_path": file_path, "blurhash": blurhash})
+            self._put(key, entry)
+
+    def _put(self, key: str, entry: Dict[str, Any]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    async def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return ``{"prompt_id", "outputs"}`` for a cached result, if any."""
+        if not self._warm:
+            await self._warm_up()
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return {"prompt_id": entry["prompt_id"], "outputs": [dict(o) for o in entry["outputs"]]}
+
+    def store(self, key: str, prompt_id: str, outputs: List[Dict[str, Any]]) -> None:
+        if self.max_entries <= 0:
+            return
+        self._put(key, {"prompt_id": prompt_id, "outputs": [dict(o) for o in outputs]})
+        self.stats["stored"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._warm = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,125 @@
+"""Model-affinity routing of jobs across ComfyUI instances."""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional
+
+# An instance whose queue is ROUTE_SPILLOVER_DEPTH jobs deeper than the
+# least-loaded instance no longer attracts jobs by model affinity.
+ROUTE_SPILLOVER_DEPTH = int(os.environ.get("CJ_ROUTE_SPILLOVER_DEPTH", "4"))
+
+# Loader node class -> input naming the model file it loads
+MODEL_INPUTS: Dict[str, Iterable[str]] = {
+    "CheckpointLoaderSimple": ("ckpt_name",),
+    "CheckpointLoader": ("ckpt_name",),
+    "ImageOnlyCheckpointLoader": ("ckpt_name",),
+    "UNETLoader": ("unet_name",),
+    "LoraLoader": ("lora_name",),
+    "LoraLoaderModelOnly": ("lora_name",),
+}
+
+
+def extract_model_set(graph: Optional[Mapping[str, Any]]) -> FrozenSet[str]:
+    """Return the checkpoints and LoRAs an API-format workflow loads."""
+    models = set()
+    for node in (graph or {}).values():
+        if not isinstance(node, Mapping):
+            continue
+        for name in MODEL_INPUTS.get(node.get("class_type"), ()):
+            value = (node.get("inputs") or {}).get(name)
+            if isinstance(value, str) and value:
+                models.add(f"{name.split('_')[0]}:{value}")
+    return frozenset(models)
+
+
+def affinity(wanted: FrozenSet[str], loaded: FrozenSet[str]) -> float:
+    """Jaccard similarity of two model sets; 0 when either is empty."""
+    if not wanted or not loaded:
+        return 0.0
+    return len(wanted & loaded) / len(wanted | loaded)
+
+
+class Instance:
+    __slots__ = ("url", "models", "tail_models", "depth", "completed", "swaps")
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        # Model set of the last completed job, i.e. what is loaded now
+        self.models: FrozenSet[str] = frozenset()
+        # Model set of the last job routed here, loaded once the queue drains
+        self.tail_models: FrozenSet[str] = frozenset()
+        self.depth = 0
+        self.completed = 0
+        self.swaps = 0
+
+    def expected_models(self) -> FrozenSet[str]:
+        return self.tail_models if self.depth else self.models
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "models": sorted(self.models),
+            "queue_depth": self.depth,
+            "completed": self.completed,
+            "model_swaps": self.swaps,
+        }
+
+
+class ModelAffinityRouter:
+    """Send each job to the instance most likely to have its models loaded.
+
+    Affinity compares a job's model set with what an instance will hold
+    when it reaches the job: the last job queued there, or the last one
+    completed when idle. Instances more than ``spillover_depth`` jobs
+    deeper than the least-loaded one are skipped so one hot model cannot
+    pile every job onto a single GPU.
+    """
+
+    def __init__(self, urls: Iterable[str], spillover_depth: int = ROUTE_SPILLOVER_DEPTH) -> None:
+        self.instances: Dict[str, Instance] = {url: Instance(url) for url in urls}
+        if not self.instances:
+            raise ValueError("at least one ComfyUI instance is required")
+        self.spillover_depth = spillover_depth
+        self.stats = {"routed": 0, "affine": 0, "spilled": 0}
+
+    def route(self, models: FrozenSet[str]) -> Instance:
+        """Pick an instance for a job loading ``models`` and count it as queued."""
+        pool: List[Instance] = list(self.instances.values())
+        shallowest = min(inst.depth for inst in pool)
+        eligible = [i for i in pool if i.depth - shallowest < self.spillover_depth]
+        # Ties go to the shallower queue, then to an instance with nothing
+        # loaded so other users' models are not evicted needlessly
+        best = max(
+            eligible,
+            key=lambda i: (
+                affinity(models, i.expected_models()),
+                -i.depth,
+                not i.expected_models(),
+            ),
+        )
+        self.stats["routed"] += 1
+        if models and affinity(models, best.expected_models()) > 0:
+            self.stats["affine"] += 1
+        elif models and any(affinity(models, i.expected_models()) > 0 for i in pool):
+            self.stats["spilled"] += 1
+        best.depth += 1
+        best.tail_models = models or best.tail_models
+        return best
+
+    def complete(self, instance: Instance, models: FrozenSet[str]) -> None:
+        """Record that ``instance`` finished a job that loaded ``models``."""
+        instance.depth = max(0, instance.depth - 1)
+        instance.completed += 1
+        if models:
+            if instance.models and models != instance.models:
+                instance.swaps += 1
+            instance.models = models
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "spillover_depth": self.spillover_depth,
+            **self.stats,
+            "model_swaps": sum(i.swaps for i in self.instances.values()),
+            "instances": [i.snapshot() for i in self.instances.values()],
+        }
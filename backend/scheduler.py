@@ -0,0 +1,244 @@
+"""Job ordering that keeps ComfyUI's node cache warm.
+
+ComfyUI reuses the outputs of nodes whose class, literal inputs and
+upstream nodes are unchanged since the previous prompt. Each job gets a
+signature of Merkle-style node hashes; among the oldest pending jobs the
+scheduler starts the one sharing the most nodes with what just ran.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, FrozenSet, Iterable, List, Mapping, Optional
+
+from .prompt_parser import apply_patches
+
+# Only the SCHED_WINDOW oldest pending jobs compete for the next slot, and
+# a job passed over SCHED_MAX_SKIPS times runs next regardless of affinity.
+SCHED_WINDOW = int(os.environ.get("CJ_SCHED_WINDOW", "8"))
+SCHED_MAX_SKIPS = int(os.environ.get("CJ_SCHED_MAX_SKIPS", "4"))
+SCHED_CONCURRENCY = int(os.environ.get("CJ_SCHED_CONCURRENCY", "1"))
+
+
+def is_api_graph(graph: Any) -> bool:
+    """Return True for API-format workflows (``{node_id: {class_type, inputs}}``)."""
+    return (
+        isinstance(graph, dict)
+        and bool(graph)
+        and all(isinstance(n, dict) and "class_type" in n for n in graph.values())
+    )
+
+
+def node_hashes(
+    graph: Mapping[str, Mapping[str, Any]], patches: Iterable[Mapping[str, Any]] = ()
+) -> Dict[str, str]:
+    """Hash every node from its class, literal inputs and upstream node hashes.
+
+    Two nodes in different prompts get the same hash exactly when ComfyUI
+    could reuse the cached output of one for the other. ``patches`` are the
+    shortcode patch operations applied on top of ``graph``.
+    """
+    graph = apply_patches(graph, patches)
+    hashes: Dict[str, str] = {}
+
+    def visit(node_id: str, stack: FrozenSet[str]) -> str:
+        if node_id in hashes:
+            return hashes[node_id]
+        node = graph.get(node_id)
+        if node is None or node_id in stack:
+            return f"missing:{node_id}"
+        inputs = node["inputs"]
+        parts: List[Any] = [node.get("class_type")]
+        for name in sorted(inputs):
+            value = inputs[name]
+            if isinstance(value, list) and len(value) == 2 and isinstance(value[0], str) and value[0] in graph:
+                value = ["link", visit(value[0], stack | {node_id}), value[1]]
+            parts.append([name, value])
+        digest = hashlib.sha1(
+            json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:16]
+        hashes[node_id] = digest
+        return digest
+
+    for node_id in graph:
+        visit(node_id, frozenset())
+    return hashes
+
+
+def stand_in_graph(
+    workflow_id: Optional[str], clean_prompt: str, patches: Iterable[Mapping[str, Any]]
+) -> Dict[str, Any]:
+    """Loader -> text encode -> sampler graph for jobs without an API graph."""
+    return {
+        "loader": {"class_type": "Workflow", "inputs": {"id": workflow_id or ""}},
+        "encode": {
+            "class_type": "TextEncode",
+            "inputs": {"text": clean_prompt, "source": ["loader", 0]},
+        },
+        "sample": {
+            "class_type": "Sampler",
+            "inputs": {"patches": list(patches), "cond": ["encode", 0]},
+        },
+    }
+
+
+def job_signature(
+    graph: Optional[Mapping[str, Any]],
+    *,
+    workflow_id: Optional[str] = None,
+    clean_prompt: str = "",
+    patches: Iterable[Mapping[str, Any]] = (),
+) -> FrozenSet[str]:
+    """Return the set of node hashes a job would execute.
+
+    Without an API-format graph, :func:`stand_in_graph` keyed by workflow,
+    prompt and shortcode patches is used instead.
+    """
+    if not is_api_graph(graph):
+        return frozenset(node_hashes(stand_in_graph(workflow_id, clean_prompt, patches)).values())
+    return frozenset(node_hashes(graph, patches).values())
+
+
+def overlap(signature: FrozenSet[str], cached: FrozenSet[str]) -> float:
+    """Fraction of ``signature`` nodes whose outputs are in ``cached``."""
+    if not signature:
+        return 0.0
+    return len(signature & cached) / len(signature)
+
+
+class _Entry:
+    __slots__ = ("job_id", "signature", "seq", "future", "skips", "hit_rate")
+
+    def __init__(self, job_id: str, signature: FrozenSet[str], seq: int, future: asyncio.Future) -> None:
+        self.job_id = job_id
+        self.signature = signature
+        self.seq = seq
+        self.future = future
+        self.skips = 0
+        self.hit_rate = 0.0
+
+
+class CacheAffinityScheduler:
+    """Grant execution slots to pending jobs in cache-friendly order.
+
+    Jobs wait in :meth:`slot` until picked. Only the ``window`` oldest
+    pending jobs are considered, and the oldest one is taken unconditionally
+    once it has been skipped ``max_skips`` times, so reordering is bounded.
+    """
+
+    def __init__(
+        self,
+        window: int = SCHED_WINDOW,
+        max_skips: int = SCHED_MAX_SKIPS,
+        concurrency: int = SCHED_CONCURRENCY,
+    ) -> None:
+        self.window = max(1, window)
+        self.max_skips = max_skips
+        self.concurrency = max(1, concurrency)
+        self._pending: List[_Entry] = []
+        self._active: List[_Entry] = []
+        self._seq = 0
+        # Node outputs assumed cached: those of the most recently started job
+        self._cached: FrozenSet[str] = frozenset()
+        self._arrival_last: FrozenSet[str] = frozenset()
+        self.stats: Dict[str, float] = {
+            "scheduled": 0,
+            "reordered": 0,
+            "nodes": 0,
+            "cached_nodes": 0.0,
+            "fifo_nodes": 0,
+            "fifo_cached_nodes": 0.0,
+        }
+
+    @asynccontextmanager
+    async def slot(self, job_id: str, signature: FrozenSet[str]) -> AsyncIterator[_Entry]:
+        """Wait for the job's turn; the yielded entry carries ``hit_rate``."""
+        self._seq += 1
+        entry = _Entry(job_id, signature, self._seq, asyncio.get_running_loop().create_future())
+        # What the hit rate would have been in plain arrival order
+        self.stats["fifo_nodes"] += len(signature)
+        self.stats["fifo_cached_nodes"] += overlap(signature, self._arrival_last) * len(signature)
+        self._arrival_last = signature
+        self._pending.append(entry)
+        self._dispatch()
+        try:
+            await entry.future
+        except BaseException:
+            if entry in self._pending:
+                self._pending.remove(entry)
+            elif entry.future.done() and not entry.future.cancelled():
+                self._release(entry)
+            raise
+        try:
+            yield entry
+        finally:
+            self._release(entry)
+
+    def _release(self, entry: _Entry) -> None:
+        if entry in self._active:
+            self._active.remove(entry)
+        self._dispatch()
+
+    def _pick(self) -> _Entry:
+        window = self._pending[: self.window]
+        oldest = window[0]
+        if oldest.skips >= self.max_skips:
+            return oldest
+        best = max(window, key=lambda e: (overlap(e.signature, self._cached), -e.seq))
+        if best is not oldest:
+            self.stats["reordered"] += 1
+            for entry in window:
+                if entry.seq < best.seq:
+                    entry.skips += 1
+        return best
+
+    def _dispatch(self) -> None:
+        # Slots held by jobs whose event loop is gone will never be released
+        self._active = [e for e in self._active if not e.future.get_loop().is_closed()]
+        while len(self._active) < self.concurrency and self._pending:
+            entry = self._pick()
+            self._pending.remove(entry)
+            if entry.future.done() or entry.future.get_loop().is_closed():
+                continue
+            entry.hit_rate = overlap(entry.signature, self._cached)
+            self.stats["scheduled"] += 1
+            self.stats["nodes"] += len(entry.signature)
+            self.stats["cached_nodes"] += entry.hit_rate * len(entry.signature)
+            self._cached = entry.signature
+            self._active.append(entry)
+            loop = entry.future.get_loop()
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if loop is running:
+                entry.future.set_result(None)
+            else:
+                loop.call_soon_threadsafe(entry.future.set_result, None)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Return the 0-based queue position of a pending job."""
+        for i, entry in enumerate(self._pending):
+            if entry.job_id == job_id:
+                return i
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        nodes = self.stats["nodes"]
+        return {
+            "pending": len(self._pending),
+            "running": len(self._active),
+            "window": self.window,
+            "max_skips": self.max_skips,
+            "concurrency": self.concurrency,
+            "scheduled": self.stats["scheduled"],
+            "reordered": self.stats["reordered"],
+            "estimated_hit_rate": round(self.stats["cached_nodes"] / nodes, 4) if nodes else 0.0,
+            "fifo_estimated_hit_rate": round(
+                self.stats["fifo_cached_nodes"] / self.stats["fifo_nodes"], 4
+            ) if self.stats["fifo_nodes"] else 0.0,
+        }
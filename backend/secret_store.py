@@ -0,0 +1,275 @@
+"""Decrypted secrets cached in process memory.
+
+``get_civitai_key`` runs on every Civitai proxy request, so secrets are
+loaded (and decrypted) once and then served from a dict. Lookups walk the
+configured backends in order: environment variables always come first, then
+the store selected by ``CJ_SECRETS_BACKEND`` (``db``, ``file`` or ``env``).
+Writing a secret updates the store and the cache together.
+
+Stored values are encrypted with a :class:`~cryptography.fernet.MultiFernet`.
+``FERNET_SECRET`` holds the current key (a comma separated list is
+accepted, newest first) and ``FERNET_SECRET_OLD`` the keys being retired,
+which are still tried for decryption until :meth:`SecretsProvider.rotate`
+has re-encrypted everything with the current key.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+from .shared_state import WORKERS
+
+SECRETS_BACKEND = os.environ.get("CJ_SECRETS_BACKEND", "db").lower()
+SECRETS_FILE = os.environ.get("CJ_SECRETS_FILE", "./secrets.json")
+# Other workers only see a new secret once their copy expires, so cached
+# values are reloaded periodically when several workers run
+SECRETS_TTL = float(os.environ.get("CJ_SECRETS_TTL", "60" if WORKERS > 1 else "0"))
+# Known secrets and the environment variables that override them
+ENV_NAMES = {"civitai_key": "CIVITAI_API_KEY"}
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [k.strip() for k in (value or "").split(",") if k.strip()]
+
+
+def build_fernet(current: Optional[str] = None, old: Optional[str] = None) -> MultiFernet:
+    """MultiFernet over the current keys followed by the retired ones.
+
+    Without ``FERNET_SECRET`` a key is derived from ``SECRET_KEY`` as
+    earlier releases did, so existing ciphertext stays readable.
+    """
+    keys = _split(os.environ.get("FERNET_SECRET") if current is None else current)
+    if not keys:
+        secret = os.environ.get("SECRET_KEY", "secret-key")
+        key_bytes = secret.encode()[:32]
+        key_bytes += b"0" * (32 - len(key_bytes))
+        keys = [base64.urlsafe_b64encode(key_bytes).decode()]
+    keys += _split(os.environ.get("FERNET_SECRET_OLD") if old is None else old)
+    return MultiFernet([Fernet(k) for k in keys])
+
+
+class SecretBackend:
+    """Where secrets live; ``load`` returns plaintext or ``None``."""
+
+    name = "base"
+
+    async def load(self, name: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def store(self, name: str, value: str) -> None:
+        raise NotImplementedError
+
+    async def rotate(self, name: str) -> bool:
+        """Re-encrypt ``name`` with the current key; whether anything changed."""
+        return False
+
+
+class EnvSecretBackend(SecretBackend):
+    """Plaintext secrets from environment variables."""
+
+    name = "env"
+
+    def __init__(self, names: Optional[Dict[str, str]] = None) -> None:
+        self.names = ENV_NAMES if names is None else names
+
+    def _var(self, name: str) -> str:
+        return self.names.get(name, name.upper())
+
+    async def load(self, name: str) -> Optional[str]:
+        return os.environ.get(self._var(name)) or None
+
+    async def store(self, name: str, value: str) -> None:
+        os.environ[self._var(name)] = value
+
+
+class _EncryptedBackend(SecretBackend):
+    """Backends keeping Fernet tokens; subclasses read and write the tokens."""
+
+    def __init__(self, fernet: Optional[MultiFernet] = None) -> None:
+        self._fernet = fernet
+
+    @property
+    def fernet(self) -> MultiFernet:
+        # Built on first use so creating the provider at import stays free
+        if self._fernet is None:
+            self._fernet = build_fernet()
+        return self._fernet
+
+    async def _read(self, name: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def _write(self, name: str, token: str) -> None:
+        raise NotImplementedError
+
+    async def load(self, name: str) -> Optional[str]:
+        token = await self._read(name)
+        if not token:
+            return None
+        try:
+            return self.fernet.decrypt(token.encode()).decode()
+        except InvalidToken:
+            logging.warning("Stored secret %s cannot be decrypted with the configured keys", name)
+            return None
+
+    async def store(self, name: str, value: str) -> None:
+        await self._write(name, self.fernet.encrypt(value.encode()).decode())
+
+    async def rotate(self, name: str) -> bool:
+        token = await self._read(name)
+        if not token:
+            return False
+        try:
+            rotated = self.fernet.rotate(token.encode()).decode()
+        except InvalidToken:
+            logging.warning("Stored secret %s cannot be decrypted with the configured keys", name)
+            return False
+        await self._write(name, rotated)
+        return True
+
+
+class DbSecretBackend(_EncryptedBackend):
+    """One Mongo collection per secret holding ``{"_id": "global", "key": token}``.
+
+    This is the layout backups export and restore.
+    """
+
+    name = "db"
+
+    def __init__(self, db: Any, fernet: Optional[MultiFernet] = None) -> None:
+        super().__init__(fernet)
+        self.db = db
+
+    async def _read(self, name: str) -> Optional[str]:
+        record = await getattr(self.db, name).find_one({"_id": "global"})
+        return record.get("key") if record else None
+
+    async def _write(self, name: str, token: str) -> None:
+        await getattr(self.db, name).update_one({"_id": "global"}, {"$set": {"key": token}}, upsert=True)
+
+
+class FileSecretBackend(_EncryptedBackend):
+    """A JSON file mapping secret names to tokens, readable by the owner only."""
+
+    name = "file"
+
+    def __init__(self, path: str = SECRETS_FILE, fernet: Optional[MultiFernet] = None) -> None:
+        super().__init__(fernet)
+        self.path = path
+
+    def _load_file(self) -> Dict[str, str]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, name: str, token: str) -> None:
+        data = self._load_file()
+        data[name] = token
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".secrets-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(data, fh)
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    async def _read(self, name: str) -> Optional[str]:
+        return (await asyncio.to_thread(self._load_file)).get(name)
+
+    async def _write(self, name: str, token: str) -> None:
+        await asyncio.to_thread(self._save, name, token)
+
+
+class SecretsProvider:
+    """Serve secrets from memory, loading each from the backends once.
+
+    Missing secrets are cached as ``None`` too, so a deployment without a
+    key does not query the store on every request. ``set`` writes to the
+    last backend (the persistent store) and replaces the cached value;
+    ``invalidate`` drops cached values after the store changed underneath,
+    e.g. on restore. A load that overlaps a ``set`` is not cached.
+    """
+
+    def __init__(self, backends: List[SecretBackend], ttl: float = SECRETS_TTL) -> None:
+        self.backends = backends
+        self.ttl = ttl
+        self._values: Dict[str, Tuple[Optional[str], float]] = {}
+        self._generation = 0
+        self.stats = {"hits": 0, "loads": 0, "invalidations": 0}
+
+    @property
+    def store(self) -> SecretBackend:
+        return self.backends[-1]
+
+    async def get(self, name: str) -> Optional[str]:
+        entry = self._values.get(name)
+        if entry is not None and (not entry[1] or entry[1] > time.monotonic()):
+            self.stats["hits"] += 1
+            return entry[0]
+        generation = self._generation
+        value = None
+        for backend in self.backends:
+            value = await backend.load(name)
+            if value is not None:
+                break
+        self.stats["loads"] += 1
+        if generation == self._generation:
+            self._remember(name, value)
+        return value
+
+    def _remember(self, name: str, value: Optional[str]) -> None:
+        expires = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        self._values[name] = (value, expires)
+
+    async def set(self, name: str, value: str) -> None:
+        await self.store.store(name, value)
+        self._generation += 1
+        self._remember(name, value)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        if name is None:
+            self._values.clear()
+        else:
+            self._values.pop(name, None)
+        self._generation += 1
+        self.stats["invalidations"] += 1
+
+    async def rotate(self, names: Optional[List[str]] = None) -> List[str]:
+        """Re-encrypt stored secrets with the current key; returns the rotated names."""
+        rotated = []
+        for name in names or list(ENV_NAMES):
+            if await self.store.rotate(name):
+                rotated.append(name)
+        return rotated
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "backends": [b.name for b in self.backends],
+            "cached": sorted(self._values),
+            "ttl": self.ttl,
+            **self.stats,
+        }
+
+
+def create_secrets_provider(db: Any, backend: str = SECRETS_BACKEND) -> SecretsProvider:
+    """Environment overrides followed by the configured store."""
+    if backend == "env":
+        return SecretsProvider([EnvSecretBackend()])
+    if backend == "file":
+        return SecretsProvider([EnvSecretBackend(), FileSecretBackend()])
+    if backend != "db":
+        raise ValueError(f"unknown secrets backend: {backend}")
+    return SecretsProvider([EnvSecretBackend(), DbSecretBackend(db)])
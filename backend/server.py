@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import asyncio
-import base64
+import contextlib
+import functools
+import gzip
+import hashlib
 import json
 import logging
 import os
@@ -9,34 +12,62 @@ import types
 import tempfile
 import uuid
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Set, AsyncIterator
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
 
 import requests
 import httpx
-from cryptography.fernet import Fernet
 from fastapi import (
     APIRouter,
     BackgroundTasks,
     Depends,
     FastAPI,
+    File,
+    Form,
     HTTPException,
     Header,
+    Query,
     Request,
+    UploadFile,
     WebSocket,
     WebSocketDisconnect,
 )
-from fastapi.responses import StreamingResponse, FileResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse, FileResponse, Response
+from sqlalchemy import func, select, text, update
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.middleware.cors import CORSMiddleware
 
+from . import batch as batching, thumbnails, uploads
+from .routing import ModelAffinityRouter, extract_model_set
+from .result_cache import ResultCache, nondeterminism, result_key
+from .scheduler import CacheAffinityScheduler, is_api_graph, job_signature, stand_in_graph
+from .workflow_compiler import CompileError, CompiledGraphCache, content_hash, is_ui_workflow
+from .write_behind import write_queue
 from .csrf import CSRFMiddleware
-from .external_integrations.civitai import civitai_get, fetch_json as civitai_fetch
-from .models import Action, ImageOutput, Prompt, SessionLocal, Workflow, init_db
+from .frontend_logs import BatchError, FrontendLogIngest, decode_batch
+from .fairshare import ADMIT_PER_INSTANCE, FairShareQueue, JobCancelled
+from .previews import PREVIEW_FPS, PreviewHub, PreviewListener
+from .secret_store import create_secrets_provider
+from .shared_state import CONTROL_POLL, PROGRESS_TTL, LazySharedState
+from .object_info import OBJECT_INFO_REFRESH, ObjectInfoCache, search_index
+from .history_sync import HISTORY_PAGE_SIZE, HISTORY_SYNC_INTERVAL, HistoryMirror, sync_all
+from .parameter_registry import ParameterRegistry
+from .prompt_parser import apply_patches, parse_prompt, tokens_to_patch
+from .external_integrations.civitai import civitai_get, fetch_json as civitai_fetch, use_shared_state
+from .models import (
+    Action,
+    AsyncSessionLocal,
+    ImageOutput,
+    Prompt,
+    Workflow,
+    dispose_async_engine,
+    init_db,
+)
 from .utils import (
     DEBUG_MODE,
+    PreSerialized,
     api_response,
     log_backend_call,
-    log_frontend_event,
     LOG_BACKEND_PATH,
 )
 
@@ -47,44 +78,47 @@ from .utils import (
 
 try:
     from motor.motor_asyncio import AsyncIOMotorClient
-
-    mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
-    _mongo_client = AsyncIOMotorClient(mongo_url)
-    db = _mongo_client.get_database("comfyui_frontend")
 except Exception:  # pragma: no cover - fallback for tests
+    AsyncIOMotorClient = None
+
+mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+_mongo_client = None
+
+
+class MemoryCollection:
+    def __init__(self) -> None:
+        self.store: Dict[str, Dict[str, Any]] = {}
 
-    class MemoryCollection:
-        def __init__(self) -> None:
-            self.store: Dict[str, Dict[str, Any]] = {}
+    async def insert_one(self, doc: Dict[str, Any]) -> None:
+        self.store[doc["_id"]] = doc
 
-        async def insert_one(self, doc: Dict[str, Any]) -> None:
-            self.store[doc["_id"]] = doc
+    def find(self):
+        class Cursor:
+            def __init__(self, data: Dict[str, Dict[str, Any]]) -> None:
+                self._data = list(data.values())
 
-        def find(self):
-            class Cursor:
-                def __init__(self, data: Dict[str, Dict[str, Any]]) -> None:
-                    self._data = list(data.values())
+            async def to_list(self, _limit: int) -> List[Dict[str, Any]]:
+                return list(self._data)
 
-                async def to_list(self, _limit: int) -> List[Dict[str, Any]]:
-                    return list(self._data)
+        return Cursor(self.store)
 
-            return Cursor(self.store)
+    async def update_one(
+        self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False
+    ) -> None:
+        _id = query.get("_id")
+        doc = self.store.get(_id, {})
+        doc.update(update.get("$set", {}))
+        self.store[_id] = doc
 
-        async def update_one(
-            self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False
-        ) -> None:
-            _id = query.get("_id")
-            doc = self.store.get(_id, {})
-            doc.update(update.get("$set", {}))
-            self.store[_id] = doc
+    async def delete_one(self, query: Dict[str, Any]) -> None:
+        self.store.pop(query.get("_id"), None)
 
-        async def delete_one(self, query: Dict[str, Any]) -> None:
-            self.store.pop(query.get("_id"), None)
+    async def find_one(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self.store.get(query.get("_id"))
 
-        async def find_one(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-            return self.store.get(query.get("_id"))
 
-    db = types.SimpleNamespace(
+def _memory_database() -> types.SimpleNamespace:
+    return types.SimpleNamespace(
         parameter_mappings=MemoryCollection(),
         workflow_mappings=MemoryCollection(),
         action_mappings=MemoryCollection(),
@@ -92,6 +126,62 @@ except Exception:  # pragma: no cover - fallback for tests
     )
 
 
+class LazyDatabase:
+    """Mongo database whose client is only created on first use.
+
+    Constructing a Motor client starts pymongo's topology monitor threads,
+    so importing the server (and every request that never touches Mongo)
+    should not pay for it.
+    """
+
+    def __init__(self) -> None:
+        self._db: Any = None
+
+    @property
+    def connected(self) -> bool:
+        return self._db is not None
+
+    def resolve(self) -> Any:
+        global _mongo_client
+        if self._db is None:
+            try:
+                _mongo_client = AsyncIOMotorClient(mongo_url)
+                self._db = _mongo_client.get_database("comfyui_frontend")
+            except Exception:  # pragma: no cover - Motor missing or misconfigured
+                self._db = _memory_database()
+        return self._db
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+
+db = LazyDatabase()
+
+# Indexes the gallery and auth lookups rely on: (collection, keys, options)
+MONGO_INDEXES = [
+    ("saved_images", [("user_id", 1), ("created_at", -1), ("id", -1)], {"name": "user_gallery"}),
+    ("saved_images", "id", {"unique": True, "name": "saved_image_id"}),
+    ("users", "username", {"unique": True, "name": "user_username"}),
+    ("users", "id", {"unique": True, "name": "user_id"}),
+]
+
+
+async def ensure_mongo_indexes() -> None:
+    """Create :data:`MONGO_INDEXES`; an unreachable Mongo is logged, not fatal."""
+    database = db.resolve()
+    for name, keys, options in MONGO_INDEXES:
+        create_index = getattr(getattr(database, name, None), "create_index", None)
+        if create_index is None:  # in-memory fallback
+            continue
+        try:
+            await create_index(keys, **options)
+        except Exception as exc:
+            logging.warning("Creating Mongo index %s failed: %s", options["name"], exc)
+
+
+parameter_registry = ParameterRegistry(lambda: db.parameter_mappings)
+
+
 # Sample workflows used for demo and tests
 SAMPLE_WORKFLOWS = [
     {
@@ -167,36 +257,18 @@ SAMPLE_MODELS = [
 
 
 # ---------------------------------------------------------------------------
-# Helpers for encrypted Civitai API key storage
+# Civitai API key, served from the in-memory secrets cache
 # ---------------------------------------------------------------------------
 
-fernet_secret = os.environ.get("FERNET_SECRET")
-if not fernet_secret:
-    secret = os.environ.get("SECRET_KEY", "secret-key")
-    key_bytes = secret.encode()[:32]
-    key_bytes += b"0" * (32 - len(key_bytes))
-    fernet_secret = base64.urlsafe_b64encode(key_bytes).decode()
-fernet = Fernet(fernet_secret)
+secret_provider = create_secrets_provider(db)
 
 
 async def get_civitai_key() -> Optional[str]:
-    if os.environ.get("CIVITAI_API_KEY"):
-        return os.environ["CIVITAI_API_KEY"]
-    record = await db.civitai_key.find_one({"_id": "global"})
-    if record and "key" in record:
-        try:
-            return fernet.decrypt(record["key"].encode()).decode()
-        except Exception:
-            return None
-    return None
+    return await secret_provider.get("civitai_key")
 
 
 async def store_civitai_key(api_key: str) -> None:
-    encrypted = fernet.encrypt(api_key.encode()).decode()
-    await db.civitai_key.update_one(
-        {"_id": "global"}, {"$set": {"key": encrypted}}, upsert=True
-    )
-    os.environ["CIVITAI_API_KEY"] = api_key
+    await secret_provider.set("civitai_key", api_key)
 
 
 # ---------------------------------------------------------------------------
@@ -205,6 +277,12 @@ async def store_civitai_key(api_key: str) -> None:
 
 COMFYUI_BASE_URL = os.environ.get("COMFYUI_BASE_URL", "http://localhost:8188")
 COMFYUI_API_KEY = os.environ.get("COMFYUI_API_KEY")
+# Comma separated ComfyUI instances generation jobs are spread across
+COMFYUI_INSTANCES = [
+    u.strip().rstrip("/")
+    for u in os.environ.get("COMFYUI_INSTANCES", "").split(",")
+    if u.strip()
+] or [COMFYUI_BASE_URL]
 
 
 def get_comfyui_url(request: Request) -> str:
@@ -229,8 +307,17 @@ def _inject_comfyui_api_key(payload: Dict[str, Any], api_key: Optional[str]) ->
     extra.setdefault("api_key_comfy_org", api_key)
 
 
-app = FastAPI()
-init_db()
+@contextlib.asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    """Bring up background work once the server is listening."""
+    await startup_tasks()
+    try:
+        yield
+    finally:
+        await shutdown_tasks()
+
+
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 
 
@@ -240,7 +327,30 @@ async def api_root():
     return api_response({"message": "ComfyUI Frontend API"})
 
 
-app.add_middleware(CSRFMiddleware, cookie_secure=not DEBUG_MODE)
+@api_router.get("/health/ready")
+async def health_ready():
+    """Readiness probe: 200 once startup finished and the database answers."""
+    checks = {"startup": _started, "database": False}
+    if _started:
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(text("SELECT 1"))
+            checks["database"] = True
+        except Exception as exc:
+            logging.warning("Readiness check failed: %s", exc)
+    ready = all(checks.values())
+    resp = api_response({"ready": ready, **checks}, success=ready)
+    if not ready:
+        resp.status_code = 503
+    return resp
+
+
+# Log endpoints are exempt: navigator.sendBeacon cannot send the CSRF header
+app.add_middleware(
+    CSRFMiddleware,
+    cookie_secure=not DEBUG_MODE,
+    exempt_paths=("/api/logs/frontend", "/api/logs/frontend/batch"),
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -255,12 +365,9 @@ app.add_middleware(
 # ---------------------------------------------------------------------------
 
 
-def get_sql_db() -> Session:
-    db = SessionLocal()
-    try:
+async def get_sql_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 # ---------------------------------------------------------------------------
@@ -268,17 +375,73 @@ def get_sql_db() -> Session:
 # ---------------------------------------------------------------------------
 
 jobs: Dict[str, Dict[str, Any]] = {}
+batches: Dict[str, Dict[str, Any]] = {}
 ws_clients: Dict[str, Set[WebSocket]] = {}
+# Jobs run in the worker that accepted them; with several workers their
+# progress is published here so any worker can stream it
+shared_state = LazySharedState()
+if shared_state.shared:
+    use_shared_state(shared_state)
+# Identifies this process in the shared state (job ownership, leases)
+WORKER_ID = uuid.uuid4().hex
+
+
+FINISHED = ("done", "cancelled", "failed")
+
+
+def _progress_message(job_id: str, job: Dict[str, Any]) -> Dict[str, Any]:
+    queue_size = sum(1 for j in jobs.values() if j["status"] not in FINISHED)
+    return {
+        "job": job,
+        "queue_size": queue_size,
+        "queue_position": fair_queue.position(job_id),
+    }
+
+
+async def _progress_snapshot(job_id: str) -> Optional[Dict[str, Any]]:
+    """Progress of a job run by this worker or, with shared state, any worker."""
+    job = jobs.get(job_id)
+    if job is not None:
+        return _progress_message(job_id, job)
+    if shared_state.shared:
+        return await shared_state.progress(job_id)
+    return None
+
+
+async def _batch_snapshot(
+    batch_id: str,
+) -> Optional[Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]]:
+    """Return ``(batch, jobs)`` for a batch accepted by this or, with shared state, any worker.
+
+    ``jobs`` maps each job of the batch to its state; jobs run by other
+    workers are known from their last published progress.
+    """
+    batch = batches.get(batch_id)
+    if batch is None and shared_state.shared:
+        batch = await shared_state.cache_get(f"batch:{batch_id}", PROGRESS_TTL)
+    if batch is None:
+        return None
+    found = {jid: jobs[jid] for jid in batch["jobs"] if jid in jobs}
+    remote = [jid for jid in batch["jobs"] if jid not in found]
+    if remote and shared_state.shared:
+        for jid, message in (await shared_state.progress_many(remote)).items():
+            found[jid] = message["job"]
+    return batch, found
 
 
 async def _notify_websockets(job_id: str) -> None:
     job = jobs.get(job_id)
     if not job:
         return
-    queue_size = sum(1 for j in jobs.values() if j["status"] != "done")
-    data = {"job": job, "queue_size": queue_size}
+    data = _progress_message(job_id, job)
+    if shared_state.shared:
+        await shared_state.publish_progress(job_id, data)
     connections = ws_clients.get(job_id, set()).copy()
     for ws in connections:
+        sub = preview_hub.subscriber(ws)
+        if sub is not None:
+            sub.offer_json(data)  # never waits on a slow preview socket
+            continue
         try:
             await ws.send_json(data)
         except Exception:
@@ -314,6 +477,28 @@ class GenerateRequest(BaseModel):
     mask: Optional[str] = None
 
 
+class BatchAxis(BaseModel):
+    code: constr(min_length=1)
+    values: List[str] = Field(..., min_length=1)
+
+
+class BatchGenerateRequest(BaseModel):
+    """Base prompt plus the variations to expand into individual jobs."""
+
+    prompt: constr(min_length=1, max_length=2000)
+    workflow_id: Optional[str] = None
+    seeds: Optional[List[int]] = None
+    count: int = Field(1, ge=1, le=batching.BATCH_MAX_JOBS)
+    seed_start: Optional[int] = None
+    values: Dict[str, List[str]] = Field(default_factory=dict)
+    x_axis: Optional[BatchAxis] = None
+    y_axis: Optional[BatchAxis] = None
+
+
+class JobPriority(BaseModel):
+    priority: int = Field(..., ge=-100, le=100)
+
+
 class CivitaiKey(BaseModel):
     api_key: str = Field(..., min_length=1)
 
@@ -352,25 +537,16 @@ async def create_parameter(mapping: ParameterMapping):
     doc = mapping.dict()
     doc["_id"] = mapping.id
     await db.parameter_mappings.insert_one(doc)
+    parameter_registry.upsert(doc)
     return api_response(mapping.dict())
 
 
 @api_router.get("/parameters", response_model=List[ParameterMapping])
-async def get_parameters():
-    records = await db.parameter_mappings.find().to_list(1000)
-    payload = [
-        {
-            "id": r.get("_id", r.get("id")),
-            "code": r.get("code"),
-            "node_id": r.get("node_id"),
-            "param_name": r.get("param_name"),
-            "value_template": r.get("value_template", "{value}"),
-            "injection_mode": r.get("injection_mode"),
-            "description": r.get("description", ""),
-        }
-        for r in records
-    ]
-    return api_response(payload)
+async def get_parameters(request: Request):
+    payload, etag = await parameter_registry.snapshot()
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return api_response(payload, headers={"ETag": etag})
 
 
 @api_router.put("/parameters/{param_id}", response_model=ParameterMapping)
@@ -380,12 +556,14 @@ async def update_parameter(param_id: str, mapping: ParameterMapping):
     await db.parameter_mappings.update_one(
         {"_id": param_id}, {"$set": doc}, upsert=True
     )
+    parameter_registry.upsert(doc)
     return api_response(mapping.dict())
 
 
 @api_router.delete("/parameters/{param_id}")
 async def delete_parameter(param_id: str):
     await db.parameter_mappings.delete_one({"_id": param_id})
+    parameter_registry.remove(param_id)
     return api_response({"message": "Parameter mapping deleted"})
 
 
@@ -396,7 +574,7 @@ async def delete_parameter(param_id: str):
 
 @api_router.post("/relational/workflows", response_model=WorkflowMapping)
 async def create_rel_workflow(
-    mapping: WorkflowMapping, dbs: Session = Depends(get_sql_db)
+    mapping: WorkflowMapping, dbs: AsyncSession = Depends(get_sql_db)
 ):
     wf = Workflow(
         id=mapping.id,
@@ -404,14 +582,16 @@ async def create_rel_workflow(
         description=mapping.description,
         data=json.dumps(mapping.data or {}),
     )
+    status = await _store_compiled(wf, mapping.data)
     dbs.add(wf)
-    dbs.commit()
-    return api_response(mapping.dict())
+    await dbs.commit()
+    await _workflow_changed(wf.id)
+    return api_response({**mapping.dict(), **status})
 
 
 @api_router.post("/relational/workflows/upload", response_model=WorkflowMapping)
 async def upload_rel_workflow(
-    payload: Dict[str, Any], dbs: Session = Depends(get_sql_db)
+    payload: Dict[str, Any], dbs: AsyncSession = Depends(get_sql_db)
 ):
     data = payload.get("data")
     if not isinstance(data, dict):
@@ -424,14 +604,16 @@ async def upload_rel_workflow(
         description=mapping.description,
         data=json.dumps(mapping.data or {}),
     )
+    status = await _store_compiled(wf, mapping.data)
     dbs.add(wf)
-    dbs.commit()
-    return api_response(mapping.dict())
+    await dbs.commit()
+    await _workflow_changed(wf.id)
+    return api_response({**mapping.dict(), **status})
 
 
 @api_router.get("/relational/workflows", response_model=List[WorkflowMapping])
-async def get_rel_workflows(dbs: Session = Depends(get_sql_db)):
-    wfs = dbs.query(Workflow).all()
+async def get_rel_workflows(dbs: AsyncSession = Depends(get_sql_db)):
+    wfs = (await dbs.scalars(select(Workflow))).all()
     payload = [
         {
             "id": w.id,
@@ -446,25 +628,37 @@ async def get_rel_workflows(dbs: Session = Depends(get_sql_db)):
 
 @api_router.put("/relational/workflows/{wf_id}", response_model=WorkflowMapping)
 async def update_rel_workflow(
-    wf_id: str, mapping: WorkflowMapping, dbs: Session = Depends(get_sql_db)
+    wf_id: str, mapping: WorkflowMapping, dbs: AsyncSession = Depends(get_sql_db)
 ):
-    wf = dbs.query(Workflow).filter(Workflow.id == wf_id).first()
+    wf = await dbs.get(Workflow, wf_id)
     if not wf:
         raise HTTPException(status_code=404, detail="Workflow not found")
     wf.name = mapping.name
     wf.description = mapping.description
     wf.data = json.dumps(mapping.data or {})
-    dbs.commit()
-    return api_response(mapping.dict())
+    status = await _store_compiled(wf, mapping.data)
+    await dbs.commit()
+    await _workflow_changed(wf_id)
+    return api_response({**mapping.dict(), **status})
+
+
+@api_router.get("/relational/workflows/{wf_id}/compiled")
+async def get_compiled_workflow(wf_id: str):
+    """Return the API-format graph that generations of this workflow patch."""
+    graph = await _workflow_graph(wf_id)
+    if not is_api_graph(graph):
+        raise HTTPException(status_code=404, detail="No compiled graph for this workflow")
+    return api_response(graph)
 
 
 @api_router.delete("/relational/workflows/{wf_id}")
-async def delete_rel_workflow(wf_id: str, dbs: Session = Depends(get_sql_db)):
-    wf = dbs.query(Workflow).filter(Workflow.id == wf_id).first()
+async def delete_rel_workflow(wf_id: str, dbs: AsyncSession = Depends(get_sql_db)):
+    wf = await dbs.get(Workflow, wf_id)
     if not wf:
         raise HTTPException(status_code=404, detail="Workflow not found")
-    dbs.delete(wf)
-    dbs.commit()
+    await dbs.delete(wf)
+    await dbs.commit()
+    await _workflow_changed(wf_id)
     return api_response({"message": "Workflow deleted"})
 
 
@@ -472,7 +666,7 @@ async def delete_rel_workflow(wf_id: str, dbs: Session = Depends(get_sql_db)):
 
 
 @api_router.post("/relational/actions", response_model=ActionMapping)
-async def create_action(mapping: ActionMapping, dbs: Session = Depends(get_sql_db)):
+async def create_action(mapping: ActionMapping, dbs: AsyncSession = Depends(get_sql_db)):
     action = Action(
         id=mapping.id,
         button=mapping.button,
@@ -481,13 +675,13 @@ async def create_action(mapping: ActionMapping, dbs: Session = Depends(get_sql_d
         parameters=json.dumps(mapping.parameters or {}),
     )
     dbs.add(action)
-    dbs.commit()
+    await dbs.commit()
     return api_response(mapping.dict())
 
 
 @api_router.get("/relational/actions", response_model=List[ActionMapping])
-async def get_actions(dbs: Session = Depends(get_sql_db)):
-    actions = dbs.query(Action).all()
+async def get_actions(dbs: AsyncSession = Depends(get_sql_db)):
+    actions = (await dbs.scalars(select(Action))).all()
     payload = [
         {
             "id": a.id,
@@ -503,26 +697,26 @@ async def get_actions(dbs: Session = Depends(get_sql_db)):
 
 @api_router.put("/relational/actions/{action_id}", response_model=ActionMapping)
 async def update_action(
-    action_id: str, mapping: ActionMapping, dbs: Session = Depends(get_sql_db)
+    action_id: str, mapping: ActionMapping, dbs: AsyncSession = Depends(get_sql_db)
 ):
-    action = dbs.query(Action).filter(Action.id == action_id).first()
+    action = await dbs.get(Action, action_id)
     if not action:
         raise HTTPException(status_code=404, detail="Action not found")
     action.button = mapping.button
     action.name = mapping.name
     action.workflow_id = mapping.workflow_id
     action.parameters = json.dumps(mapping.parameters or {})
-    dbs.commit()
+    await dbs.commit()
     return api_response(mapping.dict())
 
 
 @api_router.delete("/relational/actions/{action_id}")
-async def delete_action(action_id: str, dbs: Session = Depends(get_sql_db)):
-    action = dbs.query(Action).filter(Action.id == action_id).first()
+async def delete_action(action_id: str, dbs: AsyncSession = Depends(get_sql_db)):
+    action = await dbs.get(Action, action_id)
     if not action:
         raise HTTPException(status_code=404, detail="Action not found")
-    dbs.delete(action)
-    dbs.commit()
+    await dbs.delete(action)
+    await dbs.commit()
     return api_response({"message": "Action mapping deleted"})
 
 
@@ -530,8 +724,10 @@ async def delete_action(action_id: str, dbs: Session = Depends(get_sql_db)):
 
 
 @api_router.get("/relational/prompts")
-async def get_prompts(dbs: Session = Depends(get_sql_db)):
-    prompts = dbs.query(Prompt).all()
+async def get_prompts(dbs: AsyncSession = Depends(get_sql_db)):
+    # Snapshot queued rows first so a flush during the query can't hide them
+    pending = write_queue.pending(Prompt)
+    prompts = (await dbs.scalars(select(Prompt))).all()
     payload = [
         {
             "id": p.id,
@@ -541,22 +737,113 @@ async def get_prompts(dbs: Session = Depends(get_sql_db)):
         }
         for p in prompts
     ]
+    seen = {p["id"] for p in payload}
+    payload.extend(
+        {
+            "id": p["id"],
+            "text": p["text"],
+            "workflow_id": p.get("workflow_id"),
+            "created_at": p["created_at"],
+        }
+        for p in pending
+        if p["id"] not in seen
+    )
     return api_response(payload)
 
 
+def _output_dict(o: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": o["id"],
+        "prompt_id": o["prompt_id"],
+        "file_path": o["file_path"],
+        "created_at": o["created_at"],
+        "blurhash": o.get("blurhash"),
+        "thumb_url": f"/api/outputs/{o['id']}/thumb",
+    }
+
+
 @api_router.get("/relational/outputs")
-async def get_outputs(dbs: Session = Depends(get_sql_db)):
-    outputs = dbs.query(ImageOutput).all()
-    payload = [
+async def get_outputs(dbs: AsyncSession = Depends(get_sql_db)):
+    pending = write_queue.pending(ImageOutput)
+    outputs = (await dbs.scalars(select(ImageOutput))).all()
+    payload = [_output_dict(vars(o)) for o in outputs]
+    seen = {o["id"] for o in payload}
+    payload.extend(_output_dict(o) for o in pending if o["id"] not in seen)
+    return api_response(payload)
+
+
+@api_router.get("/history")
+async def get_history(
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    source: Optional[str] = None,
+    dbs: AsyncSession = Depends(get_sql_db),
+):
+    """Page through prompts and their outputs, newest first.
+
+    Covers jobs started here and ComfyUI history mirrored by the sync
+    worker; ``source`` limits results to one ComfyUI instance.
+    """
+    query = select(Prompt)
+    count = select(func.count()).select_from(Prompt)
+    if source:
+        query = query.where(Prompt.source == source)
+        count = count.where(Prompt.source == source)
+    rows = (
+        await dbs.scalars(
+            query.options(selectinload(Prompt.outputs))
+            .order_by(Prompt.created_at.desc(), Prompt.id.desc())
+            .limit(limit)
+            .offset(offset)
+        )
+    ).all()
+    items = [
         {
-            "id": o.id,
-            "prompt_id": o.prompt_id,
-            "file_path": o.file_path,
-            "created_at": o.created_at,
+            "id": p.id,
+            "text": p.text,
+            "workflow_id": p.workflow_id,
+            "created_at": p.created_at,
+            "source": p.source,
+            "outputs": [_output_dict(vars(o)) for o in p.outputs],
         }
-        for o in outputs
+        for p in rows
     ]
-    return api_response(payload)
+    return api_response(
+        {"items": items, "total": await dbs.scalar(count), "limit": limit, "offset": offset}
+    )
+
+
+@api_router.get("/outputs/{output_id}/thumb")
+async def get_output_thumbnail(
+    output_id: str,
+    request: Request,
+    size: int = 256,
+    format: Optional[str] = None,
+    dbs: AsyncSession = Depends(get_sql_db),
+):
+    """Serve a resized WebP/AVIF derivative of a generated image."""
+    output = await dbs.get(ImageOutput, output_id)
+    if output is None:
+        output = write_queue.get_pending(ImageOutput, output_id)
+        if output is None:
+            raise HTTPException(status_code=404, detail="Output not found")
+        output = types.SimpleNamespace(**output)
+    fmt = format or thumbnails.negotiate_format(request.headers.get("accept"))
+    if fmt not in thumbnails.available_formats():
+        raise HTTPException(status_code=400, detail="Unsupported thumbnail format")
+    size = thumbnails.pick_size(size)
+    path = await thumbnails.ensure_derivative(output.id, output.file_path, size, fmt)
+    if not path:
+        raise HTTPException(status_code=404, detail="Source image not available")
+
+    headers = {
+        "ETag": thumbnails.etag_for(path),
+        "Cache-Control": thumbnails.CACHE_CONTROL,
+        "Vary": "Accept",
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=f"image/{fmt}", headers=headers)
 
 
 # ---------------------------------------------------------------------------
@@ -581,67 +868,648 @@ async def get_models():
 # ---------------------------------------------------------------------------
 
 
-@api_router.post("/generate")
-async def start_generation(
-    payload: GenerateRequest,
-    background_tasks: BackgroundTasks = None,
-    dbs: Session = Depends(get_sql_db),
-):
-    prompt = payload.prompt.strip()
-    workflow_id = payload.workflow_id
+async def _enqueue_generation(
+    prompt: str,
+    workflow_id: Optional[str],
+    init_image: Any,
+    mask: Any,
+    owner: str,
+    extra: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Record a queued job and its Prompt row; start it with :func:`_start_jobs`."""
     job_id = str(uuid.uuid4())
+    clean_prompt, tokens = parse_prompt(prompt)
+    table = await parameter_registry.table()
     jobs[job_id] = {
         "status": "queued",
         "progress": 0,
         "prompt": prompt,
-        "init_image": payload.init_image,
-        "mask": payload.mask,
+        "owner": owner,
+        "worker": WORKER_ID,
+        "priority": 0,
+        "workflow_id": workflow_id,
+        "init_image": init_image,
+        "mask": mask,
+        "clean_prompt": clean_prompt,
+        "params": tokens,
+        "patches": tokens_to_patch(tokens, table),
+        "mapping_version": table.version,
+        **(extra or {}),
     }
+    await _notify_websockets(job_id)  # visible to the other workers right away
 
-    prm = Prompt(id=job_id, text=prompt, workflow_id=workflow_id)
-    dbs.add(prm)
-    dbs.commit()
+    await write_queue.add(Prompt, id=job_id, text=prompt, workflow_id=workflow_id)
+    return job_id
 
-    async def run_job(jid: str) -> None:
-        jobs[jid]["status"] = "generating"
-        await _notify_websockets(jid)
-        for i in range(1, 6):
-            await asyncio.sleep(0.1)
-            jobs[jid]["progress"] = i * 20
+
+# Per worker: workflow id -> (revision, graph), see _workflow_revision
+_workflow_graphs: Dict[str, Tuple[Any, Any]] = {}
+model_router = ModelAffinityRouter(COMFYUI_INSTANCES)
+# One cache-affinity queue per instance: each runs its own node cache
+schedulers = {url: CacheAffinityScheduler() for url in COMFYUI_INSTANCES}
+result_cache = ResultCache()
+fair_queue = FairShareQueue(capacity=len(COMFYUI_INSTANCES) * ADMIT_PER_INSTANCE)
+history_mirrors = {url: HistoryMirror(url) for url in COMFYUI_INSTANCES}
+compiled_graphs = CompiledGraphCache()
+preview_hub = PreviewHub()
+preview_listeners = {url: PreviewListener(url, preview_hub) for url in COMFYUI_INSTANCES}
+object_info_caches = {url: ObjectInfoCache(url) for url in COMFYUI_INSTANCES}
+
+
+def _request_user(request: Request) -> str:
+    """Identify the submitting user from the bearer token, else by client address."""
+    from .auth import token_subject  # auth opens its own Mongo client on import
+
+    subject = token_subject(request.headers.get("authorization"))
+    if subject:
+        return subject
+    return f"anon:{request.client.host if request.client else 'unknown'}"
+
+
+def _image_fingerprint(image: Any) -> str:
+    if isinstance(image, dict):
+        return image.get("sha256") or json.dumps(image, sort_keys=True)
+    if image:
+        return hashlib.sha256(str(image).encode("utf-8")).hexdigest()
+    return ""
+
+
+def _job_result_key(job: Dict[str, Any], graph: Any) -> Tuple[Optional[str], Optional[str]]:
+    """Return ``(key, None)`` for a reproducible job or ``(None, reason)``."""
+    extra = {
+        "init_image": _image_fingerprint(job.get("init_image")),
+        "mask": _image_fingerprint(job.get("mask")),
+    }
+    if is_api_graph(graph):
+        patched = apply_patches(graph, job["patches"])
+        reason = nondeterminism(patched)
+        if reason:
+            return None, reason
+        return result_key(patched, extra), None
+    # Without a stored graph only an explicit --seed makes a request repeatable
+    if "seed" not in job["params"]:
+        return None, "no fixed seed"
+    extra["params"] = json.dumps(job["params"], sort_keys=True)
+    stand_in = stand_in_graph(job.get("workflow_id"), job["clean_prompt"], job["patches"])
+    return result_key(stand_in, extra), None
+
+
+async def _load_schemas(schemas_cache: ObjectInfoCache) -> None:
+    try:
+        await schemas_cache.ensure()
+    except (httpx.HTTPError, ValueError) as exc:
+        logging.warning("Node schemas unavailable: %s", exc)
+
+
+async def _compile_workflow(
+    data: Any, wait: bool = True
+) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Compile an editor-format workflow to API format.
+
+    Returns ``(content_hash, graph)``, or ``(None, None)`` for data in any
+    other format. The graph is ``None`` while no ComfyUI instance can
+    provide node schemas; such workflows compile on first use instead.
+    Without ``wait`` uncached schemas are fetched in the background rather
+    than awaited, so saving a workflow never waits on ComfyUI.
+    Raises :class:`CompileError` for workflows that cannot be compiled.
+    """
+    if not is_ui_workflow(data):
+        return None, None
+    key = content_hash(data)
+    graph = compiled_graphs.get(key)
+    if graph is not None:
+        return key, graph
+    schemas_cache = object_info_caches[COMFYUI_INSTANCES[0]]
+    if not wait and not schemas_cache.loaded:
+        task = asyncio.create_task(_load_schemas(schemas_cache))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+        return key, None
+    try:
+        await schemas_cache.ensure()
+    except (httpx.HTTPError, ValueError) as exc:
+        logging.warning("Node schemas unavailable, compiling workflow later: %s", exc)
+        return key, None
+
+    @functools.lru_cache(maxsize=None)
+    def schema(class_type: str) -> Optional[Dict[str, Any]]:
+        raw = schemas_cache.node(class_type)
+        return json.loads(raw) if raw is not None else None
+
+    return compiled_graphs.compile(data, schema, key)
+
+
+async def _store_compiled(wf: Workflow, data: Any) -> Dict[str, Any]:
+    """Set ``wf.compiled`` from ``data`` and describe the outcome."""
+    try:
+        key, graph = await _compile_workflow(data, wait=False)
+    except CompileError as exc:
+        wf.compiled, wf.content_hash = None, None
+        return {"compiled": False, "compile_error": str(exc)}
+    wf.compiled = json.dumps(graph) if graph is not None else None
+    wf.content_hash = key if graph is not None else None
+    return {"compiled": graph is not None}
+
+
+def _revision_key(workflow_id: Optional[str]) -> str:
+    return f"workflow-rev:{workflow_id or '*'}"
+
+
+async def _workflow_revision(workflow_id: str) -> Tuple[Any, Any]:
+    """Marks that change whenever any worker saves ``workflow_id`` or restores."""
+    forever = float("inf")
+    return (
+        await shared_state.cache_get(_revision_key(None), forever),
+        await shared_state.cache_get(_revision_key(workflow_id), forever),
+    )
+
+
+async def _workflow_changed(workflow_id: Optional[str] = None) -> None:
+    """Drop the cached graph of ``workflow_id`` (all graphs when ``None``) in every worker."""
+    if workflow_id is None:
+        _workflow_graphs.clear()
+    else:
+        _workflow_graphs.pop(workflow_id, None)
+    await shared_state.cache_set(_revision_key(workflow_id), uuid.uuid4().hex)
+
+
+async def _workflow_graph(workflow_id: Optional[str]) -> Any:
+    """Return the API-format graph of a relational workflow, cached per id.
+
+    Editor-format workflows use the graph compiled when they were saved
+    while its content hash still matches, and are compiled (and the
+    result stored) otherwise. Unknown ids are not cached, so a workflow
+    created later is picked up.
+    """
+    if not workflow_id:
+        return None
+    revision = await _workflow_revision(workflow_id)
+    cached = _workflow_graphs.get(workflow_id)
+    if cached is not None and cached[0] == revision:
+        return cached[1]
+    async with AsyncSessionLocal() as session:
+        wf = await session.get(Workflow, workflow_id)
+    if wf is None:
+        return None
+    data = json.loads(wf.data) if wf.data else None
+    graph = data
+    if is_ui_workflow(data):
+        key = content_hash(data)
+        if wf.compiled and wf.content_hash == key:
+            graph = json.loads(wf.compiled)
+            compiled_graphs.put(key, graph)
+        else:
+            try:
+                key, graph = await _compile_workflow(data)
+            except CompileError as exc:
+                logging.warning("Workflow %s does not compile: %s", workflow_id, exc)
+                graph = None
+            if graph is None:
+                return None  # retried once node schemas are available
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    update(Workflow)
+                    .where(Workflow.id == workflow_id)
+                    .values(compiled=json.dumps(graph), content_hash=key)
+                )
+                await session.commit()
+    _workflow_graphs[workflow_id] = (revision, graph)
+    return graph
+
+
+async def _execute_job(jid: str, job: Dict[str, Any], graph: Any) -> None:
+    """Route an admitted job to an instance and run it there."""
+    if job.get("cancel_requested"):
+        raise JobCancelled(jid)
+    signature = job_signature(
+        graph,
+        workflow_id=job.get("workflow_id"),
+        clean_prompt=job["clean_prompt"],
+        patches=job["patches"],
+    )
+    models = (
+        extract_model_set(apply_patches(graph, job["patches"]))
+        if is_api_graph(graph)
+        else frozenset()
+    )
+    instance = model_router.route(models)
+    job["instance"] = instance.url
+    try:
+        async with schedulers[instance.url].slot(jid, signature) as ticket:
+            job["cache_hit_estimate"] = round(ticket.hit_rate, 3)
+            job["status"] = "generating"
+            await _notify_websockets(jid)
+            for i in range(1, 6):
+                if job.get("cancel_requested"):
+                    raise JobCancelled(jid)
+                await asyncio.sleep(0.1)
+                job["progress"] = i * 20
+                await _notify_websockets(jid)
+            job["status"] = "done"
             await _notify_websockets(jid)
-        jobs[jid]["status"] = "done"
+    finally:
+        model_router.complete(instance, models)
+
+
+async def _run_job(jid: str) -> None:
+    """Run a job, ending it as ``failed`` if anything raises so streams terminate."""
+    job = jobs[jid]
+    try:
+        await _process_job(jid, job)
+    except Exception as exc:
+        logging.exception("Job %s failed", jid)
+        if job["status"] not in FINISHED:
+            job.update(status="failed", error=str(exc))
+            await _notify_websockets(jid)
+
+
+async def _process_job(jid: str, job: Dict[str, Any]) -> None:
+    graph = await _workflow_graph(job.get("workflow_id"))
+    key, reason = _job_result_key(job, graph)
+    job["cached"] = False
+    if key is None:
+        result_cache.stats["uncacheable"] += 1
+        job["uncacheable"] = reason
+    else:
+        cached = await result_cache.lookup(key)
+        if cached is not None:
+            # Identical deterministic request: link the existing files
+            for output in cached["outputs"]:
+                await write_queue.add(
+                    ImageOutput,
+                    prompt_id=jid,
+                    file_path=output["file_path"],
+                    blurhash=output["blurhash"],
+                    result_key=key,
+                )
+            job.update(status="done", progress=100, cached=True, cached_from=cached["prompt_id"])
+            await _notify_websockets(jid)
+            return
+    try:
+        async with fair_queue.slot(jid, job["owner"], priority=job["priority"]):
+            await _execute_job(jid, job, graph)
+    except JobCancelled:
+        job["status"] = "cancelled"
         await _notify_websockets(jid)
-        with SessionLocal() as dbi:
-            out = ImageOutput(prompt_id=jid, file_path=f"{jid}.png")
-            dbi.add(out)
-            dbi.commit()
+        return
+    out = await write_queue.add(
+        ImageOutput, prompt_id=jid, file_path=f"{jid}.png", result_key=key
+    )
+    blurhash = await thumbnails.generate_derivatives(out["id"], out["file_path"])
+    if key is not None:
+        result_cache.store(key, jid, [{"file_path": out["file_path"], "blurhash": blurhash}])
+
 
+async def _run_jobs(job_ids: List[str]) -> None:
+    # Started together so the scheduler can order them by cache affinity
+    await asyncio.gather(*(_run_job(jid) for jid in job_ids))
+
+
+def _start_jobs(background_tasks: Optional[BackgroundTasks], job_ids: List[str]) -> None:
     if background_tasks is not None:
-        background_tasks.add_task(run_job, job_id)
+        background_tasks.add_task(_run_jobs, job_ids)
     else:  # pragma: no cover - tests run sync
-        asyncio.create_task(run_job(job_id))
+        asyncio.create_task(_run_jobs(job_ids))
+
+
+@api_router.post("/generate")
+async def start_generation(
+    payload: GenerateRequest,
+    request: Request,
+    background_tasks: BackgroundTasks = None,
+):
+    job_id = await _enqueue_generation(
+        payload.prompt.strip(),
+        payload.workflow_id,
+        payload.init_image,
+        payload.mask,
+        _request_user(request),
+    )
+    _start_jobs(background_tasks, [job_id])
     return api_response({"job_id": job_id})
 
 
+@api_router.post("/generate/batch")
+async def start_batch_generation(
+    payload: BatchGenerateRequest,
+    request: Request,
+    background_tasks: BackgroundTasks,
+):
+    """Expand seeds, shortcode value lists and X/Y axes into one job each.
+
+    All jobs share a parent ``batch_id`` whose aggregated progress is
+    streamed from ``/api/progress/batch/{batch_id}``.
+    """
+    x_axis = (payload.x_axis.code, payload.x_axis.values) if payload.x_axis else None
+    y_axis = (payload.y_axis.code, payload.y_axis.values) if payload.y_axis else None
+    # Check the limit before generating a seed sweep of ``count`` seeds
+    size = batching.batch_size(
+        payload.seeds or range(payload.count),
+        payload.values,
+        x_axis[1] if x_axis else (),
+        y_axis[1] if y_axis else (),
+    )
+    if size > batching.BATCH_MAX_JOBS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch expands to {size} jobs; the limit is {batching.BATCH_MAX_JOBS}",
+        )
+    seeds = payload.seeds or (
+        batching.sweep_seeds(payload.count, payload.seed_start)
+        if payload.count > 1 or payload.seed_start is not None
+        else []
+    )
+
+    clean_prompt, params = parse_prompt(payload.prompt.strip())
+    batch_id = str(uuid.uuid4())
+    expanded = batching.expand_batch(
+        params, seeds=seeds, values=payload.values, x_axis=x_axis, y_axis=y_axis
+    )
+    owner = _request_user(request)
+    job_ids = []
+    for entry in expanded:
+        job_ids.append(
+            await _enqueue_generation(
+                batching.compose_prompt(clean_prompt, entry["params"]),
+                payload.workflow_id,
+                None,
+                None,
+                owner,
+                extra={
+                    "batch_id": batch_id,
+                    "variation": entry["variation"],
+                    "cell": entry["cell"],
+                },
+            )
+        )
+    batches[batch_id] = {
+        "id": batch_id,
+        "owner": owner,
+        "jobs": job_ids,
+        "axes": {
+            "x": {"code": x_axis[0], "values": x_axis[1]} if x_axis else None,
+            "y": {"code": y_axis[0], "values": y_axis[1]} if y_axis else None,
+        },
+    }
+    if shared_state.shared:
+        await shared_state.cache_set(f"batch:{batch_id}", batches[batch_id])
+    _start_jobs(background_tasks, job_ids)
+    return api_response({"batch_id": batch_id, "job_ids": job_ids})
+
+
+@api_router.post("/generate/multipart")
+async def start_generation_multipart(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    prompt: str = Form(..., min_length=1, max_length=2000),
+    workflow_id: Optional[str] = Form(None),
+    init_image: Optional[UploadFile] = File(None),
+    mask: Optional[UploadFile] = File(None),
+):
+    """Start a generation with init image and mask sent as binary parts.
+
+    Files are spooled to disk, deduplicated by content hash and forwarded
+    to ComfyUI unchanged; the job records the ComfyUI file references.
+    """
+    if mask is not None and init_image is None:
+        raise HTTPException(status_code=400, detail="mask requires init_image")
+    base = get_comfyui_url(request)
+    image_ref = mask_ref = None
+    try:
+        if init_image is not None:
+            stored = await uploads.spool_upload(init_image)
+            image_ref = await uploads.forward_upload(base, stored)
+            image_ref["sha256"] = stored["sha256"]
+        if mask is not None:
+            stored = await uploads.spool_upload(mask)
+            original = {k: v for k, v in image_ref.items() if k != "sha256"}
+            mask_ref = await uploads.forward_upload(base, stored, "mask", original_ref=original)
+            mask_ref["sha256"] = stored["sha256"]
+    except httpx.HTTPError as exc:
+        logging.warning("Forwarding upload to ComfyUI failed: %s", exc)
+        return api_response(None, success=False, error=str(exc))
+    job_id = await _enqueue_generation(
+        prompt.strip(), workflow_id, image_ref, mask_ref, _request_user(request)
+    )
+    _start_jobs(background_tasks, [job_id])
+    return api_response({"job_id": job_id, "init_image": image_ref, "mask": mask_ref})
+
+
+async def _owned_job(job_id: str, request: Request) -> Tuple[Dict[str, Any], bool]:
+    """Return ``(job, local)``; ``local`` is False for jobs run by another worker.
+
+    Another worker's job is only known from its last published progress.
+    """
+    job, local = jobs.get(job_id), True
+    if job is None and shared_state.shared:
+        message = await shared_state.progress(job_id)
+        job, local = (message or {}).get("job"), False
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.get("owner") != _request_user(request):
+        raise HTTPException(status_code=403, detail="Job belongs to another user")
+    if not local and not job.get("worker"):
+        raise HTTPException(status_code=409, detail="Job is owned by another worker")
+    return job, local
+
+
+def _cancel(job_id: str, job: Dict[str, Any]) -> bool:
+    if job["status"] in FINISHED:
+        return False
+    # Waiting jobs are dropped from the fair queue; running ones stop at
+    # their next progress step
+    if not fair_queue.cancel(job_id):
+        job["cancel_requested"] = True
+    return True
+
+
+def _reprioritize(job_id: str, job: Dict[str, Any], priority: int) -> bool:
+    job["priority"] = priority
+    return fair_queue.reprioritize(job_id, priority)
+
+
+async def _control_worker() -> None:
+    """Apply cancel and priority requests other workers received for our jobs."""
+    while True:
+        await asyncio.sleep(CONTROL_POLL)
+        try:
+            controls = await shared_state.take_controls(WORKER_ID)
+        except Exception as exc:  # pragma: no cover - log and continue
+            logging.exception("Reading job controls failed: %s", exc)
+            continue
+        for job_id, command in controls:
+            job = jobs.get(job_id)
+            if job is None:
+                continue
+            if command.get("action") == "cancel":
+                _cancel(job_id, job)
+            elif command.get("action") == "priority":
+                _reprioritize(job_id, job, int(command["priority"]))
+            await _notify_websockets(job_id)
+
+
+@api_router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, request: Request):
+    """Cancel one of the caller's queued or running jobs.
+
+    Jobs running in another worker are cancelled by that worker within
+    ``CJ_SHARED_CONTROL_POLL`` seconds; the response says ``forwarded``.
+    """
+    job, local = await _owned_job(job_id, request)
+    if job["status"] in FINISHED:
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    if not local:
+        await shared_state.send_control(job["worker"], job_id, {"action": "cancel"})
+        return api_response({"job_id": job_id, "cancelled": True, "forwarded": True})
+    _cancel(job_id, job)
+    return api_response({"job_id": job_id, "cancelled": True})
+
+
+@api_router.post("/jobs/{job_id}/priority")
+async def reprioritize_job(job_id: str, payload: JobPriority, request: Request):
+    """Reorder a waiting job among the caller's own queued jobs.
+
+    Priority only decides which of a user's jobs goes next; it never moves
+    a job ahead of other users' fair share.
+    """
+    job, local = await _owned_job(job_id, request)
+    if not local:
+        command = {"action": "priority", "priority": payload.priority}
+        await shared_state.send_control(job["worker"], job_id, command)
+        return api_response({"job_id": job_id, "priority": payload.priority, "forwarded": True})
+    waiting = _reprioritize(job_id, job, payload.priority)
+    return api_response(
+        {"job_id": job_id, "priority": payload.priority, "queue_position": fair_queue.position(job_id), "waiting": waiting}
+    )
+
+
+@api_router.post("/generate/batch/{batch_id}/cancel")
+async def cancel_batch(batch_id: str, request: Request):
+    """Cancel every unfinished job of one of the caller's batches.
+
+    Jobs running in other workers are cancelled by them and listed under
+    ``forwarded`` as well.
+    """
+    snapshot = await _batch_snapshot(batch_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    batch, batch_jobs = snapshot
+    if batch.get("owner") != _request_user(request):
+        raise HTTPException(status_code=403, detail="Batch belongs to another user")
+    cancelled, forwarded = [], []
+    for jid in batch["jobs"]:
+        job = batch_jobs.get(jid)
+        if job is None:
+            continue
+        if jid in jobs:
+            if _cancel(jid, job):
+                cancelled.append(jid)
+        elif job["status"] not in FINISHED and job.get("worker"):
+            await shared_state.send_control(job["worker"], jid, {"action": "cancel"})
+            cancelled.append(jid)
+            forwarded.append(jid)
+    return api_response({"batch_id": batch_id, "cancelled": cancelled, "forwarded": forwarded})
+
+
+@api_router.post("/upload-image")
+async def upload_image(
+    request: Request,
+    file: UploadFile = File(...),
+    kind: str = Form("image"),
+    original_ref: Optional[str] = Form(None),
+):
+    """Store an image (or mask) by content hash and forward it to ComfyUI.
+
+    Masks need ``original_ref``, the JSON reference ComfyUI returned for the
+    image they belong to.
+    """
+    if kind not in ("image", "mask"):
+        raise HTTPException(status_code=400, detail="kind must be image or mask")
+    ref = None
+    if original_ref:
+        try:
+            ref = json.loads(original_ref)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="original_ref must be JSON")
+        if not isinstance(ref, dict):
+            raise HTTPException(status_code=422, detail="original_ref must be a JSON object")
+    if kind == "mask" and not ref:
+        raise HTTPException(status_code=400, detail="mask uploads require original_ref")
+    stored = await uploads.spool_upload(file)
+    info = uploads.public_info(stored)
+    try:
+        info["comfyui"] = await uploads.forward_upload(
+            get_comfyui_url(request), stored, kind, original_ref=ref
+        )
+    except httpx.HTTPError as exc:
+        logging.warning("Forwarding upload to ComfyUI failed: %s", exc)
+        return api_response(info, success=False, error=str(exc))
+    return api_response(info)
+
+
+def _preview_options(ws: WebSocket) -> Optional[Tuple[float, Optional[int]]]:
+    params = ws.query_params
+    if params.get("previews", "").lower() not in ("1", "true"):
+        return None
+    try:
+        fps = float(params.get("fps", PREVIEW_FPS))
+        max_size = int(params["max_size"]) if params.get("max_size") else None
+    except ValueError:
+        return PREVIEW_FPS, None
+    return fps, max_size
+
+
 @api_router.websocket("/progress/ws/{job_id}")
 async def websocket_progress(ws: WebSocket, job_id: str):
+    """Push progress as JSON; ``?previews=1`` adds live preview frames.
+
+    Previews arrive as binary messages framed like ComfyUI's
+    ``PREVIEW_IMAGE`` events (event type and image type as big-endian
+    uint32, then JPEG/PNG bytes), at most ``fps`` per second and fitted
+    into ``max_size`` pixels when given. ``job_id`` may also be a prompt
+    id returned by ``/api/comfyui/prompt``.
+    """
     await ws.accept()
     ws_clients.setdefault(job_id, set()).add(ws)
+    options = _preview_options(ws)
+    sub = preview_hub.subscribe(job_id, ws, *options) if options else None
+
+    async def send(data: Dict[str, Any]) -> None:
+        if sub is None:
+            await ws.send_json(data)
+        else:
+            sub.offer_json(data)
+
     try:
-        while True:
-            job = jobs.get(job_id)
-            if not job:
-                await ws.send_json({"event": "end", "error": "job_not_found"})
-                break
-            queue_size = sum(1 for j in jobs.values() if j["status"] != "done")
-            await ws.send_json({"job": job, "queue_size": queue_size})
-            if job["status"] == "done":
+        while sub is None or not sub.closed:
+            message = await _progress_snapshot(job_id)
+            if message is not None:
+                await send(message)
+                if message["job"]["status"] in FINISHED:
+                    break
+            elif preview_hub.tracked(job_id):
+                done = preview_hub.finished(job_id)
+                await send(
+                    {
+                        "prompt_id": job_id,
+                        "status": "done" if done else "generating",
+                        "progress": preview_hub.progress.get(job_id),
+                    }
+                )
+                if done:
+                    break
+            else:
+                await send({"event": "end", "error": "job_not_found"})
                 break
             await asyncio.sleep(0.1)
+        if sub is not None:
+            await sub.flush()
     except WebSocketDisconnect:
         pass
     finally:
         ws_clients[job_id].discard(ws)
+        if sub is not None:
+            preview_hub.unsubscribe(sub)
 
 
 @api_router.get("/progress/stream/{job_id}")
@@ -650,14 +1518,34 @@ async def progress_stream(request: Request, job_id: str):
 
     async def event_generator() -> AsyncIterator[str]:
         while True:
-            job = jobs.get(job_id)
-            if not job:
+            message = await _progress_snapshot(job_id)
+            if message is None:
                 yield f"data: {json.dumps({'event': 'end', 'error': 'job_not_found'})}\n\n"
                 break
-            queue_size = sum(1 for j in jobs.values() if j["status"] != "done")
-            payload = json.dumps({"job": job, "queue_size": queue_size})
+            payload = json.dumps(message)
             yield f"data: {payload}\n\n"
-            if job["status"] == "done":
+            if message["job"]["status"] in FINISHED:
+                break
+            await asyncio.sleep(0.1)
+            if await request.is_disconnected():
+                break
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+@api_router.get("/progress/batch/{batch_id}")
+async def batch_progress_stream(request: Request, batch_id: str):
+    """Stream aggregated progress for every job of a batch via SSE."""
+
+    async def event_generator() -> AsyncIterator[str]:
+        while True:
+            snapshot = await _batch_snapshot(batch_id)
+            if snapshot is None:
+                yield f"data: {json.dumps({'event': 'end', 'error': 'batch_not_found'})}\n\n"
+                break
+            summary = batching.aggregate_progress(*snapshot)
+            yield f"data: {json.dumps(summary)}\n\n"
+            if summary["status"] == "done":
                 break
             await asyncio.sleep(0.1)
             if await request.is_disconnected():
@@ -679,11 +1567,22 @@ async def proxy_comfyui_prompt(request: Request, payload: Dict[str, Any]):
         base = get_comfyui_url(request)
         api_key = get_comfyui_api_key(request)
         _inject_comfyui_api_key(payload, api_key)
+        listener = preview_listeners.get(base.rstrip("/"))
+        if listener is not None and "client_id" not in payload:
+            # Route this prompt's previews to the relay's ComfyUI socket
+            payload["client_id"] = listener.client_id
+            listener.start()
         resp = requests.post(f"{base}/prompt", json=payload, timeout=30)
         data = resp.json()
         log_backend_call(
             "POST", f"{base}/prompt", payload, data, resp.status_code, start
         )
+        mirror = history_mirrors.get(base.rstrip("/"))
+        if isinstance(data, dict) and data.get("prompt_id"):
+            if mirror is not None:
+                mirror.track(data["prompt_id"])
+            if listener is not None and payload.get("client_id") == listener.client_id:
+                preview_hub.track(data["prompt_id"])
         return api_response(data)
     except Exception as exc:
         log_backend_call(
@@ -698,14 +1597,27 @@ async def proxy_comfyui_prompt(request: Request, payload: Dict[str, Any]):
 
 
 @api_router.get("/comfyui/history")
-async def proxy_comfyui_history(request: Request):
-    """Proxy generation history from ComfyUI."""
+async def proxy_comfyui_history(
+    request: Request,
+    max_items: int = Query(HISTORY_PAGE_SIZE, ge=1, le=1000),
+    offset: int = Query(-1, ge=-1),
+    prompt_id: Optional[str] = None,
+):
+    """Proxy one page of generation history from ComfyUI.
+
+    ``offset=-1`` returns the newest ``max_items`` entries. Prefer
+    ``/api/history``, which is served from the local mirror.
+    """
     start = datetime.utcnow().timestamp()
     try:
         base = get_comfyui_url(request)
-        resp = requests.get(f"{base}/history", timeout=30)
+        if prompt_id:
+            url, params = f"{base}/history/{prompt_id}", None
+        else:
+            url, params = f"{base}/history", {"max_items": max_items, "offset": offset}
+        resp = requests.get(url, params=params, timeout=30)
         data = resp.json()
-        log_backend_call("GET", f"{base}/history", None, data, resp.status_code, start)
+        log_backend_call("GET", url, params, data, resp.status_code, start)
         return api_response(data)
     except Exception as exc:
         log_backend_call(
@@ -765,6 +1677,60 @@ async def comfyui_status(request: Request):
         return api_response({"status": "offline", "error": str(exc)})
 
 
+def _object_info_cache(request: Request) -> ObjectInfoCache:
+    """Cache of a configured instance, or a throwaway one for any other URL.
+
+    The URL can come from the client, so only ``COMFYUI_INSTANCES`` are
+    kept in memory and refreshed by the background worker.
+    """
+    base = get_comfyui_url(request).rstrip("/")
+    return object_info_caches.get(base) or ObjectInfoCache(base)
+
+
+async def _loaded_object_info(request: Request) -> ObjectInfoCache:
+    cache = _object_info_cache(request)
+    try:
+        await cache.ensure()
+    except (httpx.HTTPError, ValueError) as exc:
+        raise HTTPException(status_code=502, detail=f"ComfyUI object_info unavailable: {exc}")
+    return cache
+
+
+@api_router.get("/comfyui/object_info")
+async def comfyui_object_info(request: Request):
+    """Serve every node schema from the cache, gzipped when the client allows."""
+    cache = await _loaded_object_info(request)
+    headers = {"ETag": cache.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == cache.etag:
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", "").lower():
+        headers["Content-Encoding"] = "gzip"
+        return Response(cache.envelope_gz, media_type="application/json", headers=headers)
+    return Response(gzip.decompress(cache.envelope_gz), media_type="application/json", headers=headers)
+
+
+@api_router.get("/comfyui/object_info/search")
+async def comfyui_object_info_search(request: Request, q: str = "", limit: int = Query(50, ge=1, le=500)):
+    """Search node classes by name, title, category and input names.
+
+    Without ``q`` the whole precomputed index is returned for client-side
+    filtering.
+    """
+    cache = await _loaded_object_info(request)
+    results = search_index(cache.index, q, limit) if q.strip() else cache.index
+    return api_response(results, headers={"ETag": cache.etag})
+
+
+@api_router.get("/comfyui/object_info/{class_type}")
+async def comfyui_node_info(class_type: str, request: Request):
+    """Serve the schema of one node class."""
+    cache = await _loaded_object_info(request)
+    schema = cache.node(class_type)
+    if schema is None:
+        raise HTTPException(status_code=404, detail="Unknown node class")
+    return api_response(PreSerialized(schema), headers={"ETag": cache.etag})
+
+
 @api_router.post("/comfyui/restart")
 async def comfyui_restart(request: Request):
     """Attempt to restart the configured ComfyUI server."""
@@ -772,6 +1738,7 @@ async def comfyui_restart(request: Request):
     try:
         base = get_comfyui_url(request)
         resp = requests.post(f"{base}/restart", timeout=5)
+        _object_info_cache(request).mark_stale()
         data = resp.json() if resp.content else {"status": "ok"}
         log_backend_call(
             "POST",
@@ -901,6 +1868,7 @@ async def run_cleanup(background_tasks: BackgroundTasks, days: int = CLEAN_DAYS)
 
 @api_router.get("/maintenance/backup")
 async def download_backup():
+    await write_queue.flush()
     path = await async_backup_file(db=db)
     return FileResponse(path, filename=os.path.basename(path))
 
@@ -912,12 +1880,128 @@ async def upload_backup(request: Request):
     try:
         tmp.write(data)
         tmp.close()
+        await write_queue.flush()
         await async_restore_file(tmp.name, db=db)
     finally:
         os.unlink(tmp.name)
+    parameter_registry.invalidate()
+    secret_provider.invalidate()
+    await _workflow_changed()
+    result_cache.clear()
     return api_response({"message": "Restore completed"})
 
 
+@api_router.get("/maintenance/write-behind")
+async def write_behind_status():
+    """Report queued inserts and how far behind the database they are."""
+    return api_response(write_queue.snapshot())
+
+
+@api_router.get("/maintenance/scheduler")
+async def scheduler_status():
+    """Report queue state and the estimated ComfyUI node-cache hit rate."""
+    return api_response({url: s.snapshot() for url, s in schedulers.items()})
+
+
+async def _history_sync_worker() -> None:
+    while True:
+        try:
+            # With several workers only the lease holder mirrors history
+            if await shared_state.lease("history-sync", WORKER_ID, ttl=HISTORY_SYNC_INTERVAL * 3):
+                await sync_all(history_mirrors.values())
+        except Exception as exc:  # pragma: no cover - log and continue
+            logging.exception("History sync failed: %s", exc)
+        await asyncio.sleep(HISTORY_SYNC_INTERVAL)
+
+
+@api_router.get("/maintenance/history-sync")
+async def history_sync_status():
+    """Report the cursor and counters of each ComfyUI history mirror."""
+    return api_response({url: m.snapshot() for url, m in history_mirrors.items()})
+
+
+@api_router.post("/maintenance/history-sync")
+async def run_history_sync():
+    """Mirror new ComfyUI history entries now instead of waiting for the worker."""
+    added = await sync_all(history_mirrors.values())
+    return api_response({"mirrored": added})
+
+
+async def _object_info_worker() -> None:
+    while True:
+        await asyncio.sleep(OBJECT_INFO_REFRESH)
+        for cache in list(object_info_caches.values()):
+            try:
+                await cache.check()
+            except Exception as exc:  # pragma: no cover - log and continue
+                logging.warning("Refreshing object_info from %s failed: %s", cache.base_url, exc)
+
+
+@api_router.get("/maintenance/object-info")
+async def object_info_status():
+    """Report the cached node schemas of each ComfyUI instance."""
+    return api_response({url: c.snapshot() for url, c in object_info_caches.items()})
+
+
+@api_router.get("/maintenance/shared-state")
+async def shared_state_status():
+    """Report which shared-state backend this worker uses and its counters."""
+    return api_response({"pid": os.getpid(), **shared_state.snapshot()})
+
+
+@api_router.get("/maintenance/previews")
+async def preview_status():
+    """Report preview subscribers and frames relayed, sent and dropped."""
+    return api_response(
+        {
+            **preview_hub.snapshot(),
+            "listeners": {url: l.connected for url, l in preview_listeners.items()},
+        }
+    )
+
+
+@api_router.get("/maintenance/secrets")
+async def secrets_status():
+    """Report which secrets are cached and how often the store was read."""
+    return api_response(secret_provider.snapshot())
+
+
+@api_router.post("/maintenance/secrets/rotate")
+async def rotate_secrets():
+    """Re-encrypt stored secrets with the current ``FERNET_SECRET``."""
+    rotated = await secret_provider.rotate()
+    return api_response({"rotated": rotated})
+
+
+@api_router.get("/maintenance/fair-queue")
+async def fair_queue_status():
+    """Report admitted and waiting jobs per user in the fair-share queue."""
+    return api_response(fair_queue.snapshot())
+
+
+@api_router.get("/maintenance/result-cache")
+async def result_cache_status():
+    """Report size and hit rate of the deterministic result cache."""
+    return api_response(result_cache.snapshot())
+
+
+@api_router.get("/maintenance/instances")
+async def instance_status():
+    """Report queue depth, loaded models and model swaps per ComfyUI instance."""
+    return api_response(model_router.snapshot())
+
+
+@api_router.post("/maintenance/thumbnails/backfill")
+async def start_thumbnail_backfill(restart: bool = False):
+    """Start (or resume) rendering derivatives for existing outputs."""
+    return api_response(thumbnails.start_backfill(restart=restart))
+
+
+@api_router.get("/maintenance/thumbnails/backfill")
+async def thumbnail_backfill_status():
+    return api_response(dict(thumbnails.backfill_status))
+
+
 @api_router.post("/download")
 async def download_file(req: DownloadRequest):
     filename = req.filename or os.path.basename(req.url.split("?")[0])
@@ -935,22 +2019,34 @@ async def download_file(req: DownloadRequest):
     return api_response({"saved_to": dest})
 
 
+@functools.lru_cache(maxsize=2)
+def _whisper_model(model_ref: str) -> Any:
+    """Load a Whisper model once; importing whisper pulls in torch."""
+    import whisper
+
+    return whisper.load_model(model_ref)
+
+
 @api_router.post("/transcribe")
 async def transcribe_audio(request: Request):
     """Transcribe uploaded audio using OpenAI Whisper."""
-    import whisper
-
     model_name = os.environ.get("WHISPER_MODEL", "base")
     model_path = os.environ.get("WHISPER_MODEL_PATH")
     model_ref = model_path if model_path else model_name
-    model = whisper.load_model(model_ref)
+    try:
+        model = await asyncio.to_thread(_whisper_model, model_ref)
+    except ImportError:
+        raise HTTPException(
+            status_code=503,
+            detail="Whisper is not installed (pip install -r requirements-transcribe.txt)",
+        )
 
     data = await request.body()
     tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".webm")
     try:
         tmp.write(data)
         tmp.close()
-        result = model.transcribe(tmp.name)
+        result = await asyncio.to_thread(model.transcribe, tmp.name)
     finally:
         os.unlink(tmp.name)
 
@@ -960,19 +2056,49 @@ async def transcribe_audio(request: Request):
 @api_router.post("/whisper/download")
 async def download_whisper_model(model: str, request: Request):
     """Download a Whisper model to the configured path."""
-    import whisper
+    try:
+        import whisper
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Whisper is not installed")
     path = os.environ.get("WHISPER_MODEL_PATH", ".")
     whisper._download(model, download_root=path)
     return api_response({"model": model, "path": path})
 
 
+frontend_logs = FrontendLogIngest()
+
+
+def _client_host(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
 @api_router.post("/logs/frontend")
 async def receive_frontend_log(request: Request):
     data = await request.json()
-    log_frontend_event(
-        {"client": request.client.host if request.client else None, **data}
-    )
-    return api_response({"logged": True})
+    event = data if isinstance(data, dict) else {"message": data}
+    result = await frontend_logs.ingest(_client_host(request), [event])
+    return api_response({"logged": result["accepted"] > 0})
+
+
+@api_router.post("/logs/frontend/batch")
+async def receive_frontend_log_batch(request: Request):
+    """Ingest a JSON array of browser events, optionally gzip-compressed.
+
+    Events are collapsed, sampled per level and rate-limited per client
+    before being buffered for the log file; the counts say what happened
+    to them.
+    """
+    try:
+        events = decode_batch(await request.body(), request.headers.get("content-encoding"))
+    except BatchError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return api_response(await frontend_logs.ingest(_client_host(request), events))
+
+
+@api_router.get("/maintenance/frontend-logs")
+async def frontend_log_status():
+    """Report frontend log ingestion counters and buffered lines."""
+    return api_response(frontend_logs.snapshot())
 
 
 # ---------------------------------------------------------------------------
@@ -988,13 +2114,54 @@ logging.basicConfig(
 )
 
 
-@app.on_event("startup")
-async def startup_tasks() -> None:
-    if CLEAN_INTERVAL > 0:
-        asyncio.create_task(_cleanup_worker())
+_started = False
+_background: Set[asyncio.Task] = set()
 
 
-@app.on_event("shutdown")
-async def shutdown_mongo() -> None:
-    if "_mongo_client" in globals():
-        _mongo_client.close()
+async def startup_tasks() -> None:
+    """Create tables and start the background workers.
+
+    Runs from the lifespan rather than at import, so importing the app
+    stays cheap; Mongo, Whisper and the Civitai client are created on
+    first use.
+    """
+    global _started
+    await asyncio.to_thread(init_db)
+    await asyncio.to_thread(shared_state.resolve)
+    workers = [parameter_registry.watch(), ensure_mongo_indexes()]
+    if CLEAN_INTERVAL > 0:
+        workers.append(_cleanup_worker())
+    if HISTORY_SYNC_INTERVAL > 0:
+        workers.append(_history_sync_worker())
+    if OBJECT_INFO_REFRESH > 0:
+        workers.append(_object_info_worker())
+    if shared_state.shared:
+        workers.append(_control_worker())
+    for worker in workers:
+        task = asyncio.create_task(worker)
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+    if thumbnails.backfill_pending():
+        thumbnails.start_backfill()
+    _started = True
+
+
+async def shutdown_tasks() -> None:
+    global _started
+    _started = False
+    tasks = list(_background)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _background.clear()
+    await asyncio.gather(*(listener.stop() for listener in preview_listeners.values()))
+    await shared_state.close()
+    if _mongo_client is not None:
+        try:
+            _mongo_client.close()
+        except Exception as exc:  # shutdown carries on regardless
+            logging.warning("Closing the Mongo client failed: %s", exc)
+    thumbnails.shutdown_pool()
+    await frontend_logs.writer.stop()
+    await write_queue.stop()
+    await dispose_async_engine()
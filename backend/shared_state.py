@@ -0,0 +1,338 @@
+"""State that every uvicorn worker process has to see.
+
+A single worker keeps everything in process memory (:class:`LocalState`).
+With ``CJ_WORKERS`` above one, or ``CJ_SHARED_STATE`` set to a file path,
+workers share a SQLite file instead (:class:`SQLiteState`): progress
+snapshots published by the worker running a job can be streamed by any
+other worker, and the Civitai response cache and request throttle are
+common to all of them. Requests to cancel or reprioritize a job that
+arrive at another worker are left in a per-worker mailbox that the
+owning worker polls.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .utils import dumps_json
+
+WORKERS = int(os.environ.get("CJ_WORKERS", "1"))
+SHARED_STATE_PATH = os.environ.get("CJ_SHARED_STATE") or (
+    "./shared_state.db" if WORKERS > 1 else None
+)
+# Finished jobs' progress is kept this long for late subscribers
+PROGRESS_TTL = float(os.environ.get("CJ_SHARED_PROGRESS_TTL", "3600"))
+PRUNE_EVERY = 500  # publishes between deletions of expired rows
+# Seconds between checks of this worker's job control mailbox
+CONTROL_POLL = float(os.environ.get("CJ_SHARED_CONTROL_POLL", "0.25"))
+
+
+class SharedState:
+    """Interface for process-shared state.
+
+    ``shared`` tells callers whether other workers can see what they
+    store; single-process callers skip publishing entirely.
+    """
+
+    shared = False
+
+    async def publish_progress(self, job_id: str, message: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    async def progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Latest progress message published for ``job_id``, if any."""
+        raise NotImplementedError
+
+    async def progress_many(self, job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Latest progress messages of those ``job_ids`` that have one."""
+        raise NotImplementedError
+
+    async def cache_get(self, key: str, ttl: float) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def cache_set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    async def reserve(self, key: str, interval: float) -> float:
+        """Claim the next slot of a rate limit; seconds to wait before using it."""
+        raise NotImplementedError
+
+    async def send_control(self, worker: str, job_id: str, command: Dict[str, Any]) -> None:
+        """Leave ``command`` for ``job_id`` in the mailbox of ``worker``."""
+        raise NotImplementedError
+
+    async def take_controls(self, worker: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Remove and return the ``(job_id, command)`` pairs left for ``worker``."""
+        raise NotImplementedError
+
+    async def lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew the lease ``name`` for ``owner``; whether ``owner`` holds it.
+
+        A lease held by another owner is only taken over once it has not
+        been renewed for ``ttl`` seconds.
+        """
+        raise NotImplementedError
+
+    def snapshot(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalState(SharedState):
+    """In-process state for a single worker."""
+
+    def __init__(self) -> None:
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        self._cache: Dict[str, tuple] = {}
+        self._slots: Dict[str, float] = {}
+        self._controls: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+
+    async def publish_progress(self, job_id: str, message: Dict[str, Any]) -> None:
+        self._progress[job_id] = message
+
+    async def progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._progress.get(job_id)
+
+    async def progress_many(self, job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return {jid: self._progress[jid] for jid in job_ids if jid in self._progress}
+
+    async def cache_get(self, key: str, ttl: float) -> Optional[Any]:
+        entry = self._cache.get(key)
+        if entry is None or time.time() - entry[0] >= ttl:
+            return None
+        return entry[1]
+
+    async def cache_set(self, key: str, value: Any) -> None:
+        self._cache[key] = (time.time(), value)
+
+    async def reserve(self, key: str, interval: float) -> float:
+        now = time.monotonic()
+        start = max(now, self._slots.get(key, 0.0))
+        self._slots[key] = start + interval
+        return start - now
+
+    async def send_control(self, worker: str, job_id: str, command: Dict[str, Any]) -> None:
+        self._controls.setdefault(worker, []).append((job_id, command))
+
+    async def take_controls(self, worker: str) -> List[Tuple[str, Dict[str, Any]]]:
+        return self._controls.pop(worker, [])
+
+    async def lease(self, name: str, owner: str, ttl: float) -> bool:
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": "local", "progress": len(self._progress), "cache": len(self._cache)}
+
+
+class SQLiteState(SharedState):
+    """State in a SQLite file opened by every worker.
+
+    Each thread gets its own connection in WAL mode, and all queries run in
+    worker threads so the event loop never waits on the file lock.
+    """
+
+    shared = True
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._conns: list = []
+        self._lock = threading.Lock()
+        self._publishes = 0
+        self.stats = {"published": 0, "reads": 0, "cache_hits": 0}
+        self._conn()  # create the schema up front
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS progress (
+                    job_id TEXT PRIMARY KEY, message TEXT NOT NULL, updated REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY, value TEXT NOT NULL, stored REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS slots (
+                    key TEXT PRIMARY KEY, next_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS controls (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, worker TEXT NOT NULL,
+                    job_id TEXT NOT NULL, command TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS controls_worker ON controls (worker);
+                """
+            )
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def _publish(self, job_id: str, payload: str, prune: bool) -> None:
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT INTO progress (job_id, message, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(job_id) DO UPDATE SET message = excluded.message, updated = excluded.updated",
+            (job_id, payload, now),
+        )
+        if prune:
+            conn.execute("DELETE FROM progress WHERE updated < ?", (now - PROGRESS_TTL,))
+
+    async def publish_progress(self, job_id: str, message: Dict[str, Any]) -> None:
+        payload = dumps_json(message).decode("utf-8")
+        self._publishes += 1
+        prune = self._publishes % PRUNE_EVERY == 0
+        await asyncio.to_thread(self._publish, job_id, payload, prune)
+        self.stats["published"] += 1
+
+    def _progress(self, job_id: str) -> Optional[str]:
+        row = self._conn().execute("SELECT message FROM progress WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    async def progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self.stats["reads"] += 1
+        payload = await asyncio.to_thread(self._progress, job_id)
+        return json.loads(payload) if payload is not None else None
+
+    def _progress_many(self, job_ids: List[str]) -> List[Tuple[str, str]]:
+        marks = ",".join("?" * len(job_ids))
+        return self._conn().execute(
+            f"SELECT job_id, message FROM progress WHERE job_id IN ({marks})", job_ids
+        ).fetchall()
+
+    async def progress_many(self, job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not job_ids:
+            return {}
+        self.stats["reads"] += 1
+        rows = await asyncio.to_thread(self._progress_many, list(job_ids))
+        return {jid: json.loads(payload) for jid, payload in rows}
+
+    def _cache_get(self, key: str, ttl: float) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND stored >= ?", (key, time.time() - ttl)
+        ).fetchone()
+        return row[0] if row else None
+
+    async def cache_get(self, key: str, ttl: float) -> Optional[Any]:
+        payload = await asyncio.to_thread(self._cache_get, key, ttl)
+        if payload is None:
+            return None
+        self.stats["cache_hits"] += 1
+        return json.loads(payload)
+
+    def _cache_set(self, key: str, payload: str) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache (key, value, stored) VALUES (?, ?, ?)",
+            (key, payload, time.time()),
+        )
+
+    async def cache_set(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self._cache_set, key, dumps_json(value).decode("utf-8"))
+
+    def _reserve(self, key: str, interval: float) -> float:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT next_at FROM slots WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            start = max(now, row[0] if row else 0.0)
+            conn.execute("INSERT OR REPLACE INTO slots (key, next_at) VALUES (?, ?)", (key, start + interval))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return start - now
+
+    async def reserve(self, key: str, interval: float) -> float:
+        return await asyncio.to_thread(self._reserve, key, interval)
+
+    def _send_control(self, worker: str, job_id: str, command: str) -> None:
+        self._conn().execute(
+            "INSERT INTO controls (worker, job_id, command) VALUES (?, ?, ?)", (worker, job_id, command)
+        )
+
+    async def send_control(self, worker: str, job_id: str, command: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._send_control, worker, job_id, dumps_json(command).decode("utf-8"))
+
+    def _take_controls(self, worker: str) -> List[Tuple[str, str]]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, job_id, command FROM controls WHERE worker = ? ORDER BY id", (worker,)
+            ).fetchall()
+            if rows:
+                conn.execute("DELETE FROM controls WHERE worker = ? AND id <= ?", (worker, rows[-1][0]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return [(job_id, command) for _, job_id, command in rows]
+
+    async def take_controls(self, worker: str) -> List[Tuple[str, Dict[str, Any]]]:
+        rows = await asyncio.to_thread(self._take_controls, worker)
+        return [(job_id, json.loads(command)) for job_id, command in rows]
+
+    def _lease(self, name: str, owner: str, ttl: float) -> bool:
+        conn = self._conn()
+        now = time.time()
+        cursor = conn.execute(
+            "INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE leases.owner = excluded.owner OR leases.expires < ?",
+            (name, owner, now + ttl, now),
+        )
+        return cursor.rowcount > 0
+
+    async def lease(self, name: str, owner: str, ttl: float) -> bool:
+        return await asyncio.to_thread(self._lease, name, owner, ttl)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": "sqlite", "path": self.path, "workers": WORKERS, **self.stats}
+
+    async def close(self) -> None:
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+
+def create_shared_state(path: Optional[str] = SHARED_STATE_PATH) -> SharedState:
+    """SQLite-backed state when a path is configured, else in-process state."""
+    return SQLiteState(path) if path else LocalState()
+
+
+class LazySharedState:
+    """Shared state that is only created (and its file opened) on first use.
+
+    ``shared`` is known from the configuration up front, so callers can
+    skip publishing without opening anything.
+    """
+
+    def __init__(self, path: Optional[str] = SHARED_STATE_PATH) -> None:
+        self.path = path
+        self.shared = bool(path)
+        self._state: Optional[SharedState] = None
+
+    def resolve(self) -> SharedState:
+        if self._state is None:
+            self._state = create_shared_state(self.path)
+        return self._state
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+    async def close(self) -> None:
+        if self._state is not None:
+            await self._state.close()
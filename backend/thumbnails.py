@@ -0,0 +1,357 @@
+"""Thumbnail and placeholder derivatives for generated image outputs."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image, features
+from sqlalchemy import and_, or_, select
+
+from .models import AsyncSessionLocal, ImageOutput
+from .write_behind import write_queue
+
+# Configuration via environment variables
+OUTPUT_DIR = os.environ.get("CJ_OUTPUT_DIR", "outputs")
+THUMB_DIR = os.environ.get("CJ_THUMB_DIR", "thumbnails")
+THUMB_SIZES: Tuple[int, ...] = tuple(
+    sorted(int(s) for s in os.environ.get("CJ_THUMB_SIZES", "128,256,512").split(",") if s)
+)
+THUMB_WORKERS = int(os.environ.get("CJ_THUMB_WORKERS", "2"))
+THUMB_QUALITY = int(os.environ.get("CJ_THUMB_QUALITY", "80"))
+BACKFILL_BATCH = int(os.environ.get("CJ_THUMB_BACKFILL_BATCH", "50"))
+
+# Derivatives never change once rendered, so browsers may cache them forever
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_POOL: Optional[Executor] = None
+
+
+def _get_pool() -> Optional[Executor]:
+    """Return the shared process pool, or ``None`` for the default thread pool."""
+    global _POOL
+    if THUMB_WORKERS <= 0:
+        return None
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(max_workers=THUMB_WORKERS)
+    return _POOL
+
+
+def shutdown_pool() -> None:
+    """Stop the worker processes used for rendering."""
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+def available_formats() -> List[str]:
+    """Return derivative formats supported by the installed Pillow build."""
+    formats = ["webp"]
+    if features.check("avif"):
+        formats.append("avif")
+    return formats
+
+
+def resolve_source(file_path: str) -> str:
+    """Resolve an ``ImageOutput.file_path`` against the output directory."""
+    if os.path.isabs(file_path):
+        return file_path
+    return os.path.join(OUTPUT_DIR, file_path)
+
+
+def derivative_dir(output_id: str) -> str:
+    return os.path.join(THUMB_DIR, output_id)
+
+
+def derivative_path(output_id: str, size: int, fmt: str) -> str:
+    return os.path.join(derivative_dir(output_id), f"{size}.{fmt}")
+
+
+def pick_size(requested: int) -> int:
+    """Return the smallest configured size covering ``requested``."""
+    for size in THUMB_SIZES:
+        if size >= requested:
+            return size
+    return THUMB_SIZES[-1]
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """Choose the best derivative format the client advertises."""
+    accept = (accept or "").lower()
+    if "image/avif" in accept and "avif" in available_formats():
+        return "avif"
+    return "webp"
+
+
+# ---------------------------------------------------------------------------
+# BlurHash encoding (https://blurha.sh)
+# ---------------------------------------------------------------------------
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _base83(value: int, length: int) -> str:
+    return "".join(
+        _BASE83[(value // 83 ** (length - i - 1)) % 83] for i in range(length)
+    )
+
+
+def _srgb_to_linear(value: int) -> float:
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash_encode(
+    image: Image.Image, x_components: int = 4, y_components: int = 3
+) -> str:
+    """Encode ``image`` as a compact BlurHash placeholder string."""
+    small = image.convert("RGB")
+    small.thumbnail((32, 32))
+    width, height = small.size
+    pixels = [
+        (_srgb_to_linear(r), _srgb_to_linear(g), _srgb_to_linear(b))
+        for r, g, b in small.getdata()
+    ]
+
+    factors: List[Tuple[float, float, float]] = []
+    for j in range(y_components):
+        for i in range(x_components):
+            norm = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                cos_y = math.cos(math.pi * j * y / height)
+                row = y * width
+                for x in range(width):
+                    basis = norm * math.cos(math.pi * i * x / width) * cos_y
+                    pr, pg, pb = pixels[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = 1 / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        actual_max = max(abs(c) for f in ac for c in f)
+        quant_max = max(0, min(82, int(actual_max * 166 - 0.5)))
+        max_value = (quant_max + 1) / 166
+        result += _base83(quant_max, 1)
+    else:
+        max_value = 1.0
+        result += _base83(0, 1)
+
+    dc_value = (
+        (_linear_to_srgb(dc[0]) << 16)
+        + (_linear_to_srgb(dc[1]) << 8)
+        + _linear_to_srgb(dc[2])
+    )
+    result += _base83(dc_value, 4)
+    for factor in ac:
+        quant = [
+            max(0, min(18, int(math.floor(
+                math.copysign(abs(c / max_value) ** 0.5, c) * 9 + 9.5
+            ))))
+            for c in factor
+        ]
+        result += _base83(quant[0] * 19 * 19 + quant[1] * 19 + quant[2], 2)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Rendering (runs inside worker processes)
+# ---------------------------------------------------------------------------
+
+
+def render_derivatives(
+    src: str, dest_dir: str, sizes: Sequence[int], formats: Sequence[str]
+) -> Tuple[List[str], str]:
+    """Write resized copies of ``src`` and return their paths plus a BlurHash."""
+    os.makedirs(dest_dir, exist_ok=True)
+    written: List[str] = []
+    with Image.open(src) as im:
+        im.load()
+        mode = "RGBA" if "A" in im.getbands() else "RGB"
+        base = im.convert(mode)
+    blurhash = blurhash_encode(base)
+    for size in sizes:
+        thumb = base.copy()
+        thumb.thumbnail((size, size), Image.LANCZOS)
+        for fmt in formats:
+            path = os.path.join(dest_dir, f"{size}.{fmt}")
+            tmp = f"{path}.tmp"
+            thumb.save(tmp, format=fmt.upper(), quality=THUMB_QUALITY)
+            os.replace(tmp, path)
+            written.append(path)
+    return written, blurhash
+
+
+# Errors Pillow raises for undecodable, truncated or oversized images
+RENDER_ERRORS = (OSError, SyntaxError, ValueError, Image.DecompressionBombError)
+# Sources that failed to render, with the (mtime, size) they had then, so a
+# broken file is not re-rendered on every request until it changes
+_unrenderable: Dict[str, Tuple[float, int]] = {}
+
+
+async def generate_derivatives(output_id: str, file_path: str) -> Optional[str]:
+    """Render all derivatives for an output and store its BlurHash.
+
+    Returns the BlurHash, or ``None`` when the source image is not on disk
+    or cannot be decoded.
+    """
+    src = resolve_source(file_path)
+    try:
+        st = os.stat(src)
+    except OSError:
+        logging.debug("No source image for output %s at %s", output_id, src)
+        return None
+    version = (st.st_mtime, st.st_size)
+    if _unrenderable.get(src) == version:
+        return None
+    loop = asyncio.get_running_loop()
+    try:
+        _, blurhash = await loop.run_in_executor(
+            _get_pool(),
+            render_derivatives,
+            src,
+            derivative_dir(output_id),
+            THUMB_SIZES,
+            available_formats(),
+        )
+    except RENDER_ERRORS as exc:
+        logging.warning("Cannot render thumbnails for output %s from %s: %s", output_id, src, exc)
+        _unrenderable[src] = version
+        return None
+    _unrenderable.pop(src, None)
+    if await write_queue.update_pending(ImageOutput, output_id, blurhash=blurhash):
+        return blurhash
+    async with AsyncSessionLocal() as session:
+        row = await session.get(ImageOutput, output_id)
+        if row is not None:
+            row.blurhash = blurhash
+            await session.commit()
+    return blurhash
+
+
+async def ensure_derivative(
+    output_id: str, file_path: str, size: int, fmt: str
+) -> Optional[str]:
+    """Return the path of a derivative, rendering it on demand if missing."""
+    path = derivative_path(output_id, size, fmt)
+    if not os.path.exists(path):
+        await generate_derivatives(output_id, file_path)
+    return path if os.path.exists(path) else None
+
+
+def etag_for(path: str) -> str:
+    st = os.stat(path)
+    name = os.path.basename(path)
+    return f'"{name}-{st.st_size:x}-{int(st.st_mtime):x}"'
+
+
+# ---------------------------------------------------------------------------
+# Resumable backfill for outputs recorded before derivatives existed
+# ---------------------------------------------------------------------------
+
+backfill_status: Dict[str, Any] = {"running": False, "processed": 0, "done": False}
+_backfill_task: Optional[asyncio.Task] = None
+
+
+def _state_path() -> str:
+    return os.path.join(THUMB_DIR, "backfill.json")
+
+
+def _load_state() -> Dict[str, Any]:
+    try:
+        with open(_state_path(), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {"cursor": None, "processed": 0, "done": False}
+
+
+def _save_state(state: Dict[str, Any]) -> None:
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    tmp = _state_path() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, _state_path())
+
+
+async def backfill_derivatives(batch_size: int = BACKFILL_BATCH) -> Dict[str, Any]:
+    """Render derivatives for every output lacking a BlurHash.
+
+    Progress is checkpointed on a ``(created_at, id)`` cursor after each batch
+    so an interrupted run picks up where it stopped.
+    """
+    state = _load_state()
+    state["done"] = False
+    backfill_status.update(running=True, processed=state["processed"], done=False)
+    try:
+        while True:
+            query = select(
+                ImageOutput.id,
+                ImageOutput.file_path,
+                ImageOutput.created_at,
+                ImageOutput.blurhash,
+            )
+            if state["cursor"]:
+                created, last_id = state["cursor"]
+                query = query.where(
+                    or_(
+                        ImageOutput.created_at > created,
+                        and_(ImageOutput.created_at == created, ImageOutput.id > last_id),
+                    )
+                )
+            query = query.order_by(ImageOutput.created_at, ImageOutput.id).limit(batch_size)
+            async with AsyncSessionLocal() as session:
+                rows = (await session.execute(query)).all()
+            if not rows:
+                break
+            for output_id, file_path, _, blurhash in rows:
+                if blurhash:
+                    continue
+                try:
+                    await generate_derivatives(output_id, file_path)
+                except Exception:  # pragma: no cover - corrupt images are skipped
+                    logging.exception("Thumbnail generation failed for %s", output_id)
+            last = rows[-1]
+            state["cursor"] = [last[2], last[0]]
+            state["processed"] += len(rows)
+            _save_state(state)
+            backfill_status["processed"] = state["processed"]
+        state["done"] = True
+        _save_state(state)
+        backfill_status["done"] = True
+        return state
+    finally:
+        backfill_status["running"] = False
+
+
+def start_backfill(restart: bool = False) -> Dict[str, Any]:
+    """Start the backfill in the background unless it is already running."""
+    global _backfill_task
+    if restart and not backfill_status["running"]:
+        _save_state({"cursor": None, "processed": 0, "done": False})
+    if _backfill_task is None or _backfill_task.done():
+        _backfill_task = asyncio.create_task(backfill_derivatives())
+        backfill_status["running"] = True
+    return dict(backfill_status)
+
+
+def backfill_pending() -> bool:
+    """Return True when a previous backfill was interrupted before finishing."""
+    state = _load_state()
+    return state["cursor"] is not None and not state["done"]
@@ -0,0 +1,153 @@
+"""Content-addressed storage for uploaded init images and masks."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException, UploadFile
+
+# Configuration via environment variables
+UPLOAD_DIR = os.environ.get("CJ_UPLOAD_DIR", "uploads")
+UPLOAD_MAX_BYTES = int(os.environ.get("CJ_UPLOAD_MAX_BYTES", str(32 * 1024 * 1024)))
+UPLOAD_CHUNK = 1024 * 1024
+FORWARD_TIMEOUT = float(os.environ.get("CJ_UPLOAD_FORWARD_TIMEOUT", "60"))
+FORWARD_CACHE_MAX = 1024
+
+# (magic prefix, extension, media type); WebP is checked separately
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png", "image/png"),
+    (b"\xff\xd8\xff", "jpg", "image/jpeg"),
+    (b"GIF87a", "gif", "image/gif"),
+    (b"GIF89a", "gif", "image/gif"),
+)
+
+# (base_url, kind, sha256, original name) -> ComfyUI file reference
+_forwarded: "OrderedDict[Tuple[str, str, str, str], Dict[str, Any]]" = OrderedDict()
+
+
+def sniff_image(head: bytes) -> Optional[Tuple[str, str]]:
+    """Return ``(extension, media_type)`` for a supported image header."""
+    for magic, ext, media_type in _SIGNATURES:
+        if head.startswith(magic):
+            return ext, media_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp", "image/webp"
+    return None
+
+
+def stored_path(sha256: str, ext: str) -> str:
+    return os.path.join(UPLOAD_DIR, f"{sha256}.{ext}")
+
+
+async def spool_upload(upload: UploadFile) -> Dict[str, Any]:
+    """Stream ``upload`` to disk in chunks, keyed by its SHA-256.
+
+    The file is hashed while it is copied so it is never held in memory as
+    a whole. Content already on disk is not stored twice; ``deduplicated``
+    reports whether that happened.
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    fd, tmp = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK)
+                if not chunk:
+                    break
+                if len(head) < 16:
+                    head += chunk[: 16 - len(head)]
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail="Upload too large")
+                digest.update(chunk)
+                fh.write(chunk)
+        kind = sniff_image(head)
+        if kind is None:
+            raise HTTPException(status_code=415, detail="Unsupported image type")
+        ext, media_type = kind
+        sha256 = digest.hexdigest()
+        path = stored_path(sha256, ext)
+        deduplicated = os.path.exists(path)
+        if deduplicated:
+            os.unlink(tmp)
+        else:
+            os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return {
+        "sha256": sha256,
+        "size": size,
+        "content_type": media_type,
+        "path": path,
+        "filename": f"cj_{sha256[:16]}.{ext}",
+        "deduplicated": deduplicated,
+    }
+
+
+async def forward_upload(
+    base_url: str,
+    stored: Dict[str, Any],
+    kind: str = "image",
+    original_ref: Optional[Dict[str, Any]] = None,
+    client: Optional[httpx.AsyncClient] = None,
+) -> Dict[str, Any]:
+    """Send a stored upload to ComfyUI ``/upload/image`` or ``/upload/mask``.
+
+    The bytes are streamed from disk unchanged. ComfyUI file names derive
+    from the content hash, so a file already forwarded to ``base_url`` is
+    not sent again.
+    """
+    if kind not in ("image", "mask"):
+        raise ValueError(f"unknown upload kind {kind!r}")
+    if kind == "mask" and not original_ref:
+        raise ValueError("mask uploads need the reference of the original image")
+    original = original_ref.get("name", "") if original_ref else ""
+    key = (base_url, kind, stored["sha256"], original)
+    cached = _forwarded.get(key)
+    if cached is not None:
+        _forwarded.move_to_end(key)
+        return dict(cached)
+
+    filename = stored["filename"]
+    if kind == "mask":
+        filename = f"cj_mask_{stored['sha256'][:16]}_{os.path.splitext(original)[0]}.png"
+    data = {"type": "input", "overwrite": "true"}
+    if original_ref:
+        data["original_ref"] = json.dumps(original_ref)
+
+    owns_client = client is None
+    if owns_client:
+        client = httpx.AsyncClient(timeout=FORWARD_TIMEOUT)
+    try:
+        with open(stored["path"], "rb") as fh:
+            resp = await client.post(
+                f"{base_url}/upload/{kind}",
+                data=data,
+                files={"image": (filename, fh, stored["content_type"])},
+            )
+        resp.raise_for_status()
+        ref = resp.json()
+    finally:
+        if owns_client:
+            await client.aclose()
+
+    _forwarded[key] = ref
+    while len(_forwarded) > FORWARD_CACHE_MAX:
+        _forwarded.popitem(last=False)
+    return dict(ref)
+
+
+def public_info(stored: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the client-facing fields of a stored upload."""
+    return {k: v for k, v in stored.items() if k != "path"}
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from typing import List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel
 from datetime import datetime
+import base64
+import json
 import uuid
-from auth import get_current_active_user, UserInDB, UserPublic
+from auth import get_current_active_user, invalidate_user_cache, UserInDB, UserPublic
 
 # MongoDB connection is imported from auth module
 from auth import db
@@ -30,14 +33,81 @@ class UserPreferences(BaseModel):
     default_parameters: Optional[Dict[str, Any]] = None
     custom_actions: Optional[List[Dict[str, Any]]] = []
 
+class SavedImagePage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+# Gallery list views skip the heavy blobs; the detail endpoint returns them
+LIST_PROJECTION = {"_id": 0, "parameters": 0, "metadata": 0}
+DETAIL_PROJECTION = {"_id": 0}
+GALLERY_SORT = [("created_at", -1), ("id", -1)]
+
 # Create router
 user_router = APIRouter(prefix="/api/users", tags=["users"])
 
-@user_router.get("/images", response_model=List[SavedImage])
-async def get_user_images(current_user: UserInDB = Depends(get_current_active_user)):
-    """Get all images saved by the current user"""
-    images = await db.saved_images.find({"user_id": current_user.id}).sort("created_at", -1).to_list(1000)
-    return api_response(images)
+
+def _encode_cursor(image: Dict[str, Any]) -> str:
+    created = image["created_at"]
+    if isinstance(created, datetime):
+        created = created.isoformat()
+    raw = json.dumps([created, image["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created, image_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created), str(image_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
+@user_router.get("/images", response_model=SavedImagePage)
+async def get_user_images(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    """Get a page of the current user's images, newest first.
+
+    Pass the returned ``next_cursor`` to fetch the following page.
+    """
+    query: Dict[str, Any] = {"user_id": current_user.id}
+    if cursor:
+        created, image_id = _decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created}},
+            {"created_at": created, "id": {"$lt": image_id}},
+        ]
+    images = (
+        await db.saved_images.find(query, LIST_PROJECTION)
+        .sort(GALLERY_SORT)
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+    next_cursor = _encode_cursor(images[limit - 1]) if len(images) > limit else None
+    return api_response(
+        jsonable_encoder({"items": images[:limit], "next_cursor": next_cursor})
+    )
+
+
+@user_router.get("/images/{image_id}", response_model=SavedImage)
+async def get_user_image(
+    image_id: str,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """Get a single saved image including its parameters and metadata"""
+    image = await db.saved_images.find_one(
+        {"id": image_id, "user_id": current_user.id}, DETAIL_PROJECTION
+    )
+    if not image:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    return api_response(jsonable_encoder(image))
 
 @user_router.post("/images", response_model=SavedImage)
 async def save_image(
@@ -67,7 +137,7 @@ async def delete_image(
 ):
     """Delete an image from the user's gallery"""
     # Ensure the image belongs to the current user
-    image = await db.saved_images.find_one({"id": image_id})
+    image = await db.saved_images.find_one({"id": image_id}, {"user_id": 1})
     if not image or image["user_id"] != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -80,7 +150,7 @@ async def delete_image(
 @user_router.get("/preferences", response_model=UserPreferences)
 async def get_preferences(current_user: UserInDB = Depends(get_current_active_user)):
     """Get the user's preferences"""
-    user = await db.users.find_one({"id": current_user.id})
+    user = await db.users.find_one({"id": current_user.id}, {"preferences": 1})
     preferences = user.get("preferences", {})
     return api_response(UserPreferences(**preferences))
 
@@ -94,6 +164,7 @@ async def update_preferences(
         {"id": current_user.id},
         {"$set": {"preferences": preferences.dict()}}
     )
+    invalidate_user_cache(user_id=current_user.id)
     return api_response(preferences)
 
 @user_router.post("/share/{image_id}")
@@ -104,7 +175,7 @@ async def share_image(
 ):
     """Share an image to specified platforms"""
     # Ensure the image belongs to the current user
-    image = await db.saved_images.find_one({"id": image_id})
+    image = await db.saved_images.find_one({"id": image_id}, {"user_id": 1})
     if not image or image["user_id"] != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
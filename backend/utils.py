@@ -1,12 +1,29 @@
 import os
 from fastapi.responses import JSONResponse
-from typing import Any, Dict, Optional
-from datetime import datetime
+from typing import Any, Dict, Mapping, Optional
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from uuid import UUID
 import json
 import logging
 
+from pydantic import BaseModel
+
+try:  # optional fast encoder
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+
+try:  # optional MessagePack support
+    import msgspec
+except ImportError:  # pragma: no cover - MessagePack is simply not offered
+    msgspec = None
+
 DEBUG_MODE = os.environ.get("DEBUG", "false").lower() == "true"
 
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
 # Directory to store log files
 LOGS_DIR = os.environ.get("LOGS_DIR", "logs")
 os.makedirs(LOGS_DIR, exist_ok=True)
@@ -16,17 +33,126 @@ LOG_BACKEND_PATH = os.path.join(LOGS_DIR, "log_backend.txt")
 LOG_FRONTEND_PATH = os.path.join(LOGS_DIR, "log_frontend.txt")
 
 
-def api_response(payload: Any = None, *, success: bool = True, debug_info: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> JSONResponse:
-    """Return a standardized API response."""
-    body = {
+def _json_default(obj: Any) -> Any:
+    """Encode values the JSON encoders do not handle natively."""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump() if hasattr(obj, "model_dump") else obj.dict()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_json(content: Any) -> bytes:
+        """Serialize ``content`` to compact UTF-8 JSON bytes."""
+        return orjson.dumps(content, default=_json_default, option=_ORJSON_OPTS)
+
+else:  # pragma: no cover - exercised only without orjson installed
+
+    def dumps_json(content: Any) -> bytes:
+        """Serialize ``content`` to compact UTF-8 JSON bytes."""
+        return json.dumps(
+            content, default=_json_default, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+if msgspec is not None:
+    _msgpack_encoder = msgspec.msgpack.Encoder(enc_hook=_json_default)
+
+    def dumps_msgpack(content: Any) -> bytes:
+        """Serialize ``content`` to MessagePack bytes."""
+        return _msgpack_encoder.encode(content)
+
+else:  # pragma: no cover
+    dumps_msgpack = None
+
+
+class PreSerialized(bytes):
+    """JSON bytes embedded verbatim as the ``payload`` of an API response.
+
+    Lets hot endpoints serialize a cached payload once instead of on every
+    request. The envelope around it is still rendered per response.
+    """
+
+
+def _accepts_msgpack(scope: Mapping[str, Any]) -> bool:
+    for name, value in scope.get("headers") or ():
+        if name == b"accept":
+            return MSGPACK_MEDIA_TYPE.encode() in value.lower()
+    return False
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, with opt-in MessagePack.
+
+    Datetimes, dates, UUIDs and pydantic models are encoded natively. A
+    client sending ``Accept: application/msgpack`` gets the same content as
+    MessagePack when msgspec is installed; everyone else gets JSON.
+    """
+
+    def __init__(self, content: Any, *args: Any, **kwargs: Any) -> None:
+        self._content = content
+        super().__init__(content, *args, **kwargs)
+        if dumps_msgpack is not None and not isinstance(content, bytes):
+            self.headers.append("Vary", "Accept")
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps_json(content)
+
+    async def __call__(self, scope, receive, send) -> None:
+        if (
+            dumps_msgpack is not None
+            and not isinstance(self._content, bytes)
+            and self.status_code not in (204, 304)
+            and _accepts_msgpack(scope)
+        ):
+            self.body = dumps_msgpack(self._content)
+            self.headers["content-type"] = MSGPACK_MEDIA_TYPE
+            self.headers["content-length"] = str(len(self.body))
+        await super().__call__(scope, receive, send)
+
+
+def api_response(
+    payload: Any = None,
+    *,
+    success: bool = True,
+    debug_info: Optional[Dict[str, Any]] = None,
+    error: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> FastJSONResponse:
+    """Return a standardized API response.
+
+    A ``bytes`` payload (normally :class:`PreSerialized`) is embedded as an
+    already encoded JSON fragment, in which case the response is always JSON.
+    """
+    raw = isinstance(payload, bytes)
+    body: Dict[str, Any] = {
         "success": success,
-        "payload": payload,
+        "payload": None if raw else payload,
     }
     if not success and error is not None:
         body["error"] = error
     if DEBUG_MODE and debug_info is not None:
         body["debug"] = debug_info
-    return JSONResponse(content=body)
+    if raw:
+        envelope = dumps_json(body)
+        marker = b'"payload":null'
+        idx = envelope.index(marker)
+        content = envelope[:idx] + b'"payload":' + payload + envelope[idx + len(marker):]
+        return FastJSONResponse(content=content, headers=headers)
+    return FastJSONResponse(content=body, headers=headers)
 
 
 def _write_log(entry: Dict[str, Any], path: str) -> None:
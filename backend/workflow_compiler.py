@@ -0,0 +1,224 @@
+"""Compile workflows saved from the ComfyUI editor into API format."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+COMPILED_CACHE_MAX = int(os.environ.get("CJ_COMPILED_CACHE_MAX", "256"))
+
+# Node modes in the editor format
+MODE_ALWAYS = 0
+MODE_NEVER = 2  # muted
+MODE_BYPASS = 4
+# Editor-only nodes that never reach the server
+VIRTUAL_NODES = {"Reroute", "PrimitiveNode", "Note", "MarkdownNote"}
+# Extra widget the editor adds after seed inputs, and its values
+SEED_CONTROL_VALUES = {"fixed", "increment", "decrement", "randomize"}
+SEED_INPUT_NAMES = {"seed", "noise_seed"}
+# Upload buttons serialize a placeholder value after their combo
+UPLOAD_OPTIONS = {"image_upload": "image", "video_upload": "video", "audio_upload": "audio"}
+
+SchemaLookup = Callable[[str], Optional[Mapping[str, Any]]]
+
+
+class CompileError(ValueError):
+    """Raised when an editor workflow cannot be turned into API format."""
+
+
+def is_ui_workflow(data: Any) -> bool:
+    """True for editor exports: a ``nodes`` list plus a ``links`` list."""
+    return (
+        isinstance(data, dict)
+        and isinstance(data.get("nodes"), list)
+        and isinstance(data.get("links"), list)
+    )
+
+
+def content_hash(data: Any) -> str:
+    """Hash of a workflow's content, independent of key order."""
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _is_widget(spec: Any) -> bool:
+    # Combo lists and primitive types are widgets; other types are sockets
+    if not isinstance(spec, (list, tuple)) or not spec:
+        return False
+    kind = spec[0]
+    return isinstance(kind, list) or kind in ("INT", "FLOAT", "STRING", "BOOLEAN", "COMBO")
+
+
+def _widget_inputs(schema: Mapping[str, Any]) -> List[Tuple[str, Mapping[str, Any]]]:
+    inputs = schema.get("input") or {}
+    order = schema.get("input_order") or {}
+    widgets = []
+    for group in ("required", "optional"):
+        specs = inputs.get(group) or {}
+        for name in order.get(group) or list(specs):
+            spec = specs.get(name)
+            if _is_widget(spec):
+                options = spec[1] if len(spec) > 1 and isinstance(spec[1], dict) else {}
+                widgets.append((name, options))
+    return widgets
+
+
+def _widget_values(node: Mapping[str, Any], schema: Mapping[str, Any]) -> Dict[str, Any]:
+    """Map a node's ``widgets_values`` onto its schema's widget inputs."""
+    values = node.get("widgets_values")
+    if isinstance(values, dict):
+        return dict(values)
+    values = list(values or [])
+    result: Dict[str, Any] = {}
+    i = 0
+    for name, options in _widget_inputs(schema):
+        if i >= len(values):
+            break
+        result[name] = values[i]
+        i += 1
+        seed_like = name in SEED_INPUT_NAMES or options.get("control_after_generate")
+        if seed_like and i < len(values) and values[i] in SEED_CONTROL_VALUES:
+            i += 1
+        for option, placeholder in UPLOAD_OPTIONS.items():
+            if options.get(option) and i < len(values) and values[i] == placeholder:
+                i += 1
+    return result
+
+
+def compile_workflow(data: Mapping[str, Any], schemas: SchemaLookup) -> Dict[str, Any]:
+    """Return the API-format graph (``{id: {class_type, inputs}}``) of ``data``.
+
+    Links are resolved through reroute nodes and bypassed nodes (which
+    pass their first input of the matching type through), primitive
+    nodes become literal values, and muted nodes are dropped along with
+    the inputs they fed. Widget values are matched to input names with
+    the node schemas from ``/object_info``.
+    """
+    if not is_ui_workflow(data):
+        raise CompileError("not an editor workflow (expected nodes and links lists)")
+    try:
+        return _compile(data, schemas)
+    except CompileError:
+        raise
+    except (LookupError, TypeError, AttributeError, ValueError) as exc:
+        # Shapes the editor never writes, e.g. short links or non-dict slots
+        raise CompileError(f"malformed editor workflow: {exc!r}") from exc
+
+
+def _compile(data: Mapping[str, Any], schemas: SchemaLookup) -> Dict[str, Any]:
+    nodes = {str(n["id"]): n for n in data["nodes"] if isinstance(n, dict) and "id" in n}
+    links = {}
+    for link in data["links"]:
+        if isinstance(link, dict):
+            link = [link.get(k) for k in ("id", "origin_id", "origin_slot", "target_id", "target_slot", "type")]
+        if not isinstance(link, list) or len(link) < 3:
+            raise CompileError(f"malformed link: {link!r}")
+        links[link[0]] = (str(link[1]), link[2])
+
+    missing = sorted(
+        {
+            str(n.get("type"))
+            for n in nodes.values()
+            if n.get("type") not in VIRTUAL_NODES
+            and n.get("mode", MODE_ALWAYS) not in (MODE_NEVER, MODE_BYPASS)
+            and schemas(n.get("type")) is None
+        }
+    )
+    if missing:
+        raise CompileError(f"unknown node types: {', '.join(missing)}")
+
+    def resolve(link_id: Any, seen: frozenset = frozenset()) -> Optional[Tuple[str, Any]]:
+        """Follow a link to ``("link", [node, slot])`` or ``("value", v)``."""
+        if link_id is None or link_id not in links or link_id in seen:
+            return None
+        seen = seen | {link_id}
+        origin_id, slot = links[link_id]
+        origin = nodes.get(origin_id)
+        if origin is None:
+            return None
+        kind = origin.get("type")
+        mode = origin.get("mode", MODE_ALWAYS)
+        if kind == "PrimitiveNode":
+            values = origin.get("widgets_values") or [None]
+            return ("value", values[0])
+        if kind == "Reroute":
+            inputs = origin.get("inputs") or [{}]
+            return resolve(inputs[0].get("link"), seen)
+        if mode == MODE_NEVER:
+            return None
+        if mode == MODE_BYPASS:
+            outputs = origin.get("outputs") or []
+            wanted = outputs[slot].get("type") if slot < len(outputs) else None
+            inputs = origin.get("inputs") or []
+            candidates = ([inputs[slot]] if slot < len(inputs) else []) + inputs
+            for candidate in candidates:
+                if candidate.get("type") == wanted and candidate.get("link") is not None:
+                    return resolve(candidate["link"], seen)
+            return None
+        return ("link", [origin_id, slot])
+
+    graph: Dict[str, Any] = {}
+    for node_id, node in nodes.items():
+        kind = node.get("type")
+        if kind in VIRTUAL_NODES or node.get("mode", MODE_ALWAYS) in (MODE_NEVER, MODE_BYPASS):
+            continue
+        schema = schemas(kind) or {}
+        inputs = _widget_values(node, schema)
+        for slot in node.get("inputs") or []:
+            name = (slot.get("widget") or {}).get("name") or slot.get("name")
+            resolved = resolve(slot.get("link"))
+            if resolved is None:
+                if slot.get("link") is not None:
+                    inputs.pop(name, None)  # fed by a muted node
+                continue
+            inputs[name] = resolved[1]
+        entry: Dict[str, Any] = {"class_type": kind, "inputs": inputs}
+        if node.get("title"):
+            entry["_meta"] = {"title": node["title"]}
+        graph[node_id] = entry
+    return graph
+
+
+class CompiledGraphCache:
+    """LRU of compiled graphs keyed by workflow content hash."""
+
+    def __init__(self, max_entries: int = COMPILED_CACHE_MAX) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stats = {"hits": 0, "compiled": 0, "errors": 0}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        graph = self._entries.get(key)
+        if graph is not None:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+        return graph
+
+    def put(self, key: str, graph: Dict[str, Any]) -> None:
+        self._entries[key] = graph
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def compile(
+        self, data: Mapping[str, Any], schemas: SchemaLookup, key: Optional[str] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Return ``(content_hash, graph)``, compiling only unseen content."""
+        key = key or content_hash(data)
+        graph = self.get(key)
+        if graph is not None:
+            return key, graph
+        try:
+            graph = compile_workflow(data, schemas)
+        except CompileError:
+            self.stats["errors"] += 1
+            raise
+        self.stats["compiled"] += 1
+        self.put(key, graph)
+        return key, graph
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "max_entries": self.max_entries, **self.stats}
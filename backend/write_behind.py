@@ -0,0 +1,206 @@
+"""Write-behind queue that coalesces hot inserts into batched transactions."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from .models import AsyncSessionLocal, Base, column_defaults
+
+# Flush every FLUSH_INTERVAL_MS or as soon as MAX_ROWS rows are pending.
+# An interval of 0 writes every row through immediately.
+FLUSH_INTERVAL_MS = float(os.environ.get("WRITE_BEHIND_INTERVAL_MS", "50"))
+MAX_ROWS = int(os.environ.get("WRITE_BEHIND_MAX_ROWS", "500"))
+# Failed flushes are retried after a delay doubling up to MAX_BACKOFF seconds
+MAX_BACKOFF = float(os.environ.get("WRITE_BEHIND_MAX_BACKOFF", "30"))
+DEAD_LETTER_MAX = 100  # rejected rows kept for inspection
+
+
+class WriteBehindQueue:
+    """Buffer ORM inserts and write them in periodic batches.
+
+    Rows get their primary key and column defaults when queued, so callers
+    can use them right away. Readers that must see their own writes should
+    merge :meth:`pending` with what they read from the database.
+
+    When a batch fails, its rows are retried one at a time. Rows the
+    database rejects (integrity or data errors) are moved to
+    :attr:`dead_letters` so they cannot hold up the rest; on any other
+    error the rows stay queued and the flusher backs off.
+    """
+
+    def __init__(self, interval_ms: float = FLUSH_INTERVAL_MS, max_rows: int = MAX_ROWS) -> None:
+        self.interval = interval_ms / 1000
+        self.max_rows = max_rows
+        self._pending: List[Tuple[Any, Dict[str, Any], float]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._backoff = 0.0
+        self.dead_letters: Deque[Dict[str, Any]] = deque(maxlen=DEAD_LETTER_MAX)
+        self.stats: Dict[str, float] = {
+            "batches": 0,
+            "rows_written": 0,
+            "failures": 0,
+            "dead_lettered": 0,
+            "last_batch_rows": 0,
+            "last_flush_lag_ms": 0.0,
+            "max_flush_lag_ms": 0.0,
+        }
+
+    # -- loop binding -------------------------------------------------------
+
+    def _bind(self) -> None:
+        """(Re)create loop-bound primitives when called from a new event loop."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._wakeup = asyncio.Event()
+            self._task = None
+        if self.interval > 0 and not self._stopping and (self._task is None or self._task.done()):
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._pending:
+                try:
+                    await self.flush()
+                    self._backoff = 0.0
+                except Exception:
+                    # already logged; rows stay queued for the next attempt
+                    self._backoff = min(MAX_BACKOFF, max(self.interval, self._backoff * 2))
+                    await asyncio.sleep(self._backoff)
+
+    # -- public API ---------------------------------------------------------
+
+    async def add(self, model: Any, **values: Any) -> Dict[str, Any]:
+        """Queue a row for insertion and return it with defaults filled in."""
+        row = column_defaults(model, values)
+        self._bind()
+        self._pending.append((model, row, time.monotonic()))
+        if self.interval <= 0:
+            await self.flush()
+        elif len(self._pending) >= self.max_rows:
+            self._wakeup.set()
+        return row
+
+    def pending(self, model: Any) -> List[Dict[str, Any]]:
+        """Return copies of the queued rows for ``model`` not yet committed."""
+        return [dict(row) for m, row, _ in self._pending if m is model]
+
+    def get_pending(self, model: Any, row_id: str) -> Optional[Dict[str, Any]]:
+        for m, row, _ in self._pending:
+            if m is model and row.get("id") == row_id:
+                return dict(row)
+        return None
+
+    async def update_pending(self, model: Any, row_id: str, **values: Any) -> bool:
+        """Apply ``values`` to a queued row; returns False once it is committed."""
+        self._bind()
+        async with self._lock:
+            for m, row, _ in self._pending:
+                if m is model and row.get("id") == row_id:
+                    row.update(values)
+                    return True
+        return False
+
+    async def flush(self) -> int:
+        """Write every queued row in one transaction and return the row count."""
+        self._bind()
+        async with self._lock:
+            batch = list(self._pending)
+            if not batch:
+                return 0
+            grouped: Dict[Any, List[Dict[str, Any]]] = {}
+            for model, row, _ in batch:
+                grouped.setdefault(model, []).append(row)
+            # Parents before children so foreign keys resolve
+            order = {t: i for i, t in enumerate(Base.metadata.sorted_tables)}
+            models = sorted(grouped, key=lambda m: order[m.__table__])
+            dropped = 0
+            try:
+                async with AsyncSessionLocal() as session:
+                    for model in models:
+                        await session.execute(insert(model), grouped[model])
+                    await session.commit()
+            except (IntegrityError, DataError):
+                self.stats["failures"] += 1
+                logging.warning("Write-behind flush of %d rows failed; retrying row by row", len(batch))
+                dropped = await self._write_rows([(m, row) for m in models for row in grouped[m]])
+            except Exception:
+                self.stats["failures"] += 1
+                logging.exception("Write-behind flush of %d rows failed", len(batch))
+                raise
+            # Rows queued while the transaction ran stay pending
+            del self._pending[: len(batch)]
+            lag = (time.monotonic() - batch[0][2]) * 1000
+            self.stats["batches"] += 1
+            self.stats["rows_written"] += len(batch) - dropped
+            self.stats["last_batch_rows"] = len(batch) - dropped
+            self.stats["last_flush_lag_ms"] = round(lag, 2)
+            self.stats["max_flush_lag_ms"] = round(max(self.stats["max_flush_lag_ms"], lag), 2)
+            return len(batch)
+
+    async def _write_rows(self, rows: List[Tuple[Any, Dict[str, Any]]]) -> int:
+        """Insert rows in separate transactions; returns how many were dead-lettered."""
+        done = set()
+        dropped = 0
+        for model, row in rows:
+            try:
+                async with AsyncSessionLocal() as session:
+                    await session.execute(insert(model), [row])
+                    await session.commit()
+            except (IntegrityError, DataError) as exc:
+                dropped += 1
+                self.stats["dead_lettered"] += 1
+                self.dead_letters.append({"table": model.__tablename__, "row": dict(row), "error": str(exc.orig)})
+                logging.error("Write-behind dropped a %s row: %s", model.__tablename__, exc.orig)
+            except Exception:
+                # Keep only the rows that have not been handled yet
+                self._pending = [p for p in self._pending if id(p[1]) not in done]
+                raise
+            done.add(id(row))
+        return dropped
+
+    async def stop(self) -> None:
+        """Stop the background flusher and write out anything still queued."""
+        self._stopping = True
+        if self._task is not None and self._loop is asyncio.get_running_loop():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        if self._pending:
+            await self.flush()
+        self._stopping = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return queue depth, the age of the oldest pending row and flush stats."""
+        oldest = self._pending[0][2] if self._pending else None
+        return {
+            "pending": len(self._pending),
+            "oldest_pending_ms": round((time.monotonic() - oldest) * 1000, 2) if oldest else 0.0,
+            "interval_ms": self.interval * 1000,
+            "max_rows": self.max_rows,
+            **self.stats,
+        }
+
+
+write_queue = WriteBehindQueue()
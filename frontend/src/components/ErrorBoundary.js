@@ -20,6 +20,7 @@ class ErrorBoundary extends Component {
     // Log the error to an error reporting service
     console.error('Error caught by boundary:', error, errorInfo);
     loggingService.logFrontend({
+      level: 'error',
       message: error.toString(),
       stack: errorInfo.componentStack,
     });
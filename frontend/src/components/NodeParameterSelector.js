@@ -56,6 +56,23 @@ const NodeParameterSelector = () => {
     }
   };
 
+  // Nodes saved without properties get their inputs from the node schema
+  const handleNodeChange = async (id) => {
+    setNodeId(id);
+    setParamName('');
+    const node = workflowNodes.find((n) => n.id === id);
+    if (!node || workflowNodeParameters[id]) return;
+    const schema = await workflowService.getNodeSchema(node.type);
+    const inputs = { ...(schema?.input?.required || {}), ...(schema?.input?.optional || {}) };
+    const params = Object.entries(inputs).map(([name, spec]) => ({
+      name,
+      type: Array.isArray(spec?.[0]) ? 'enum' : String(spec?.[0] || 'unknown').toLowerCase(),
+    }));
+    if (params.length > 0) {
+      setWorkflowNodeParameters((prev) => ({ ...prev, [id]: params }));
+    }
+  };
+
   const handleCreate = () => {
     if (selectedWorkflow && nodeId && paramName) {
       navigate(`/parameters?workflow=${selectedWorkflow}&node=${nodeId}&param=${paramName}`);
@@ -77,7 +94,7 @@ const NodeParameterSelector = () => {
       </div>
       <div className="selector-field">
         <label>Node</label>
-        <select value={nodeId} onChange={(e) => { setNodeId(e.target.value); setParamName(''); }}>
+        <select value={nodeId} onChange={(e) => handleNodeChange(e.target.value)}>
           <option value="">Select a node</option>
           {workflowNodes.map((node) => (
             <option key={node.id} value={node.id}>
@@ -209,6 +209,10 @@ const CreatePage = () => {
             source.close();
             showToast('Generation completed', 'success');
             playSoundNotification();
+          } else if (job.status === 'failed') {
+            setLoading(false);
+            source.close();
+            showToast(`Generation failed: ${job.error || 'unknown error'}`, 'error');
           }
         },
         (err) => {
@@ -180,6 +180,10 @@ const HomePage = () => {
             showToast(`Job ${jobId} done`, "success");
             eventSourceRef.current?.close();
             setGenerating(false);
+          } else if (data.status === "failed") {
+            showToast(`Job ${jobId} failed`, "error");
+            eventSourceRef.current?.close();
+            setGenerating(false);
           } else {
             showToast(`Job ${jobId} ${data.status}`, "info", 1000);
           }
@@ -38,10 +38,13 @@ const saveExternalImage = async (url, prompt, metadata) => {
   }
 };
 
-// Get user's saved images
-const getUserImages = async () => {
+// Get a page of the user's saved images; pass the previous page's
+// next_cursor to continue
+const getUserImages = async (cursor = null, limit = 50) => {
   try {
-    const response = await authService.authAxios.get(`${API_URL}/api/users/images`);
+    const params = { limit };
+    if (cursor) params.cursor = cursor;
+    const response = await authService.authAxios.get(`${API_URL}/api/users/images`, { params });
     return response.data;
   } catch (error) {
     console.error('Error getting user images:', error);
@@ -49,6 +52,17 @@ const getUserImages = async () => {
   }
 };
 
+// Get a saved image including its parameters and metadata
+const getUserImage = async (imageId) => {
+  try {
+    const response = await authService.authAxios.get(`${API_URL}/api/users/images/${imageId}`);
+    return response.data;
+  } catch (error) {
+    console.error('Error getting image details:', error);
+    throw error;
+  }
+};
+
 // Delete an image from the gallery
 const deleteImage = async (imageId) => {
   try {
@@ -92,6 +106,7 @@ const imageService = {
   uploadImage,
   saveExternalImage,
   getUserImages,
+  getUserImage,
   deleteImage,
   shareImage,
   copyImageUrl,
@@ -1,13 +1,86 @@
 import axios from 'axios';
 
 const API_URL = process.env.REACT_APP_BACKEND_URL || "http://localhost:8001";
+const BATCH_URL = `${API_URL}/api/logs/frontend/batch`;
 
-const logFrontend = async (payload) => {
+// Events are queued and sent in batches: every FLUSH_INTERVAL_MS, or right
+// away once MAX_BATCH are waiting. Whatever is left when the page is hidden
+// or unloaded goes out with sendBeacon.
+const FLUSH_INTERVAL_MS = 5000;
+const MAX_BATCH = 50;
+const MAX_QUEUE = 500; // oldest events are dropped beyond this
+const GZIP_MIN_BYTES = 1024;
+
+let queue = [];
+let timer = null;
+
+const gzip = async (text) => {
+  if (typeof CompressionStream === 'undefined') return null;
+  const stream = new Blob([text]).stream().pipeThrough(new CompressionStream('gzip'));
+  return new Response(stream).blob();
+};
+
+const send = async (events) => {
+  const text = JSON.stringify(events);
+  const headers = { 'Content-Type': 'application/json' };
+  let body = text;
+  if (text.length >= GZIP_MIN_BYTES) {
+    const compressed = await gzip(text);
+    if (compressed) {
+      body = compressed;
+      headers['Content-Encoding'] = 'gzip';
+    }
+  }
   try {
-    await axios.post(`${API_URL}/api/logs/frontend`, payload);
+    await axios.post(BATCH_URL, body, { headers });
   } catch (err) {
-    console.error('Failed to send frontend log', err);
+    console.error('Failed to send frontend logs', err);
+  }
+};
+
+const flush = async () => {
+  if (timer) {
+    clearTimeout(timer);
+    timer = null;
+  }
+  while (queue.length) {
+    await send(queue.splice(0, MAX_BATCH));
+  }
+};
+
+const flushWithBeacon = () => {
+  if (!queue.length) return;
+  const events = queue;
+  queue = [];
+  const blob = new Blob([JSON.stringify(events)], { type: 'text/plain' });
+  if (!navigator.sendBeacon || !navigator.sendBeacon(BATCH_URL, blob)) {
+    queue = events.concat(queue);
+    flush();
+  }
+};
+
+if (typeof window !== 'undefined') {
+  window.addEventListener('pagehide', flushWithBeacon);
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') flushWithBeacon();
+  });
+}
+
+const logFrontend = (payload) => {
+  queue.push({
+    level: 'info',
+    timestamp: new Date().toISOString(),
+    path: typeof window !== 'undefined' ? window.location.pathname : undefined,
+    ...payload,
+  });
+  if (queue.length > MAX_QUEUE) {
+    queue.splice(0, queue.length - MAX_QUEUE);
+  }
+  if (queue.length >= MAX_BATCH) {
+    flush();
+  } else if (!timer) {
+    timer = setTimeout(flush, FLUSH_INTERVAL_MS);
   }
 };
 
-export default { logFrontend };
+export default { logFrontend, flush };
@@ -22,6 +22,44 @@ const subscribe = (jobId, onUpdate, onError) => {
   return source;
 };
 
-const progressService = { subscribe };
+// Subscribe over WebSocket, also receiving live preview frames. Frames use
+// ComfyUI's PREVIEW_IMAGE layout: two big-endian uint32 (event, image type)
+// followed by the image bytes. onPreview receives an object URL the caller
+// should revoke once the image is replaced.
+const PREVIEW_MIME = { 1: 'image/jpeg', 2: 'image/png' };
+
+const subscribeWithPreviews = (jobId, { fps, maxSize } = {}, onUpdate, onPreview, onError) => {
+  const params = new URLSearchParams({ previews: '1' });
+  if (fps) params.set('fps', String(fps));
+  if (maxSize) params.set('max_size', String(maxSize));
+  const wsUrl = API_URL.replace(/^http/, 'ws');
+  const socket = new WebSocket(`${wsUrl}/api/progress/ws/${jobId}?${params}`);
+  socket.binaryType = 'arraybuffer';
+
+  socket.onmessage = (event) => {
+    if (typeof event.data === 'string') {
+      try {
+        if (onUpdate) onUpdate(JSON.parse(event.data));
+      } catch (err) {
+        console.error('Failed to parse progress message', err);
+      }
+      return;
+    }
+    if (!onPreview || event.data.byteLength < 8) return;
+    const view = new DataView(event.data);
+    const mime = PREVIEW_MIME[view.getUint32(4)];
+    if (view.getUint32(0) !== 1 || !mime) return;
+    const blob = new Blob([event.data.slice(8)], { type: mime });
+    onPreview(URL.createObjectURL(blob));
+  };
+
+  if (onError) {
+    socket.onerror = onError;
+  }
+
+  return socket;
+};
+
+const progressService = { subscribe, subscribeWithPreviews };
 
 export default progressService;
@@ -99,6 +99,26 @@ const executeWorkflow = async (workflowId, prompt, parameters = {}) => {
   }
 };
 
+// Execute a workflow with an init image and optional mask sent as binary
+// multipart parts (File/Blob) instead of base64 strings
+const executeWorkflowWithImages = async (workflowId, prompt, initImage, mask = null) => {
+  try {
+    const formData = new FormData();
+    formData.append('prompt', prompt);
+    if (workflowId) formData.append('workflow_id', workflowId);
+    if (initImage) formData.append('init_image', initImage, initImage.name || 'init.png');
+    if (mask) formData.append('mask', mask, mask.name || 'mask.png');
+    const response = await authService.authAxios.post(
+      `${API_URL}/api/generate/multipart`,
+      formData
+    );
+    return response.data;
+  } catch (error) {
+    console.error('Error executing workflow with images:', error);
+    throw error;
+  }
+};
+
 // Stream progress updates for a job via Server-Sent Events
 // Returns the EventSource so the caller can close it when done
 const streamProgress = (jobId, onUpdate) => {
@@ -117,6 +137,94 @@ const streamProgress = (jobId, onUpdate) => {
   return es;
 };
 
+// Submit a batch: spec may contain seeds, count/seed_start, values
+// ({code: [values]}) and x_axis/y_axis ({code, values})
+const executeBatch = async (workflowId, prompt, spec = {}) => {
+  try {
+    const payload = { prompt, ...spec };
+    if (workflowId) payload.workflow_id = workflowId;
+    const response = await authService.authAxios.post(
+      `${API_URL}/api/generate/batch`,
+      payload
+    );
+    return response.data;
+  } catch (error) {
+    console.error('Error executing batch:', error);
+    throw error;
+  }
+};
+
+// Stream aggregated progress for all jobs of a batch
+const streamBatchProgress = (batchId, onUpdate) => {
+  const es = new EventSource(`${API_URL}/api/progress/batch/${batchId}`);
+  es.onmessage = (event) => {
+    try {
+      const data = JSON.parse(event.data);
+      if (onUpdate) onUpdate(data);
+      if (data.status === 'done' || data.event === 'end') es.close();
+    } catch (err) {
+      console.error('Error parsing batch progress update:', err);
+    }
+  };
+  es.onerror = () => {
+    es.close();
+  };
+  return es;
+};
+
+// Cancel a queued or running job owned by the current user
+const cancelJob = async (jobId) => {
+  try {
+    const response = await authService.authAxios.post(`${API_URL}/api/jobs/${jobId}/cancel`);
+    return response.data;
+  } catch (error) {
+    console.error('Error cancelling job:', error);
+    throw error;
+  }
+};
+
+// Move a waiting job ahead of (or behind) the user's other queued jobs
+const setJobPriority = async (jobId, priority) => {
+  try {
+    const response = await authService.authAxios.post(
+      `${API_URL}/api/jobs/${jobId}/priority`,
+      { priority }
+    );
+    return response.data;
+  } catch (error) {
+    console.error('Error changing job priority:', error);
+    throw error;
+  }
+};
+
+// Schema of one ComfyUI node class (inputs, outputs, category), served
+// from the backend's object_info cache
+const getNodeSchema = async (classType) => {
+  try {
+    const response = await authService.authAxios.get(
+      `${API_URL}/api/comfyui/object_info/${encodeURIComponent(classType)}`
+    );
+    return response.data?.payload || null;
+  } catch (error) {
+    console.error('Error getting node schema:', error);
+    return null;
+  }
+};
+
+// Search node classes by name, title, category or input name
+const searchNodes = async (query, limit = 50) => {
+  try {
+    const response = await authService.authAxios.get(
+      `${API_URL}/api/comfyui/object_info/search`,
+      { params: { q: query, limit } }
+    );
+    return response.data?.payload || [];
+  } catch (error) {
+    console.error('Error searching nodes:', error);
+    return [];
+  }
+};
+
 // Get custom actions for a workflow
 const getCustomActions = async (workflowId) => {
   try {
@@ -158,7 +266,14 @@ const workflowService = {
   deleteWorkflow,
   getComfyUIStatus,
   executeWorkflow,
+  executeWorkflowWithImages,
+  executeBatch,
   streamProgress,
+  streamBatchProgress,
+  cancelJob,
+  setJobPriority,
+  getNodeSchema,
+  searchNodes,
   getCustomActions,
   saveCustomActions,
   restartComfyUI
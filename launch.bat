@@ -10,17 +10,6 @@ if not exist venv (
 call venv\Scripts\activate.bat
 
 pip install --upgrade pip >nul
-pip install -r backend\requirements.txt
-
-if not exist frontend\node_modules (
-    echo Installing frontend packages...
-    pushd frontend
-    yarn install
-    popd
-)
-
-pushd frontend
-yarn build
-popd
 
+REM launch.py installs and builds only what changed since the last launch
 python launch.py %*
@@ -1,15 +1,65 @@
+import argparse
+import contextlib
+import functools
+import gzip
+import hashlib
+import json
 import os
+import re
+import shutil
 import subprocess
 import sys
 import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
 from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 from pathlib import Path
+from urllib.parse import urlsplit
+
+try:  # optional: without it only gzip variants are produced
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
 
 
 ROOT = Path(__file__).resolve().parent
 BACKEND = ROOT / "backend"
 FRONTEND = ROOT / "frontend"
 FRONTEND_BUILD = FRONTEND / "build"
+FRONTEND_PORT = int(os.environ.get("CJ_FRONTEND_PORT", "3000"))
+
+# Text assets worth storing precompressed next to the original
+COMPRESSIBLE = {".html", ".js", ".css", ".json", ".map", ".svg", ".txt", ".ico", ".xml", ".webmanifest"}
+COMPRESS_MIN_BYTES = 1024
+# Variants in order of preference, as (Accept-Encoding token, suffix)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# Build output names carry a content hash (main.1a2b3c4d.js), so never change
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.(?:chunk\.)?[a-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+SENDFILE_MIN_BYTES = 64 * 1024
+
+BACKEND_PORT = int(os.environ.get("CJ_BACKEND_PORT", "8001"))
+# Hashes of the inputs of each install/build step at its last success
+FINGERPRINTS = ROOT / ".launch-fingerprints.json"
+PHASE_INPUTS = {
+    "pip": [BACKEND / "requirements.txt"],
+    "yarn install": [FRONTEND / "package.json", FRONTEND / "yarn.lock"],
+    "yarn build": [
+        FRONTEND / "package.json",
+        FRONTEND / "yarn.lock",
+        FRONTEND / "src",
+        FRONTEND / "public",
+    ],
+}
+# Each step is only skippable while its output is still there
+PHASE_OUTPUTS = {
+    "yarn install": FRONTEND / "node_modules",
+    "yarn build": FRONTEND_BUILD / "index.html",
+}
+READY_TIMEOUT = float(os.environ.get("CJ_READY_TIMEOUT", "120"))
 
 
 def run(cmd, cwd=None):
@@ -20,22 +70,231 @@ def run(cmd, cwd=None):
         sys.exit(result.returncode)
 
 
-def ensure_dependencies():
-    run("pip install -r requirements.txt", cwd=str(BACKEND))
-    if not (FRONTEND / "node_modules").exists():
-        run("yarn install", cwd=str(FRONTEND))
-    run("yarn build", cwd=str(FRONTEND))
+@contextlib.contextmanager
+def timed(phase):
+    """Print how long ``phase`` took."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        print(f"[{phase}] {time.perf_counter() - start:.2f}s")
+
+
+def fingerprint(paths):
+    """Hash the contents of files, and of every file below directories."""
+    digest = hashlib.sha256()
+    for path in paths:
+        path = Path(path)
+        files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+        for file in files:
+            if not file.exists():
+                continue
+            digest.update(str(file.relative_to(ROOT) if file.is_relative_to(ROOT) else file).encode())
+            digest.update(b"\0")
+            digest.update(file.read_bytes())
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class FingerprintCache:
+    """Input hashes of the install/build steps, kept between launches."""
+
+    def __init__(self, path=FINGERPRINTS):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        try:
+            self.data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self.data = {}
+
+    def current(self, phase):
+        return fingerprint(PHASE_INPUTS[phase])
+
+    def fresh(self, phase, value):
+        output = PHASE_OUTPUTS.get(phase)
+        if output is not None and not output.exists():
+            return False
+        return self.data.get(phase) == value
+
+    def record(self, phase, value):
+        with self._lock:
+            self.data[phase] = value
+            self.path.write_text(json.dumps(self.data, indent=2, sort_keys=True))
+
+
+def step(cache, phase, cmd, cwd, force=False):
+    """Run ``cmd`` unless the inputs of ``phase`` are unchanged since it last succeeded."""
+    with timed(phase):
+        value = cache.current(phase)
+        if not force and cache.fresh(phase, value):
+            print(f"[{phase}] up to date, skipped")
+            return False
+        run(cmd, cwd=cwd)
+        cache.record(phase, value)
+        return True
+
+
+def ensure_backend(cache, force=False):
+    step(cache, "pip", "pip install -r requirements.txt", str(BACKEND), force)
+
+
+def ensure_frontend(cache, force=False):
+    step(cache, "yarn install", "yarn install", str(FRONTEND), force)
+    step(cache, "yarn build", "yarn build", str(FRONTEND), force)
+    with timed("precompress"):
+        precompress(FRONTEND_BUILD)  # only touches assets newer than their variants
 
 
-def start_frontend():
-    os.chdir(str(FRONTEND_BUILD))
-    handler = SimpleHTTPRequestHandler
-    server = ThreadingHTTPServer(("0.0.0.0", 3000), handler)
-    print("Frontend available on http://localhost:3000")
+def wait_ready(url, timeout=READY_TIMEOUT, proc=None):
+    """Poll ``url`` until it answers below 500; False on timeout or exit."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=2) as resp:
+                if resp.status < 500:
+                    return True
+        except urllib.error.HTTPError as exc:
+            if exc.code < 500:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def precompress(build_dir):
+    """Write ``.br``/``.gz`` siblings for text assets; returns files written.
+
+    Variants newer than their source are kept, and a variant is only
+    written when it is actually smaller than the original.
+    """
+    written = 0
+    for path in Path(build_dir).rglob("*"):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE:
+            continue
+        stat = path.stat()
+        if stat.st_size < COMPRESS_MIN_BYTES:
+            continue
+        data = None
+        for token, suffix in ENCODINGS:
+            if token == "br" and brotli is None:
+                continue
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime >= stat.st_mtime:
+                continue
+            data = data if data is not None else path.read_bytes()
+            if token == "br":
+                packed = brotli.compress(data, quality=11)
+            else:
+                packed = gzip.compress(data, 9, mtime=0)
+            if len(packed) < len(data):
+                target.write_bytes(packed)
+                written += 1
+    return written
+
+
+class StaticHandler(SimpleHTTPRequestHandler):
+    """Serve the built frontend like a production web server.
+
+    Picks a precompressed ``.br``/``.gz`` variant matching
+    ``Accept-Encoding``, marks content-hashed files immutable, answers
+    conditional requests for everything else (``index.html`` included)
+    with ETag/304, sends large files with ``sendfile`` and falls back to
+    ``index.html`` for client-side routes.
+    """
+
+    def _accepts(self):
+        accepted = set()
+        for part in self.headers.get("Accept-Encoding", "").split(","):
+            token, _, params = part.strip().partition(";")
+            if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(token.strip().lower())
+        return accepted
+
+    def _resolve(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        if os.path.isfile(path):
+            return path
+        # Unknown paths without an extension are client-side routes
+        if os.path.splitext(urlsplit(self.path).path)[1]:
+            return None
+        index = os.path.join(self.directory, "index.html")
+        return index if os.path.isfile(index) else None
+
+    def send_head(self):
+        path = self._resolve()
+        if path is None:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        accepted = self._accepts()
+        served, encoding = path, None
+        for token, suffix in ENCODINGS:
+            if token in accepted and os.path.isfile(path + suffix):
+                served, encoding = path + suffix, token
+                break
+        try:
+            f = open(served, "rb")
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        try:
+            stat = os.fstat(f.fileno())
+            etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+            immutable = bool(HASHED_NAME.search(os.path.basename(path)))
+            status = HTTPStatus.OK
+            if self.headers.get("If-None-Match") in (etag, "*"):
+                status = HTTPStatus.NOT_MODIFIED
+            self.send_response(status)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", IMMUTABLE if immutable else "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            if status == HTTPStatus.NOT_MODIFIED:
+                self.end_headers()
+                f.close()
+                return None
+            self.send_header("Content-Type", self.guess_type(path))
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            self.send_header("Content-Length", str(stat.st_size))
+            self.send_header("Last-Modified", self.date_time_string(int(stat.st_mtime)))
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
+
+    def copyfile(self, source, outputfile):
+        size = os.fstat(source.fileno()).st_size
+        if size < SENDFILE_MIN_BYTES or not hasattr(os, "sendfile"):
+            shutil.copyfileobj(source, outputfile)
+            return
+        offset = 0
+        try:
+            while offset < size:
+                sent = os.sendfile(self.connection.fileno(), source.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except OSError:
+            if offset:
+                raise
+            shutil.copyfileobj(source, outputfile)
+
+
+def start_frontend(build_dir=FRONTEND_BUILD, port=FRONTEND_PORT):
+    handler = functools.partial(StaticHandler, directory=str(build_dir))
+    server = ThreadingHTTPServer(("0.0.0.0", port), handler)
+    server.daemon_threads = True
+    print(f"Frontend available on http://localhost:{port}")
     server.serve_forever()
 
 
-def start_backend():
+def start_backend(port=BACKEND_PORT):
     return subprocess.Popen([
         sys.executable,
         "-m",
@@ -44,15 +303,60 @@ def start_backend():
         "--host",
         "0.0.0.0",
         "--port",
-        "8001",
+        str(port),
+        "--workers",
+        os.environ.get("CJ_WORKERS", "1"),
     ], cwd=str(ROOT))
 
 
-def main() -> None:
-    ensure_dependencies()
-    be_proc = start_backend()
-    fe_thread = threading.Thread(target=start_frontend, daemon=True)
-    fe_thread.start()
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Install, build and start Comfy Journey.")
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="skip dependency checks and the frontend build; start what is on disk",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="reinstall and rebuild even if nothing changed",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    start = time.perf_counter()
+    cache = FingerprintCache()
+
+    def backend():
+        if not args.fast:
+            ensure_backend(cache, args.force)
+        proc = start_backend()
+        with timed("backend ready"):
+            ready = wait_ready(f"http://127.0.0.1:{BACKEND_PORT}/api/health/ready", proc=proc)
+        if not ready:
+            print("Backend did not become ready")
+        return proc
+
+    def frontend():
+        if not args.fast:
+            ensure_frontend(cache, args.force)
+        threading.Thread(target=start_frontend, daemon=True).start()
+        with timed("frontend ready"):
+            wait_ready(f"http://127.0.0.1:{FRONTEND_PORT}/")
+
+    # The backend starts as soon as pip is done, while the frontend builds
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        be_future = pool.submit(backend)
+        fe_future = pool.submit(frontend)
+        be_proc = be_future.result()
+        try:
+            fe_future.result()
+        except BaseException:
+            be_proc.terminate()
+            raise
+    print(f"[startup] {time.perf_counter() - start:.2f}s")
     try:
         be_proc.wait()
     except KeyboardInterrupt:
@@ -0,0 +1,61 @@
+"""Benchmark authenticated request overhead with and without the principal cache.
+
+The users collection is replaced by an in-memory stand-in that sleeps for
+``--latency-ms`` to model the Mongo round trip, so the numbers isolate what
+``get_current_user`` costs per request.
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+
+from backend import auth
+
+
+class SimulatedUsers:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.calls = 0
+        self.doc = {
+            "id": "bench-user",
+            "username": "bench",
+            "name": "Bench",
+            "hashed_password": "unused",
+        }
+
+    async def find_one(self, filt):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return dict(self.doc) if filt.get("username") == "bench" else None
+
+
+async def _run(requests: int, ttl: float, users: SimulatedUsers) -> float:
+    auth.AUTH_CACHE_TTL = ttl
+    auth.invalidate_user_cache()
+    token = auth.create_access_token({"sub": "bench"}, timedelta(minutes=5))
+    start = time.perf_counter()
+    for _ in range(requests):
+        await auth.get_current_user(token)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    for label, ttl in (("uncached", 0.0), ("cached", 60.0)):
+        users = SimulatedUsers(args.latency_ms / 1000)
+        auth.db = type("DB", (), {"users": users})()
+        elapsed = asyncio.run(_run(args.requests, ttl, users))
+        per_req = elapsed / args.requests * 1e6
+        print(
+            f"{label:>9}: {per_req:8.1f} us/request  "
+            f"({users.calls} user lookups for {args.requests} requests)"
+        )
+
+
+if __name__ == "__main__":
+    main()
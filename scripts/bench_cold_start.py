@@ -0,0 +1,114 @@
+"""Measure backend cold start: import time and time to the first ready response.
+
+The import is timed in a fresh interpreter with ``-X importtime`` and the
+slowest modules (by cumulative time) are listed. Then uvicorn is started
+and ``/api/health/ready`` is polled until it answers 200. ``--max-import``
+and ``--max-ready`` turn the numbers into a budget check that exits
+non-zero, so CI can track regressions:
+
+    python -m scripts.bench_cold_start --max-ready 1.0
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///./bench_cold_start.db")
+    return env
+
+
+def import_profile(top: int):
+    """Return (total seconds, [(cumulative us, module)]) for importing the app."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.server"],
+        cwd=str(ROOT),
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        fields = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        modules.append((int(fields[1]), fields[2].strip()))
+    total = next(us for us, name in reversed(modules) if name == "backend.server")
+    slowest = sorted((m for m in modules if m[1] != "backend.server"), reverse=True)[:top]
+    return total / 1e6, slowest
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_ready(timeout: float) -> float:
+    """Seconds from spawning uvicorn until the readiness probe returns 200."""
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=str(ROOT),
+        env=_env(),
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise SystemExit(f"uvicorn exited with {proc.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health/ready", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, OSError):
+                pass
+            time.sleep(0.01)
+        raise SystemExit(f"not ready after {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--max-import", type=float, help="fail if the import takes longer (s)")
+    parser.add_argument("--max-ready", type=float, help="fail if readiness takes longer (s)")
+    args = parser.parse_args()
+
+    imports = []
+    for _ in range(args.rounds):
+        total, slowest = import_profile(args.top)
+        imports.append(total)
+    print(f"import backend.server: {min(imports):.3f}s (best of {args.rounds})")
+    for us, name in slowest:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    ready = min(time_to_ready(args.timeout) for _ in range(args.rounds))
+    print(f"process start -> /api/health/ready: {ready:.3f}s (best of {args.rounds})")
+
+    failed = []
+    if args.max_import is not None and min(imports) > args.max_import:
+        failed.append(f"import {min(imports):.3f}s > {args.max_import}s")
+    if args.max_ready is not None and ready > args.max_ready:
+        failed.append(f"ready {ready:.3f}s > {args.max_ready}s")
+    if failed:
+        raise SystemExit("over budget: " + "; ".join(failed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Compare the ASGI CSRF middleware with the previous BaseHTTPMiddleware version.
+
+Requests are driven straight through the ASGI interface so the numbers
+measure middleware overhead only: JSON throughput and the time until the
+first body chunk of an SSE stream reaches the server.
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import statistics
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+from backend.csrf import CSRF_COOKIE, CSRF_HEADER, CSRFMiddleware
+
+
+class LegacyCSRFMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware implementation this benchmark replaces."""
+
+    def __init__(self, app, *, cookie_secure: bool = False):
+        super().__init__(app)
+        self.cookie_secure = cookie_secure
+
+    async def dispatch(self, request: Request, call_next):
+        if (
+            request.method not in ("GET", "HEAD", "OPTIONS", "TRACE")
+            and os.environ.get("DISABLE_CSRF", "false").lower() != "true"
+        ):
+            cookie = request.cookies.get(CSRF_COOKIE)
+            header = request.headers.get(CSRF_HEADER)
+            if not cookie or not header or cookie != header:
+                return Response(status_code=400, content="Invalid CSRF token")
+        response = await call_next(request)
+        if CSRF_COOKIE not in request.cookies:
+            token = secrets.token_urlsafe(16)
+            response.set_cookie(CSRF_COOKIE, token, secure=self.cookie_secure, httponly=False)
+        return response
+
+
+def build_app(middleware) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(middleware)
+
+    @app.post("/json")
+    async def json_endpoint():
+        return {"success": True, "payload": {"message": "ok"}}
+
+    @app.get("/sse")
+    async def sse_endpoint():
+        async def events():
+            for i in range(3):
+                yield f"data: {i}\n\n"
+                await asyncio.sleep(0)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def _scope(method: str, path: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"cookie", f"{CSRF_COOKIE}=tok".encode()),
+            (CSRF_HEADER.encode(), b"tok"),
+        ],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+
+
+async def _request(app, method: str, path: str) -> float:
+    """Run one request and return seconds until the first non-empty body chunk."""
+    start = time.perf_counter()
+    first_byte = None
+    sent_request = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal sent_request
+        if not sent_request:
+            sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Like a real server, only report a disconnect once the response is done
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal first_byte
+        if message["type"] == "http.response.body":
+            if message.get("body") and first_byte is None:
+                first_byte = time.perf_counter() - start
+            if not message.get("more_body"):
+                finished.set()
+
+    await app(_scope(method, path), receive, send)
+    return first_byte or 0.0
+
+
+async def _bench(app, requests: int):
+    for _ in range(50):  # warm up routing and middleware stack
+        await _request(app, "POST", "/json")
+    start = time.perf_counter()
+    for _ in range(requests):
+        await _request(app, "POST", "/json")
+    throughput = requests / (time.perf_counter() - start)
+    ttfb = [await _request(app, "GET", "/sse") for _ in range(requests // 10 or 1)]
+    return throughput, statistics.median(ttfb) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    for label, middleware in (
+        ("BaseHTTPMiddleware", LegacyCSRFMiddleware),
+        ("pure ASGI", CSRFMiddleware),
+    ):
+        throughput, ttfb = asyncio.run(_bench(build_app(middleware), args.requests))
+        print(f"{label:>18}: {throughput:8.0f} req/s   SSE first byte {ttfb:7.1f} us (median)")
+
+
+if __name__ == "__main__":
+    main()
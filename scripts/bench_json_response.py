@@ -0,0 +1,113 @@
+"""Compare response rendering: stdlib JSONResponse vs the orjson-backed api_response.
+
+Payloads mimic the two heaviest read endpoints: ``/api/comfyui/history``
+(many prompts, each carrying its full API-format graph and outputs) and
+``/api/relational/workflows`` (stored workflows with their node data).
+Each variant renders the ``{"success", "payload"}`` envelope the same way
+the endpoints do; MessagePack is included when msgspec is installed.
+"""
+
+import argparse
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse
+
+from backend.utils import PreSerialized, api_response, dumps_json, dumps_msgpack
+
+
+def _graph(seed: int) -> dict:
+    return {
+        "3": {"class_type": "KSampler", "inputs": {
+            "seed": seed, "steps": 30, "cfg": 7.0, "sampler_name": "euler",
+            "scheduler": "normal", "denoise": 1.0, "model": ["4", 0],
+            "positive": ["6", 0], "negative": ["7", 0], "latent_image": ["5", 0]}},
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sd_xl_base_1.0.safetensors"}},
+        "5": {"class_type": "EmptyLatentImage", "inputs": {"width": 1024, "height": 1024, "batch_size": 1}},
+        "6": {"class_type": "CLIPTextEncode", "inputs": {"text": "a lighthouse at dusk, volumetric fog " * 4, "clip": ["4", 1]}},
+        "7": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry, low quality", "clip": ["4", 1]}},
+        "8": {"class_type": "VAEDecode", "inputs": {"samples": ["3", 0], "vae": ["4", 2]}},
+        "9": {"class_type": "SaveImage", "inputs": {"filename_prefix": "ComfyUI", "images": ["8", 0]}},
+    }
+
+
+def history_payload(entries: int) -> dict:
+    history = {}
+    for i in range(entries):
+        prompt_id = str(uuid.uuid4())
+        history[prompt_id] = {
+            "prompt": [i, prompt_id, _graph(i), {"client_id": "bench"}, ["9"]],
+            "outputs": {"9": {"images": [
+                {"filename": f"ComfyUI_{i:05d}_.png", "subfolder": "", "type": "output"}
+            ]}},
+            "status": {"status_str": "success", "completed": True, "messages": [
+                ["execution_start", {"prompt_id": prompt_id, "timestamp": 1714560000000 + i}],
+                ["execution_success", {"prompt_id": prompt_id, "timestamp": 1714560004000 + i}],
+            ]},
+        }
+    return history
+
+
+def workflows_payload(count: int) -> list:
+    base = datetime(2024, 5, 1)
+    return [
+        {
+            "id": uuid.uuid4(),
+            "name": f"workflow-{i}.json",
+            "description": "SDXL base with refiner",
+            "created_at": base + timedelta(minutes=i),
+            "data": _graph(i),
+        }
+        for i in range(count)
+    ]
+
+
+def _stdlib_ready(payload):
+    # JSONResponse cannot encode UUID/datetime, so endpoints had to stringify first
+    if isinstance(payload, list):
+        return [
+            {**row, "id": str(row["id"]), "created_at": row["created_at"].isoformat()}
+            for row in payload
+        ]
+    return payload
+
+
+def _time(fn, rounds: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", type=int, default=200, help="history entries")
+    parser.add_argument("--workflows", type=int, default=200, help="stored workflows")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    for label, payload in (
+        ("/comfyui/history", history_payload(args.history)),
+        ("/relational/workflows", workflows_payload(args.workflows)),
+    ):
+        print(label)
+        ready = _stdlib_ready(payload)
+        variants = [
+            ("stdlib JSONResponse", lambda: JSONResponse({"success": True, "payload": ready}).body),
+            ("api_response (orjson)", lambda: api_response(payload).body),
+        ]
+        if dumps_msgpack is not None:
+            variants.append(
+                ("MessagePack", lambda: dumps_msgpack({"success": True, "payload": payload}))
+            )
+        cached = PreSerialized(dumps_json(payload))
+        variants.append(("pre-serialized payload", lambda: api_response(cached).body))
+        for name, fn in variants:
+            size = len(fn())
+            print(f"  {name:>24}: {_time(fn, args.rounds):9.1f} us/response  {size / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark relational access from concurrent requests: sync Session vs AsyncSession.
+
+Each simulated request inserts a Prompt and lists the most recent prompts.
+The sync variant calls ``Session`` inline on the event loop the way the
+endpoints used to; the async variant uses the ``AsyncSession`` data layer.
+A 5 ms heartbeat task records how long the event loop was blocked.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="cj-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+
+from sqlalchemy import select  # noqa: E402
+
+from backend.models import (  # noqa: E402
+    AsyncSessionLocal,
+    Prompt,
+    SessionLocal,
+    dispose_async_engine,
+    init_db,
+)
+
+
+async def sync_request(i: int) -> None:
+    with SessionLocal() as session:
+        session.add(Prompt(text=f"sync {i}"))
+        session.commit()
+        session.scalars(select(Prompt).order_by(Prompt.created_at.desc()).limit(50)).all()
+
+
+async def async_request(i: int) -> None:
+    async with AsyncSessionLocal() as session:
+        session.add(Prompt(text=f"async {i}"))
+        await session.commit()
+        (await session.scalars(select(Prompt).order_by(Prompt.created_at.desc()).limit(50))).all()
+
+
+async def run(handler, requests: int, concurrency: int):
+    lag = 0.0
+    done = asyncio.Event()
+
+    async def heartbeat():
+        nonlocal lag
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - start - 0.005)
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with sem:
+            await handler(i)
+
+    beat = asyncio.create_task(heartbeat())
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await beat
+    await dispose_async_engine()
+    return requests / elapsed, lag * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    init_db()
+    for label, handler in (("sync Session", sync_request), ("AsyncSession", async_request)):
+        rps, lag_ms = asyncio.run(run(handler, args.requests, args.concurrency))
+        print(f"{label:>13}: {rps:8.0f} req/s   max event-loop stall {lag_ms:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.utils import MSGPACK_MEDIA_TYPE, PreSerialized, api_response, dumps_json
+
+
+def _app():
+    app = FastAPI()
+    stamp = datetime(2024, 5, 1, 12, 30)
+    ident = uuid.UUID("12345678-1234-5678-1234-567812345678")
+
+    @app.get("/native")
+    async def native():
+        return api_response({"created_at": stamp, "id": ident, "tags": {"a"}})
+
+    @app.get("/raw")
+    async def raw():
+        return api_response(PreSerialized(b'[{"code":"--ar"}]'), headers={"ETag": '"x"'})
+
+    @app.get("/error")
+    async def error():
+        return api_response(None, success=False, error="boom")
+
+    return app
+
+
+def test_encodes_datetime_and_uuid_natively():
+    resp = TestClient(_app()).get("/native")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/json"
+    assert resp.json() == {
+        "success": True,
+        "payload": {
+            "created_at": "2024-05-01T12:30:00",
+            "id": "12345678-1234-5678-1234-567812345678",
+            "tags": ["a"],
+        },
+    }
+
+
+def test_preserialized_payload_is_embedded_verbatim():
+    resp = TestClient(_app()).get("/raw", headers={"Accept": MSGPACK_MEDIA_TYPE})
+    assert resp.headers["content-type"] == "application/json"
+    assert resp.headers["etag"] == '"x"'
+    assert resp.content == b'{"success":true,"payload":[{"code":"--ar"}]}'
+
+
+def test_error_envelope_unchanged():
+    body = TestClient(_app()).get("/error").json()
+    assert body == {"success": False, "payload": None, "error": "boom"}
+
+
+def test_dumps_json_matches_stdlib():
+    data = {"a": [1, 2.5, None, "é"], "b": {"c": True}}
+    assert json.loads(dumps_json(data)) == data
+
+
+def test_msgpack_negotiation():
+    msgspec = pytest.importorskip("msgspec")
+    client = TestClient(_app())
+    resp = client.get("/native", headers={"Accept": MSGPACK_MEDIA_TYPE})
+    assert resp.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert "accept" in resp.headers["vary"].lower()
+    body = msgspec.msgpack.decode(resp.content)
+    assert body["payload"]["id"] == "12345678-1234-5678-1234-567812345678"
+    assert body["payload"]["created_at"] == "2024-05-01T12:30:00"
+    assert int(resp.headers["content-length"]) == len(resp.content)
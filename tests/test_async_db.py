@@ -0,0 +1,42 @@
+import os
+import asyncio
+import uuid
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+
+from sqlalchemy import select, text
+
+from backend import models
+from backend.models import AsyncSessionLocal, Prompt, bulk_insert, dispose_async_engine, init_db
+
+init_db()
+
+
+def test_async_url_mapping():
+    assert models._async_url("sqlite:///./x.db") == "sqlite+aiosqlite:///./x.db"
+    assert models._async_url("postgresql://u@h/db") == "postgresql+asyncpg://u@h/db"
+    assert models._async_url("postgresql+psycopg2://u@h/db") == "postgresql+asyncpg://u@h/db"
+
+
+def test_sqlite_pragmas_applied():
+    with models.engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar().lower() == "wal"
+        # NORMAL == 1
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+
+
+def test_bulk_insert_round_trip():
+    marker = uuid.uuid4().hex
+
+    async def run():
+        await bulk_insert(Prompt, [{"text": f"{marker}-{i}"} for i in range(25)])
+        async with AsyncSessionLocal() as session:
+            rows = (
+                await session.scalars(select(Prompt).where(Prompt.text.like(f"{marker}-%")))
+            ).all()
+        await dispose_async_engine()
+        return rows
+
+    rows = asyncio.run(run())
+    assert len(rows) == 25
+    assert all(r.id and r.created_at for r in rows)
@@ -0,0 +1,90 @@
+import sys
+import time
+import types
+import asyncio
+
+import pytest
+
+# stub jose/passlib/motor before importing auth
+jose_module = types.ModuleType("jose")
+jose_module.jwt = types.SimpleNamespace(encode=lambda *a, **k: "token", decode=lambda *a, **k: {})
+jose_module.JWTError = Exception
+sys.modules.setdefault("jose", jose_module)
+
+passlib_module = types.ModuleType("passlib")
+context_sub = types.ModuleType("passlib.context")
+class DummyCryptContext:
+    def __init__(self, *args, **kwargs):
+        pass
+    def verify(self, plain, hashed):
+        return plain == hashed
+    def hash(self, pwd):
+        return pwd
+context_sub.CryptContext = DummyCryptContext
+passlib_module.context = context_sub
+sys.modules.setdefault("passlib", passlib_module)
+sys.modules.setdefault("passlib.context", context_sub)
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+import backend.auth as _auth
+
+
+class CountingUsers:
+    def __init__(self):
+        self.calls = 0
+    async def find_one(self, filt):
+        self.calls += 1
+        if filt.get("username") != "alice":
+            return None
+        return {"id": "u1", "username": "alice", "name": "Alice", "hashed_password": "x"}
+
+
+@pytest.fixture
+def users(monkeypatch):
+    coll = CountingUsers()
+    monkeypatch.setattr(_auth, "db", types.SimpleNamespace(users=coll))
+    payload = {"sub": "alice", "jti": "abc", "exp": time.time() + 600}
+    monkeypatch.setattr(_auth, "jwt", types.SimpleNamespace(decode=lambda *a, **k: dict(payload)))
+    monkeypatch.setattr(_auth, "AUTH_CACHE_TTL", 60.0)
+    _auth.invalidate_user_cache()
+    yield coll
+    _auth.invalidate_user_cache()
+
+
+def test_principal_is_cached_per_token(users):
+    first = asyncio.run(_auth.get_current_user("tok"))
+    second = asyncio.run(_auth.get_current_user("tok"))
+    assert first.username == second.username == "alice"
+    assert users.calls == 1
+
+
+def test_invalidation_forces_lookup(users):
+    asyncio.run(_auth.get_current_user("tok"))
+    _auth.invalidate_user_cache(user_id="u1")
+    asyncio.run(_auth.get_current_user("tok"))
+    assert users.calls == 2
+
+
+def test_cache_disabled_and_expired(users, monkeypatch):
+    monkeypatch.setattr(_auth, "AUTH_CACHE_TTL", 0.0)
+    asyncio.run(_auth.get_current_user("tok"))
+    asyncio.run(_auth.get_current_user("tok"))
+    assert users.calls == 2
+
+    monkeypatch.setattr(_auth, "AUTH_CACHE_TTL", 60.0)
+    asyncio.run(_auth.get_current_user("tok"))
+    key = _auth._token_cache_key({"jti": "abc"})
+    expires, user = _auth._PRINCIPAL_CACHE[key]
+    _auth._PRINCIPAL_CACHE[key] = (time.monotonic() - 1, user)
+    asyncio.run(_auth.get_current_user("tok"))
+    assert users.calls == 4
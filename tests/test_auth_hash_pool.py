@@ -0,0 +1,156 @@
+import sys
+import time
+import types
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+# stub jose/passlib/motor before importing auth
+jose_module = types.ModuleType("jose")
+jose_module.jwt = types.SimpleNamespace(encode=lambda *a, **k: "token", decode=lambda *a, **k: {})
+jose_module.JWTError = Exception
+sys.modules.setdefault("jose", jose_module)
+
+passlib_module = types.ModuleType("passlib")
+context_sub = types.ModuleType("passlib.context")
+class DummyCryptContext:
+    def __init__(self, *args, **kwargs):
+        pass
+    def verify(self, plain, hashed):
+        return plain == hashed
+    def hash(self, pwd):
+        return pwd
+context_sub.CryptContext = DummyCryptContext
+passlib_module.context = context_sub
+sys.modules.setdefault("passlib", passlib_module)
+sys.modules.setdefault("passlib.context", context_sub)
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+import backend.auth as _auth
+
+HASH_COST = 0.05
+
+
+class SlowCryptContext:
+    """Stand-in for bcrypt: ~50 ms per call without holding the GIL."""
+
+    def verify(self, plain, hashed):
+        time.sleep(HASH_COST)
+        return plain == hashed
+
+    def hash(self, pwd):
+        time.sleep(HASH_COST)
+        return pwd
+
+
+@pytest.fixture(autouse=True)
+def slow_hashing(monkeypatch):
+    monkeypatch.setattr(_auth, "pwd_context", SlowCryptContext())
+    monkeypatch.setattr(_auth, "_hash_pool", None)
+    monkeypatch.setattr(_auth, "HASH_WORKERS", 2)
+    monkeypatch.setattr(_auth, "HASH_QUEUE_MAX", 64)
+    monkeypatch.setattr(_auth, "HASH_PER_IP", 2)
+    yield
+    if _auth._hash_pool is not None:
+        _auth._hash_pool.shutdown(wait=True)
+
+
+async def _max_loop_lag(storm) -> float:
+    """Run ``storm`` while sampling how late a 5 ms heartbeat wakes up."""
+    lag = 0.0
+    done = asyncio.Event()
+
+    async def heartbeat():
+        nonlocal lag
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - start - 0.005)
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0)
+    await storm()
+    done.set()
+    await beat
+    return lag
+
+
+def test_event_loop_stays_responsive_during_login_storm():
+    async def pooled_storm():
+        await asyncio.gather(
+            *(_auth.averify_password("pw", "pw", client_ip=f"10.0.0.{i}") for i in range(16))
+        )
+
+    async def inline_storm():
+        for _ in range(4):
+            _auth.verify_password("pw", "pw")
+            await asyncio.sleep(0)
+
+    pooled_lag = asyncio.run(_max_loop_lag(pooled_storm))
+    inline_lag = asyncio.run(_max_loop_lag(inline_storm))
+    assert inline_lag >= HASH_COST
+    assert pooled_lag < HASH_COST / 2
+    assert _auth.hash_metrics["queued"] == 0
+    assert _auth.hash_metrics["running"] == 0
+
+
+def test_per_ip_limit_rejects_excess_attempts():
+    async def storm():
+        return await asyncio.gather(
+            *(_auth.averify_password("pw", "pw", client_ip="10.1.1.1") for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(storm())
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 1
+    assert rejected[0].status_code == 429
+    assert not _auth._hash_inflight_by_ip
+
+
+def test_queue_bound_sheds_load(monkeypatch):
+    monkeypatch.setattr(_auth, "HASH_QUEUE_MAX", 4)
+
+    async def storm():
+        return await asyncio.gather(
+            *(_auth.aget_password_hash("pw", client_ip=f"10.2.0.{i}") for i in range(6)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(storm())
+    statuses = [r.status_code for r in results if isinstance(r, HTTPException)]
+    assert statuses == [503, 503]
+    assert results.count("pw") == 4
+
+
+def test_cancelled_request_releases_its_queue_slot():
+    async def run():
+        busy = [asyncio.create_task(_auth.aget_password_hash("pw")) for _ in range(2)]
+        await asyncio.sleep(HASH_COST / 5)
+        waiting = asyncio.create_task(_auth.aget_password_hash("pw", client_ip="10.3.0.1"))
+        await asyncio.sleep(0)
+        assert _auth.hash_metrics["queued"] == 1
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert _auth.hash_metrics["queued"] == 0
+        completed = _auth.hash_metrics["completed"]
+        await asyncio.gather(*busy)
+        return completed
+
+    completed = asyncio.run(run())
+    _auth._hash_pool.shutdown(wait=True)
+    assert _auth.hash_metrics["completed"] == completed + 2
+    assert _auth.hash_metrics["queued"] == 0 and _auth.hash_metrics["running"] == 0
+    assert not _auth._hash_inflight_by_ip
@@ -0,0 +1,91 @@
+import json
+import os
+import sys
+import types
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["DISABLE_CSRF"] = "true"
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+from fastapi.testclient import TestClient
+from backend import batch as batching
+from backend.models import init_db
+from backend.prompt_parser import parse_prompt
+import backend.server as server
+
+init_db()
+
+
+def test_expand_grid_with_seeds_and_values():
+    jobs = batching.expand_batch(
+        {"ar": "1:1"},
+        seeds=[1, 2],
+        values={"--sampler": ["euler", "dpm"]},
+        x_axis=("cfg", ["5", "7", "9"]),
+        y_axis=("--steps", ["20", "30"]),
+    )
+    assert len(jobs) == 2 * 2 * 3 * 2
+    first = jobs[0]
+    assert first["params"] == {"ar": "1:1", "sampler": "euler", "cfg": "5", "steps": "20", "seed": "1"}
+    assert first["cell"] == [0, 0]
+    # Seeds of one variation are adjacent
+    assert jobs[1]["variation"] == {**first["variation"], "seed": "2"}
+    assert jobs[-1]["cell"] == [2, 1]
+    assert batching.batch_size([1, 2], {"sampler": ["a", "b"]}, ["5", "7", "9"], ["20", "30"]) == 24
+
+
+def test_compose_prompt_round_trips():
+    text = batching.compose_prompt("a cat", {"ar": "16:9", "style": "oil paint"})
+    assert parse_prompt(text) == ("a cat", {"ar": "16:9", "style": "oil paint"})
+
+
+def test_batch_endpoint_and_aggregated_stream():
+    client = TestClient(server.app)
+    resp = client.post(
+        "/api/generate/batch",
+        json={
+            "prompt": "castle --ar 1:1",
+            "seed_start": 10,
+            "count": 2,
+            "x_axis": {"code": "cfg", "values": ["4", "8"]},
+        },
+    )
+    payload = resp.json()["payload"]
+    assert len(payload["job_ids"]) == 4
+    job = server.jobs[payload["job_ids"][1]]
+    assert job["batch_id"] == payload["batch_id"]
+    assert job["variation"] == {"cfg": "4", "seed": "11"}
+    assert job["clean_prompt"] == "castle"
+
+    with client.stream("GET", f"/api/progress/batch/{payload['batch_id']}") as stream:
+        for line in stream.iter_lines():
+            if line:
+                summary = json.loads(line[6:])
+                if summary["status"] == "done":
+                    break
+    assert summary["completed"] == summary["total"] == 4
+    assert summary["progress"] == 100
+    assert summary["axes"]["x"] == {"code": "cfg", "values": ["4", "8"]}
+
+
+def test_batch_limit(monkeypatch):
+    monkeypatch.setattr(batching, "BATCH_MAX_JOBS", 3)
+    client = TestClient(server.app)
+    resp = client.post("/api/generate/batch", json={"prompt": "x", "seeds": [1, 2, 3, 4]})
+    assert resp.status_code == 400
+    resp = client.post("/api/generate/batch", json={"prompt": "x", "count": 4, "seed_start": 1})
+    assert resp.status_code == 400
+    resp = client.post("/api/generate/batch", json={"prompt": "x", "count": 10**9})
+    assert resp.status_code == 422
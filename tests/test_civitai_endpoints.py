@@ -157,3 +157,14 @@ def test_tags_forwarded(monkeypatch):
     assert resp.status_code == 200
     assert captured["endpoint"] == "/tags"
     assert captured["params"]["query"] == "foo"
+
+
+def test_key_lookup_is_served_from_cache(monkeypatch):
+    monkeypatch.delenv("CIVITAI_API_KEY", raising=False)
+    server.secret_provider.invalidate()
+    assert client.get("/api/v1/key").json()["payload"]["key_set"] is False
+    before = client.get("/api/maintenance/secrets").json()["payload"]
+    client.get("/api/v1/key")
+    after = client.get("/api/maintenance/secrets").json()["payload"]
+    assert after["loads"] == before["loads"] and after["hits"] == before["hits"] + 1
+    assert client.post("/api/maintenance/secrets/rotate").json()["payload"]["rotated"] == []
@@ -0,0 +1,75 @@
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from backend.csrf import CSRF_COOKIE, CSRFMiddleware
+
+app = FastAPI()
+app.add_middleware(CSRFMiddleware, enabled=True)
+
+
+@app.get("/ping")
+async def ping():
+    return {"ok": True}
+
+
+@app.post("/submit")
+async def submit():
+    return {"ok": True}
+
+
+@app.get("/stream")
+async def stream():
+    async def gen():
+        for i in range(3):
+            yield f"data: {i}\n\n"
+
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
+
+def test_safe_request_sets_cookie():
+    client = TestClient(app)
+    resp = client.get("/ping")
+    assert resp.status_code == 200
+    assert CSRF_COOKIE in resp.cookies
+    assert "samesite=lax" in resp.headers["set-cookie"].lower()
+
+
+def test_unsafe_request_requires_matching_token():
+    client = TestClient(app)
+    assert client.post("/submit").status_code == 400
+
+    client.cookies.set(CSRF_COOKIE, "abc")
+    assert client.post("/submit", headers={"X-CSRF-Token": "nope"}).status_code == 400
+    resp = client.post("/submit", headers={"X-CSRF-Token": "abc"})
+    assert resp.status_code == 200
+    assert "set-cookie" not in resp.headers
+
+    # Headers are decoded as latin-1, so non-ASCII tokens must not crash the comparison
+    resp = client.post("/submit", headers=[(b"x-csrf-token", "abcé".encode("latin-1"))])
+    assert resp.status_code == 400
+
+
+def test_streaming_body_passes_through():
+    client = TestClient(app)
+    resp = client.get("/stream")
+    assert resp.status_code == 200
+    assert resp.text == "data: 0\n\ndata: 1\n\ndata: 2\n\n"
+    assert CSRF_COOKIE in resp.cookies
+
+
+def test_disabled_middleware_skips_checks():
+    plain = FastAPI()
+    plain.add_middleware(CSRFMiddleware, enabled=False)
+    plain.post("/submit")(submit)
+    assert TestClient(plain).post("/submit").status_code == 200
+
+
+def test_exempt_paths_skip_checks():
+    beacon = FastAPI()
+    beacon.add_middleware(CSRFMiddleware, enabled=True, exempt_paths=("/beacon",))
+    beacon.post("/beacon")(submit)
+    beacon.post("/submit")(submit)
+    client = TestClient(beacon)
+    assert client.post("/beacon").status_code == 200
+    assert client.post("/submit").status_code == 400
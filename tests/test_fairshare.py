@@ -0,0 +1,137 @@
+import asyncio
+import os
+import sys
+import types
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["DISABLE_CSRF"] = "true"
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+from fastapi.testclient import TestClient
+from backend.fairshare import FairShareQueue, JobCancelled, parse_weights
+from backend.models import init_db
+import backend.server as server
+
+init_db()
+
+
+def _run(queue, submissions, before_release=None):
+    """Queue ``(job_id, user, priority)`` behind a held job and record admissions."""
+    order = []
+
+    async def job(job_id, user, priority=0, hold=None):
+        async with queue.slot(job_id, user, priority=priority):
+            order.append(job_id)
+            if hold is not None:
+                await hold.wait()
+            await asyncio.sleep(0)
+
+    async def run():
+        hold = asyncio.Event()
+        first = asyncio.create_task(job("held", "root", hold=hold))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(job(*s)) for s in submissions]
+        await asyncio.sleep(0)
+        if before_release is not None:
+            before_release()
+        hold.set()
+        return await asyncio.gather(first, *tasks, return_exceptions=True)
+
+    results = asyncio.run(run())
+    return order[1:], results
+
+
+def test_parse_weights():
+    assert parse_weights("alice=2, bob=0.5,,bad") == {"alice": 2.0, "bob": 0.5}
+
+
+def test_heavy_user_cannot_starve_others():
+    queue = FairShareQueue(capacity=1, user_cap=1)
+    flood = [(f"a{i}", "alice") for i in range(6)]
+    order, _ = _run(queue, flood + [("b0", "bob"), ("b1", "bob")])
+    # Bob queued last but alternates with alice instead of waiting for all six
+    assert order.index("b0") <= 2 and order.index("b1") <= 4
+
+
+def test_weights_split_admissions_proportionally():
+    queue = FairShareQueue(capacity=1, user_cap=1, weights={"alice": 2})
+    jobs = [(f"a{i}", "alice") for i in range(6)] + [(f"b{i}", "bob") for i in range(6)]
+    order, _ = _run(queue, jobs)
+    first_six = order[:6]
+    assert sum(j.startswith("a") for j in first_six) == 4
+
+
+def test_priority_orders_within_user_and_cancel_drops_waiter():
+    queue = FairShareQueue(capacity=1, user_cap=1)
+
+    def hook():
+        assert queue.position("a2") == 2
+        assert queue.reprioritize("a2", 5)
+        assert queue.position("a2") == 0
+        assert queue.cancel("a1")
+        assert not queue.cancel("held")
+
+    order, results = _run(queue, [("a0", "alice"), ("a1", "alice"), ("a2", "alice")], hook)
+    assert order == ["a2", "a0"]
+    assert any(isinstance(r, JobCancelled) for r in results)
+    snap = queue.snapshot()
+    assert snap["cancelled"] == 1 and snap["active"] == 0 and snap["waiting"] == 0
+
+
+def test_user_cap_leaves_room_for_others():
+    queue = FairShareQueue(capacity=3, user_cap=1)
+    admitted = []
+
+    async def run():
+        hold = asyncio.Event()
+
+        async def job(job_id, user):
+            async with queue.slot(job_id, user):
+                admitted.append(job_id)
+                await hold.wait()
+
+        tasks = [asyncio.create_task(job(f"a{i}", "alice")) for i in range(3)]
+        tasks.append(asyncio.create_task(job("b0", "bob")))
+        await asyncio.sleep(0)
+        assert sorted(admitted) == ["a0", "b0"]
+        assert queue.snapshot()["users"]["alice"] == {"waiting": 2, "active": 1, "weight": 1.0}
+        hold.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert len(admitted) == 4
+
+
+def test_cancel_and_priority_endpoints():
+    client = TestClient(server.app)
+    job_id = client.post("/api/generate", json={"prompt": "fair cat"}).json()["payload"]["job_id"]
+    job = server.jobs[job_id]
+    assert job["owner"].startswith("anon:") and job["status"] == "done"
+    assert client.post(f"/api/jobs/{job_id}/cancel").status_code == 409
+
+    queued = dict(job, status="queued", progress=0)
+    server.jobs["waiting-job"] = queued
+    res = client.post("/api/jobs/waiting-job/priority", json={"priority": 3})
+    assert res.json()["payload"]["priority"] == 3 and queued["priority"] == 3
+    assert client.post("/api/jobs/waiting-job/cancel").json()["payload"]["cancelled"]
+    assert queued["cancel_requested"] is True
+
+    queued["owner"] = "someone-else"
+    assert client.post("/api/jobs/waiting-job/cancel").status_code == 403
+    assert client.post("/api/jobs/missing/cancel").status_code == 404
+    del server.jobs["waiting-job"]
+
+    snap = client.get("/api/maintenance/fair-queue").json()["payload"]
+    assert snap["active"] == 0 and snap["admitted"] >= 1
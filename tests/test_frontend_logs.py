@@ -0,0 +1,111 @@
+import asyncio
+import gzip
+import json
+import os
+import sys
+import types
+
+import pytest
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["DISABLE_CSRF"] = "true"
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+from fastapi.testclient import TestClient
+from backend.frontend_logs import (
+    BatchError,
+    BufferedLogWriter,
+    FrontendLogIngest,
+    TokenBuckets,
+    decode_batch,
+)
+import backend.server as server
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_decode_batch_accepts_lists_objects_and_gzip():
+    events = [{"message": "a"}, {"message": "b"}, "junk"]
+    assert decode_batch(json.dumps(events).encode()) == events[:2]
+    assert decode_batch(json.dumps({"events": events}).encode()) == events[:2]
+    # Recognised by the magic bytes even without Content-Encoding
+    assert decode_batch(gzip.compress(json.dumps(events).encode())) == events[:2]
+    with pytest.raises(BatchError):
+        decode_batch(b'{"message": "not a batch"}')
+    with pytest.raises(BatchError):
+        decode_batch(b"\x1f\x8bnot gzip", "gzip")
+
+
+def test_ingest_collapses_samples_and_rate_limits(tmp_path):
+    path = tmp_path / "frontend.txt"
+    ingest = FrontendLogIngest(
+        writer=BufferedLogWriter(str(path), interval=0),
+        limiter=TokenBuckets(rate=0, burst=3),
+        sample_rates={"error": 1, "info": 0},
+    )
+    storm = [{"level": "error", "message": "boom"}] * 50
+    chatter = [{"level": "info", "message": f"click {i}"} for i in range(5)]
+    distinct = [{"level": "error", "message": f"e{i}"} for i in range(4)]
+
+    result = asyncio.run(ingest.ingest("1.2.3.4", storm + chatter + distinct))
+    assert result == {"accepted": 3, "collapsed": 49, "sampled_out": 5, "rate_limited": 2}
+    lines = _lines(path)
+    assert lines[0]["event"] == {"client": "1.2.3.4", "level": "error", "message": "boom", "count": 50}
+    assert [line["event"]["message"] for line in lines[1:]] == ["e0", "e1"]
+
+    # The bucket is empty for this client only
+    assert asyncio.run(ingest.ingest("1.2.3.4", distinct))["accepted"] == 0
+    assert asyncio.run(ingest.ingest("5.6.7.8", distinct))["accepted"] == 3
+
+
+def test_ingest_tolerates_hostile_fields(tmp_path):
+    path = tmp_path / "frontend.txt"
+    ingest = FrontendLogIngest(writer=BufferedLogWriter(str(path), interval=0), sample_rates={})
+    events = [
+        {"message": "a", "count": "many"},
+        {"message": "a", "count": None},
+        {"message": "big", "value": 2**70},
+        {"message": "spoof", "client": "spoofed"},
+    ]
+    assert asyncio.run(ingest.ingest("1.2.3.4", events))["accepted"] == 3
+    lines = {line["event"]["message"]: line["event"] for line in _lines(path)}
+    assert lines["a"]["count"] == 2
+    assert lines["big"]["value"] == 2**70
+    assert lines["spoof"]["client"] == "1.2.3.4"
+
+
+def test_batch_endpoint_buffers_writes(tmp_path, monkeypatch):
+    path = tmp_path / "frontend.txt"
+    ingest = FrontendLogIngest(writer=BufferedLogWriter(str(path), interval=60), sample_rates={})
+    monkeypatch.setattr(server, "frontend_logs", ingest)
+    client = TestClient(server.app)
+
+    body = gzip.compress(json.dumps([{"level": "warn", "message": f"m{i}"} for i in range(3)]).encode())
+    res = client.post(
+        "/api/logs/frontend/batch",
+        content=body,
+        headers={"Content-Encoding": "gzip", "Content-Type": "text/plain"},
+    )
+    assert res.json()["payload"]["accepted"] == 3
+    assert client.post("/api/logs/frontend", json={"level": "error", "message": "x"}).json()["payload"] == {"logged": True}
+    assert not path.exists()  # still buffered
+    assert client.get("/api/maintenance/frontend-logs").json()["payload"]["pending_lines"] == 4
+
+    asyncio.run(ingest.writer.flush())
+    assert [line["event"]["message"] for line in _lines(path)] == ["m0", "m1", "m2", "x"]
+    assert client.post("/api/logs/frontend/batch", content=b"nope").status_code == 400
+    assert client.post("/api/logs/frontend", json="plain text").json()["success"] is True
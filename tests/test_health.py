@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+import types
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["DISABLE_CSRF"] = "true"
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+from fastapi.testclient import TestClient
+import backend.server as server
+
+
+def test_ready_only_inside_lifespan():
+    assert TestClient(server.app).get("/api/health/ready").status_code == 503
+
+    with TestClient(server.app) as client:
+        res = client.get("/api/health/ready")
+        assert res.status_code == 200
+        assert res.json()["payload"] == {"ready": True, "startup": True, "database": True}
+        assert server._background and not any(t.done() for t in server._background)
+
+    assert not server._background and server._started is False
+
+
+def test_mongo_client_created_on_first_use():
+    lazy = server.LazyDatabase()
+    assert lazy.connected is False
+    lazy.resolve()
+    assert lazy.connected is True
+
+
+def test_shared_state_and_secrets_created_on_first_use(tmp_path):
+    from backend.shared_state import LazySharedState, SQLiteState
+
+    path = tmp_path / "state.db"
+    lazy = LazySharedState(str(path))
+    assert lazy.shared and not path.exists()
+    assert isinstance(lazy.resolve(), SQLiteState) and path.exists()
+    asyncio.run(lazy.close())
+
+    provider = server.create_secrets_provider(server.LazyDatabase())
+    assert provider.store._fernet is None
+    assert provider.store.fernet is provider.store.fernet
+
+
+class IndexedCollection:
+    def __init__(self):
+        self.indexes = []
+
+    async def create_index(self, keys, **kwargs):
+        self.indexes.append(kwargs["name"])
+
+
+def test_startup_creates_mongo_indexes(monkeypatch):
+    lazy = server.LazyDatabase()
+    lazy._db = types.SimpleNamespace(saved_images=IndexedCollection(), users=IndexedCollection())
+    monkeypatch.setattr(server, "db", lazy)
+
+    with TestClient(server.app) as client:
+        assert client.get("/api/health/ready").status_code == 200
+
+    assert lazy._db.saved_images.indexes == ["user_gallery", "saved_image_id"]
+    assert lazy._db.users.indexes == ["user_username", "user_id"]
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import sys
+import types
+import uuid
+
+import httpx
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["DISABLE_CSRF"] = "true"
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+from fastapi.testclient import TestClient
+from backend.history_sync import HistoryMirror, output_files, prompt_text
+from backend.models import init_db
+import backend.server as server
+
+init_db()
+
+
+def _entry(text, filename):
+    return {
+        "prompt": [0, "x", {"6": {"class_type": "CLIPTextEncode", "inputs": {"text": text}}}, {}, ["9"]],
+        "outputs": {
+            "9": {"images": [{"filename": filename, "subfolder": "run", "type": "output"}]},
+            "10": {"images": [{"filename": "preview.png", "subfolder": "", "type": "temp"}]},
+        },
+        "status": {"messages": [["execution_start", {"timestamp": 1700000000000}]]},
+    }
+
+
+class FakeComfy:
+    """Pages an ordered history the way ComfyUI's ``get_history`` does."""
+
+    def __init__(self):
+        self.history = {}
+        self.requests = []
+
+    def add(self, n):
+        ids = []
+        for _ in range(n):
+            pid = str(uuid.uuid4())
+            self.history[pid] = _entry(f"prompt {pid[:6]}", f"{pid[:6]}.png")
+            ids.append(pid)
+        return ids
+
+    def handler(self, request):
+        self.requests.append(request.url.path)
+        parts = request.url.path.split("/")
+        if len(parts) == 3 and parts[1] == "history":
+            pid = parts[2]
+            return httpx.Response(200, json={pid: self.history[pid]} if pid in self.history else {})
+        max_items = int(request.url.params["max_items"])
+        offset = int(request.url.params.get("offset", -1))
+        if offset < 0:
+            offset = len(self.history) - max_items
+        keys = list(self.history)[max(offset, 0):][:max_items]
+        return httpx.Response(200, json={k: self.history[k] for k in keys})
+
+
+def _sync(mirror, comfy):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(comfy.handler)) as client:
+            return await mirror.sync(client)
+
+    comfy.requests.clear()
+    return asyncio.run(run())
+
+
+def test_entry_helpers():
+    entry = _entry("a cat", "cat.png")
+    assert prompt_text(entry) == "a cat"
+    assert output_files(entry) == ["run/cat.png"]
+
+
+def test_incremental_sync_pages_only_new_entries():
+    comfy = FakeComfy()
+    base = f"http://comfy-{uuid.uuid4().hex[:6]}:8188"
+    mirror = HistoryMirror(base, page_size=4)
+    comfy.add(10)
+    assert _sync(mirror, comfy) == 10
+    assert mirror.cursor == 10 and len(comfy.requests) == 3
+
+    assert _sync(mirror, comfy) == 0
+    # One anchor check plus one (empty) page
+    assert len(comfy.requests) == 2
+
+    comfy.add(2)
+    assert _sync(mirror, comfy) == 2
+
+    # ComfyUI trims its oldest entries; the mirror re-anchors without rescanning
+    for pid in list(comfy.history)[:3]:
+        del comfy.history[pid]
+    new = comfy.add(1)
+    assert _sync(mirror, comfy) == 1
+    assert mirror.cursor == 10 and mirror.last_id == new[0]
+
+    # Restart clears history; everything new is still picked up
+    comfy.history.clear()
+    comfy.add(2)
+    assert _sync(mirror, comfy) == 2
+    assert mirror.stats["reanchored"] == 2
+
+    client = TestClient(server.app)
+    page = client.get("/api/history", params={"source": base, "limit": 5}).json()["payload"]
+    assert page["total"] == 15 and len(page["items"]) == 5
+    assert page["items"][0]["outputs"][0]["file_path"].startswith("run/")
+    rest = client.get("/api/history", params={"source": base, "limit": 5, "offset": 10}).json()["payload"]
+    assert len(rest["items"]) == 5
+    assert not {i["id"] for i in page["items"]} & {i["id"] for i in rest["items"]}
+
+
+def test_overlapping_syncs_do_not_conflict():
+    comfy = FakeComfy()
+    base = f"http://comfy-{uuid.uuid4().hex[:6]}:8188"
+    mirror = HistoryMirror(base, page_size=4)
+    other_worker = HistoryMirror(base, page_size=4)
+    comfy.add(6)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(comfy.handler)) as client:
+            return await asyncio.gather(mirror.sync(client), mirror.sync(client), other_worker.sync(client))
+
+    added = asyncio.run(run())
+    assert added[1] == 0  # waited for the first pass, then found nothing new
+    client = TestClient(server.app)
+    page = client.get("/api/history", params={"source": base, "limit": 10}).json()["payload"]
+    assert page["total"] == 6
+
+
+def test_tracked_prompt_fetched_directly():
+    comfy = FakeComfy()
+    mirror = HistoryMirror(f"http://comfy-{uuid.uuid4().hex[:6]}:8188", page_size=4)
+    comfy.add(3)
+    _sync(mirror, comfy)
+    (pid,) = comfy.add(1)
+    mirror.track("not-finished-yet")
+    mirror.track(pid)
+    assert _sync(mirror, comfy) == 1
+    assert mirror.pending == {"not-finished-yet"}
+    assert any(path.endswith(pid) for path in comfy.requests)
+
+
+def test_history_proxy_forwards_pagination(monkeypatch):
+    calls = []
+
+    class Resp:
+        status_code = 200
+
+        def json(self):
+            return {}
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append((url, params))
+        return Resp()
+
+    monkeypatch.setattr(server.requests, "get", fake_get)
+    client = TestClient(server.app)
+    client.get("/api/comfyui/history")
+    client.get("/api/comfyui/history", params={"max_items": 10, "offset": 20})
+    client.get("/api/comfyui/history", params={"prompt_id": "abc"})
+    assert calls[0][1] == {"max_items": server.HISTORY_PAGE_SIZE, "offset": -1}
+    assert calls[1][1] == {"max_items": 10, "offset": 20}
+    assert calls[2] == (f"{server.COMFYUI_BASE_URL}/history/abc", None)
@@ -0,0 +1,111 @@
+import functools
+import gzip
+import http.client
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import launch
+
+
+@pytest.fixture()
+def build(tmp_path):
+    (tmp_path / "static" / "js").mkdir(parents=True)
+    (tmp_path / "index.html").write_text("<html>" + "app " * 500 + "</html>")
+    (tmp_path / "static" / "js" / "main.1a2b3c4d.js").write_text("console.log(1);" * 5000)
+    (tmp_path / "favicon.ico").write_bytes(b"\x00" * 100)
+    return tmp_path
+
+
+@pytest.fixture()
+def serve(build):
+    handler = functools.partial(launch.StaticHandler, directory=str(build))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def get(path, **headers):
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+        conn.request("GET", path, headers=headers)
+        res = conn.getresponse()
+        body = res.read()
+        conn.close()
+        return res, body
+
+    get.port = server.server_address[1]
+    yield get
+    server.shutdown()
+    server.server_close()
+
+
+def test_precompress_writes_smaller_variants_once(build):
+    written = launch.precompress(build)
+    assert (build / "index.html.gz").exists()
+    assert not (build / "favicon.ico.gz").exists()  # below the size threshold
+    assert written == (4 if launch.brotli else 2)
+    assert launch.precompress(build) == 0
+
+
+def test_static_handler_negotiates_and_caches(build, serve):
+    launch.precompress(build)
+    js = "/static/js/main.1a2b3c4d.js"
+
+    res, body = serve(js, **{"Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert res.headers["Cache-Control"] == launch.IMMUTABLE
+    assert res.headers["Content-Type"].endswith("javascript")
+    assert gzip.decompress(body) == (build / "static/js/main.1a2b3c4d.js").read_bytes()
+    if launch.brotli:
+        res, body = serve(js, **{"Accept-Encoding": "gzip, br"})
+        assert res.headers["Content-Encoding"] == "br"
+        assert launch.brotli.decompress(body).startswith(b"console.log")
+
+    res, body = serve(js, **{"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in res.headers
+    assert len(body) == 75000  # large enough to go through sendfile
+
+    res, _ = serve("/index.html")
+    assert res.headers["Cache-Control"] == "no-cache"
+    etag = res.headers["ETag"]
+    res, body = serve("/index.html", **{"If-None-Match": etag})
+    assert res.status == 304 and body == b""
+
+
+def test_static_handler_falls_back_to_index_for_routes(serve):
+    res, body = serve("/gallery/42")
+    assert res.status == 200 and body.startswith(b"<html>")
+    res, _ = serve("/static/js/missing.js")
+    assert res.status == 404
+
+
+def test_steps_rerun_only_when_inputs_change(tmp_path, monkeypatch):
+    reqs = tmp_path / "requirements.txt"
+    reqs.write_text("fastapi\n")
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "App.js").write_text("export default 1;")
+    out = tmp_path / "build.txt"
+    monkeypatch.setitem(launch.PHASE_INPUTS, "pip", [reqs])
+    monkeypatch.setitem(launch.PHASE_INPUTS, "yarn build", [src])
+    monkeypatch.setitem(launch.PHASE_OUTPUTS, "yarn build", out)
+    ran = []
+    monkeypatch.setattr(launch, "run", lambda cmd, cwd=None: ran.append(cmd) or out.write_text("ok"))
+
+    cache = launch.FingerprintCache(tmp_path / "fingerprints.json")
+    assert launch.step(cache, "pip", "pip", None) is True
+    assert launch.step(cache, "yarn build", "build", None) is True
+    cache = launch.FingerprintCache(tmp_path / "fingerprints.json")
+    assert launch.step(cache, "pip", "pip", None) is False
+    assert launch.step(cache, "yarn build", "build", None) is False
+    assert launch.step(cache, "pip", "pip", None, force=True) is True
+
+    (src / "App.js").write_text("export default 2;")
+    assert launch.step(cache, "yarn build", "build", None) is True
+    out.unlink()
+    assert launch.step(cache, "yarn build", "build", None) is True
+    assert ran == ["pip", "build", "pip", "build", "build"]
+
+
+def test_wait_ready_probes_http(serve):
+    assert launch.wait_ready(f"http://127.0.0.1:{serve.port}/", timeout=2) is True
+    assert launch.wait_ready("http://127.0.0.1:9/", timeout=0.3) is False
@@ -0,0 +1,145 @@
+import asyncio
+import gzip
+import json
+import os
+import sys
+import types
+
+import httpx
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["DISABLE_CSRF"] = "true"
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+from fastapi.testclient import TestClient
+from backend.object_info import ObjectInfoCache, build_index, search_index
+import backend.server as server
+
+INFO = {
+    "KSampler": {
+        "display_name": "KSampler",
+        "category": "sampling",
+        "input": {"required": {"seed": ["INT", {}], "steps": ["INT", {}], "model": ["MODEL"]}},
+        "output": ["LATENT"],
+    },
+    "LoraLoader": {
+        "display_name": "Load LoRA",
+        "category": "loaders",
+        "input": {"required": {"model": ["MODEL"], "lora_name": [["a.safetensors"]]}},
+        "output": ["MODEL", "CLIP"],
+    },
+    "CheckpointLoaderSimple": {
+        "display_name": "Load Checkpoint",
+        "category": "loaders",
+        "input": {"required": {"ckpt_name": [["sdxl.safetensors"]]}},
+        "output": ["MODEL", "CLIP", "VAE"],
+    },
+}
+
+
+class FakeComfy:
+    def __init__(self):
+        self.calls = {"object_info": 0}
+        self.loras = ["a.safetensors"]
+
+    def handler(self, request):
+        path = request.url.path
+        if path == "/object_info":
+            self.calls["object_info"] += 1
+            return httpx.Response(200, json=INFO)
+        if path == "/models":
+            return httpx.Response(200, json=["checkpoints", "loras"])
+        if path == "/models/loras":
+            return httpx.Response(200, json=self.loras)
+        if path == "/models/checkpoints":
+            return httpx.Response(200, json=["sdxl.safetensors"])
+        return httpx.Response(404)
+
+
+def _run(coro_fn, comfy):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(comfy.handler)) as client:
+            return await coro_fn(client)
+
+    return asyncio.run(run())
+
+
+def test_search_ranks_name_matches_first():
+    index = build_index(INFO)
+    assert [e["name"] for e in search_index(index, "load")] == ["LoraLoader", "CheckpointLoaderSimple"]
+    assert [e["name"] for e in search_index(index, "lora_name")] == ["LoraLoader"]
+    assert [e["name"] for e in search_index(index, "loaders ckpt")] == ["CheckpointLoaderSimple"]
+    assert search_index(index, "nothing") == []
+
+
+def test_fetch_once_and_refresh_when_models_change():
+    comfy = FakeComfy()
+    cache = ObjectInfoCache("http://comfy:8188")
+
+    async def concurrent(client):
+        await asyncio.gather(cache.ensure(client), cache.ensure(client), cache.ensure(client))
+
+    _run(concurrent, comfy)
+    assert comfy.calls["object_info"] == 1
+    assert json.loads(cache.node("KSampler"))["output"] == ["LATENT"]
+    assert cache.node("Missing") is None
+
+    assert _run(cache.check, comfy) is False
+    assert _run(cache.check, comfy) is False
+    comfy.loras.append("b.safetensors")
+    assert _run(cache.check, comfy) is True
+    assert comfy.calls["object_info"] == 2
+
+    cache.mark_stale()
+    assert _run(cache.check, comfy) is True
+    assert comfy.calls["object_info"] == 3
+
+
+def test_endpoints_serve_compressed_cache(monkeypatch):
+    comfy = FakeComfy()
+    cache = ObjectInfoCache(server.COMFYUI_BASE_URL)
+    _run(cache.refresh, comfy)
+    monkeypatch.setitem(server.object_info_caches, server.COMFYUI_BASE_URL, cache)
+    client = TestClient(server.app)
+
+    res = client.get("/api/comfyui/object_info")
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.json()["payload"]["LoraLoader"]["category"] == "loaders"
+    assert len(cache.envelope_gz) < len(gzip.decompress(cache.envelope_gz))
+
+    plain = client.get("/api/comfyui/object_info", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.json() == res.json()
+
+    etag = res.headers["etag"]
+    assert client.get("/api/comfyui/object_info", headers={"If-None-Match": etag}).status_code == 304
+
+    node = client.get("/api/comfyui/object_info/KSampler").json()["payload"]
+    assert node["input"]["required"]["seed"][0] == "INT"
+    assert client.get("/api/comfyui/object_info/Nope").status_code == 404
+
+    found = client.get("/api/comfyui/object_info/search", params={"q": "checkpoint"}).json()["payload"]
+    assert found[0]["name"] == "CheckpointLoaderSimple"
+    assert len(client.get("/api/comfyui/object_info/search").json()["payload"]) == 3
+    assert comfy.calls["object_info"] == 1
+
+    async def ensure(self):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(comfy.handler)) as http:
+            await self.refresh(http)
+
+    monkeypatch.setattr(server.ObjectInfoCache, "ensure", ensure)
+    other = client.get("/api/comfyui/object_info/KSampler", headers={"X-Comfyui-Url": "http://elsewhere:8188"})
+    assert other.status_code == 200
+    assert "http://elsewhere:8188" not in server.object_info_caches
@@ -0,0 +1,109 @@
+import os
+import sys
+import types
+import asyncio
+
+import pytest
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["DISABLE_CSRF"] = "true"
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+from fastapi.testclient import TestClient
+import backend.server as server
+from backend.parameter_registry import ParameterRegistry
+from backend.prompt_parser import MappingTable, tokens_to_patch
+
+
+class CountingCollection:
+    def __init__(self):
+        self.data = {}
+        self.finds = 0
+    async def insert_one(self, doc):
+        self.data[doc["_id"]] = doc
+    def find(self):
+        self.finds += 1
+        data = list(self.data.values())
+        class Cursor:
+            async def to_list(self, limit):
+                return data
+        return Cursor()
+    async def update_one(self, filt, update, upsert=False):
+        doc = self.data.get(filt["_id"], {})
+        doc.update(update["$set"])
+        self.data[filt["_id"]] = doc
+    async def delete_one(self, filt):
+        self.data.pop(filt["_id"], None)
+
+
+@pytest.fixture
+def mappings(monkeypatch):
+    coll = CountingCollection()
+    monkeypatch.setattr(server, "db", types.SimpleNamespace(parameter_mappings=coll))
+    monkeypatch.setattr(
+        server, "parameter_registry", ParameterRegistry(lambda: server.db.parameter_mappings)
+    )
+    return coll
+
+
+def test_parameters_served_from_snapshot_with_etag(mappings):
+    client = TestClient(server.app)
+    resp = client.post("/api/parameters", json={"code": "--ar", "node_id": "1", "param_name": "ar"})
+    param_id = resp.json()["payload"]["id"]
+
+    first = client.get("/api/parameters")
+    second = client.get("/api/parameters")
+    assert first.json()["payload"][0]["code"] == "--ar"
+    assert first.headers["etag"] == second.headers["etag"]
+    assert mappings.finds == 1
+
+    resp = client.get("/api/parameters", headers={"If-None-Match": first.headers["etag"]})
+    assert resp.status_code == 304
+
+    client.put(
+        f"/api/parameters/{param_id}",
+        json={"id": param_id, "code": "--ar", "node_id": "2", "param_name": "ar"},
+    )
+    updated = client.get("/api/parameters", headers={"If-None-Match": first.headers["etag"]})
+    assert updated.status_code == 200
+    assert updated.json()["payload"][0]["node_id"] == "2"
+
+    client.delete(f"/api/parameters/{param_id}")
+    assert client.get("/api/parameters").json()["payload"] == []
+    assert mappings.finds == 1
+
+
+def test_registry_hands_out_versioned_immutable_tables(mappings):
+    registry = server.parameter_registry
+    seen = []
+    registry.subscribe(seen.append)
+
+    async def run():
+        table = await registry.table()
+        registry.upsert({"_id": "p1", "code": "--style", "node_id": "3", "param_name": "style"})
+        return table, await registry.table()
+
+    before, after = asyncio.run(run())
+    assert isinstance(after, MappingTable)
+    assert after.version > before.version
+    assert len(before) == 0 and len(after) == 1
+    assert seen[-1] is after
+    with pytest.raises(AttributeError):
+        after.version = 0
+    with pytest.raises(TypeError):
+        after.by_code["style"] = {}
+
+    patches = tokens_to_patch({"style": "vivid"}, after)
+    assert patches == [{"op": "replace", "path": "/nodes/3/properties/style", "value": "vivid"}]
@@ -0,0 +1,180 @@
+import asyncio
+import io
+import os
+import sys
+import types
+
+from PIL import Image
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["DISABLE_CSRF"] = "true"
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+from fastapi.testclient import TestClient
+from backend.models import init_db
+from backend import previews
+from backend.previews import PreviewHub, PreviewListener, decode_frame, downscale, encode_frame
+import backend.server as server
+
+init_db()
+
+
+def _png(size=(256, 128)):
+    out = io.BytesIO()
+    Image.new("RGB", size, "red").save(out, format="PNG")
+    return out.getvalue()
+
+
+class FakeSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.frames = []
+        self.messages = []
+
+    async def send_bytes(self, data):
+        await asyncio.sleep(self.delay)
+        self.frames.append((asyncio.get_running_loop().time(), data))
+
+    async def send_json(self, data):
+        self.messages.append(data)
+
+
+def test_frames_round_trip_and_downscale():
+    png = _png()
+    frame = decode_frame(encode_frame(2, png))
+    assert frame.image_type == 2 and frame.data == png
+    assert decode_frame(b"\x00\x00\x00\x02\x00\x00\x00\x01abc") is None
+
+    scaled = decode_frame(downscale(frame, 64))
+    assert scaled.image_type == 1
+    with Image.open(io.BytesIO(scaled.data)) as image:
+        assert image.size == (64, 32)
+
+
+def test_upstream_messages_route_frames_to_running_prompt():
+    hub = PreviewHub()
+    hub.track("p1")
+    hub.feed_binary("comfy", encode_frame(1, b"jpeg"))
+    assert hub.stats["unrouted"] == 1
+
+    hub.feed_json("comfy", {"type": "progress", "data": {"prompt_id": "p1", "value": 3, "max": 20}})
+    assert hub.progress["p1"]["value"] == 3
+    hub.feed_binary("comfy", encode_frame(1, b"jpeg"))
+    assert hub.stats["frames"] == 1
+
+    hub.feed_json("comfy", {"type": "executing", "data": {"prompt_id": "p1", "node": None}})
+    assert hub.finished("p1") and hub.tracked("p1") and "p1" not in hub.progress
+    hub.feed_binary("comfy", encode_frame(1, b"jpeg"))
+    assert hub.stats["unrouted"] == 2
+
+
+def test_slow_subscriber_does_not_delay_others():
+    async def run():
+        hub = PreviewHub()
+        slow, fast = FakeSocket(delay=0.3), FakeSocket()
+        slow_sub = hub.subscribe("p1", slow, fps=30)
+        fast_sub = hub.subscribe("p1", fast, fps=5)
+        start = asyncio.get_running_loop().time()
+        for i in range(10):
+            hub.publish("p1", 1, b"frame%d" % i)
+            await asyncio.sleep(0.05)
+        # Five frames a second over ~0.5s: the first plus the latest at each slot
+        assert 2 <= len(fast.frames) <= 4
+        assert fast.frames[0][0] - start < 0.1
+        gaps = [b[0] - a[0] for a, b in zip(fast.frames, fast.frames[1:])]
+        assert all(gap >= 0.19 for gap in gaps)
+        # The slow socket only ever got the newest frame after each send
+        assert len(slow.frames) <= 2 and slow_sub.dropped >= 7
+        fast_sub.offer_json({"status": "done"})
+        await fast_sub.flush()
+        assert fast.messages == [{"status": "done"}]
+        await slow_sub.flush()
+        assert slow.frames[-1][1].endswith(b"frame9")
+        for sub in (slow_sub, fast_sub):
+            hub.unsubscribe(sub)
+        assert hub.snapshot()["subscribers"] == 0
+
+    asyncio.run(run())
+
+
+def test_progress_socket_with_previews_for_local_job():
+    client = TestClient(server.app)
+    job_id = client.post("/api/generate", json={"prompt": "preview"}).json()["payload"]["job_id"]
+    with client.websocket_connect(f"/api/progress/ws/{job_id}?previews=1&fps=5&max_size=64") as ws:
+        msg = ws.receive_json()
+        while msg["job"]["status"] != "done":
+            msg = ws.receive_json()
+    assert server.preview_hub.snapshot()["subscribers"] == 0
+
+    server.preview_hub.track("remote-1")
+    server.preview_hub.feed_json("comfy", {"type": "execution_success", "data": {"prompt_id": "remote-1"}})
+    with client.websocket_connect("/api/progress/ws/remote-1?previews=1") as ws:
+        assert ws.receive_json()["status"] == "done"
+
+
+def test_prompt_proxy_routes_previews_to_relay(monkeypatch):
+    base = server.COMFYUI_BASE_URL.rstrip("/")
+    listener = server.preview_listeners[base]
+    started = []
+    monkeypatch.setattr(listener, "start", lambda: started.append(True))
+    sent = {}
+
+    class Resp:
+        status_code = 200
+
+        def json(self):
+            return {"prompt_id": "remote-2", "number": 1}
+
+    def fake_post(url, json=None, timeout=None):
+        sent.update(json)
+        return Resp()
+
+    monkeypatch.setattr(server.requests, "post", fake_post)
+    client = TestClient(server.app)
+    client.post("/api/comfyui/prompt", json={"prompt": {}})
+    assert sent["client_id"] == listener.client_id and started
+    assert server.preview_hub.tracked("remote-2")
+
+    client.post("/api/comfyui/prompt", json={"prompt": {}, "client_id": "browser"})
+    assert sent["client_id"] == "browser"
+
+
+def test_listener_stops_and_restarts_on_a_new_loop(monkeypatch):
+    def refuse(url, **kwargs):
+        raise OSError("connection refused")
+
+    monkeypatch.setattr(previews, "websockets", types.SimpleNamespace(connect=refuse))
+    listener = PreviewListener("http://127.0.0.1:1", PreviewHub())
+
+    async def start():
+        listener.start()
+        await asyncio.sleep(0)
+        return listener._task
+
+    old_loop = asyncio.new_event_loop()
+    try:
+        stale = old_loop.run_until_complete(start())  # the loop is left without stopping it
+
+        async def restart():
+            task = await start()
+            assert task is not stale and not task.done()
+            await listener.stop()
+            assert task.cancelled() and listener._task is None and not listener.connected
+
+        asyncio.run(restart())
+    finally:
+        stale.cancel()
+        old_loop.run_until_complete(asyncio.gather(stale, return_exceptions=True))
+        old_loop.close()
@@ -50,6 +50,7 @@ sys.modules["motor.motor_asyncio"] = motor_asyncio
 from fastapi.testclient import TestClient
 from backend.models import init_db
 from backend.server import app
+import backend.server as server
 
 init_db()
 client = TestClient(app)
@@ -88,3 +89,15 @@ def test_sse_progress():
                 break
         assert "done" in statuses
 
+
+def test_job_that_raises_ends_as_failed(monkeypatch):
+    async def broken_graph(workflow_id):
+        raise ValueError("stored workflow is not valid JSON")
+
+    monkeypatch.setattr(server, "_workflow_graph", broken_graph)
+    job_id = client.post("/api/generate", json={"prompt": "broken"}).json()["payload"]["job_id"]
+
+    with client.stream("GET", f"/api/progress/stream/{job_id}") as stream:
+        statuses = [json.loads(line[6:])["job"]["status"] for line in stream.iter_lines() if line]
+    assert statuses[-1] == "failed"
+    assert "not valid JSON" in server.jobs[job_id]["error"]
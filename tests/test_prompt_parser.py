@@ -52,5 +52,10 @@ class PromptParserTests(unittest.TestCase):
         self.assertEqual(tokens['style'], 'very cool')
         self.assertEqual(tokens['ar'], '1:1')
 
+    def test_parse_prompt_with_unbalanced_quote(self):
+        clean, tokens = parse_prompt("a cat's toy --steps 20")
+        self.assertEqual(clean, "a cat's toy")
+        self.assertEqual(tokens["steps"], "20")
+
 if __name__ == "__main__":
     unittest.main()
@@ -47,3 +47,9 @@ def test_prompt_and_output_storage():
     assert o_resp.status_code == 200
     outputs = o_resp.json()["payload"]
     assert any(o["prompt_id"] == job_id for o in outputs)
+
+
+def test_prompt_with_apostrophe_generates():
+    resp = client.post("/api/generate", json={"prompt": "a cat's toy"})
+    assert resp.status_code == 200
+    assert resp.json()["payload"]["job_id"]
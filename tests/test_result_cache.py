@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sys
+import types
+import uuid
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["DISABLE_CSRF"] = "true"
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+from fastapi.testclient import TestClient
+from backend.models import init_db
+from backend.result_cache import ResultCache, nondeterminism, result_key
+import backend.server as server
+
+init_db()
+
+
+def _graph(seed, sampler_id="3"):
+    return {
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sdxl"}},
+        sampler_id: {
+            "class_type": "KSampler",
+            "inputs": {"seed": seed, "model": ["4", 0]},
+            "_meta": {"title": "Sampler"},
+        },
+    }
+
+
+def test_key_is_canonical_and_seed_sensitive():
+    a = result_key(_graph(1))
+    renumbered = _graph(1, sampler_id="99")
+    renumbered["99"]["_meta"] = {"title": "Renamed"}
+    assert result_key(renumbered) == a
+    assert result_key(_graph(2)) != a
+    assert result_key(_graph(1), {"init_image": "abc"}) != a
+
+
+def test_nondeterminism_policy():
+    assert nondeterminism(_graph(7)) is None
+    assert "random seed" in nondeterminism(_graph(-1))
+    graph = _graph(7)
+    graph["5"] = {"class_type": "LoadImageFromUrl", "inputs": {"url": "http://x"}}
+    assert "non-deterministic" in nondeterminism(graph)
+
+
+def test_lru_bound():
+    cache = ResultCache(max_entries=2)
+    cache._warm = True
+    for key in ("a", "b"):
+        cache.store(key, key, [{"file_path": f"{key}.png", "blurhash": None}])
+    asyncio.run(cache.lookup("a"))
+    cache.store("c", "c", [])
+    assert asyncio.run(cache.lookup("b")) is None
+    assert asyncio.run(cache.lookup("a"))["outputs"] == [{"file_path": "a.png", "blurhash": None}]
+    assert cache.snapshot()["evicted"] == 1
+
+
+def test_identical_seeded_request_completes_from_cache():
+    client = TestClient(server.app)
+    prompt = f"lighthouse {uuid.uuid4().hex} --seed 42"
+    first = client.post("/api/generate", json={"prompt": prompt}).json()["payload"]["job_id"]
+    second = client.post("/api/generate", json={"prompt": prompt}).json()["payload"]["job_id"]
+    assert server.jobs[first]["cached"] is False
+    job = server.jobs[second]
+    assert job["cached"] is True and job["cached_from"] == first
+    assert job["status"] == "done"
+
+    outputs = client.get("/api/relational/outputs").json()["payload"]
+    linked = {o["prompt_id"]: o["file_path"] for o in outputs if o["prompt_id"] in (first, second)}
+    assert linked[first] == linked[second] == f"{first}.png"
+
+    unseeded = client.post("/api/generate", json={"prompt": prompt.replace(" --seed 42", "")})
+    job = server.jobs[unseeded.json()["payload"]["job_id"]]
+    assert job["cached"] is False and job["uncacheable"] == "no fixed seed"
@@ -0,0 +1,46 @@
+from backend.routing import ModelAffinityRouter, extract_model_set
+
+SDXL = frozenset({"ckpt:sdxl.safetensors"})
+SD15 = frozenset({"ckpt:sd15.safetensors"})
+
+
+def test_extract_model_set_from_loaders():
+    graph = {
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sdxl.safetensors"}},
+        "10": {"class_type": "LoraLoader", "inputs": {"lora_name": "detail.safetensors", "model": ["4", 0]}},
+        "3": {"class_type": "KSampler", "inputs": {"seed": 1}},
+    }
+    assert extract_model_set(graph) == {"ckpt:sdxl.safetensors", "lora:detail.safetensors"}
+    assert extract_model_set(None) == frozenset()
+
+
+def test_routes_to_instance_with_same_models():
+    router = ModelAffinityRouter(["a", "b"], spillover_depth=4)
+    a = router.route(SDXL)
+    router.complete(a, SDXL)
+    b = router.route(SD15)
+    assert b is not a
+    router.complete(b, SD15)
+    assert router.route(SDXL) is a
+    assert router.route(SD15) is b
+    assert router.stats["affine"] == 2
+
+
+def test_spills_over_when_affine_instance_is_deep():
+    router = ModelAffinityRouter(["a", "b"], spillover_depth=2)
+    first = router.route(SDXL)
+    second = router.route(SDXL)
+    assert second is first  # depth 1 vs 0 is within the spillover margin
+    third = router.route(SDXL)
+    assert third is not first
+    assert router.stats["spilled"] == 1
+
+
+def test_complete_counts_model_swaps():
+    router = ModelAffinityRouter(["a"])
+    inst = router.instances["a"]
+    for models in (SDXL, SDXL, SD15, SDXL):
+        router.route(models)
+        router.complete(inst, models)
+    assert inst.swaps == 2
+    assert router.snapshot()["instances"][0]["models"] == ["ckpt:sdxl.safetensors"]
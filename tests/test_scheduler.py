@@ -0,0 +1,90 @@
+import asyncio
+
+from backend.scheduler import CacheAffinityScheduler, job_signature, node_hashes
+
+
+def _graph(ckpt, text, seed):
+    return {
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": ckpt}},
+        "6": {"class_type": "CLIPTextEncode", "inputs": {"text": text, "clip": ["4", 1]}},
+        "3": {"class_type": "KSampler", "inputs": {"seed": seed, "model": ["4", 0], "positive": ["6", 0]}},
+    }
+
+
+def test_node_hashes_follow_upstream_changes():
+    a = node_hashes(_graph("sdxl", "cat", 1))
+    b = node_hashes(_graph("sdxl", "cat", 2))
+    c = node_hashes(_graph("sd15", "cat", 1))
+    assert a["4"] == b["4"] and a["6"] == b["6"] and a["3"] != b["3"]
+    # A different checkpoint invalidates everything downstream of the loader
+    assert not set(a.values()) & set(c.values())
+    patched = node_hashes(
+        _graph("sdxl", "cat", 1),
+        [{"op": "replace", "path": "/nodes/3/properties/seed", "value": 2}],
+    )
+    assert patched == b
+
+
+def test_fallback_signature_without_graph():
+    one = job_signature(None, workflow_id="wf", clean_prompt="cat", patches=[])
+    two = job_signature(None, workflow_id="wf", clean_prompt="cat", patches=[{"op": "replace", "path": "/x", "value": 1}])
+    assert len(one & two) == 2
+
+
+def test_pending_jobs_grouped_by_affinity_within_window():
+    sched = CacheAffinityScheduler(window=8, max_skips=4, concurrency=1)
+    sdxl = lambda seed: job_signature(_graph("sdxl", "cat", seed))
+    sd15 = lambda seed: job_signature(_graph("sd15", "dog", seed))
+    order = []
+
+    async def job(name, sig, hold=None):
+        async with sched.slot(name, sig):
+            order.append(name)
+            if hold is not None:
+                await hold.wait()
+            await asyncio.sleep(0)
+
+    async def run():
+        hold = asyncio.Event()
+        first = asyncio.create_task(job("a1", sdxl(1), hold))
+        await asyncio.sleep(0)
+        # Arrival order interleaves two users with different checkpoints
+        rest = [
+            asyncio.create_task(job(name, sig))
+            for name, sig in (("b1", sd15(1)), ("a2", sdxl(2)), ("b2", sd15(2)), ("a3", sdxl(3)))
+        ]
+        await asyncio.sleep(0)
+        assert sched.position("b1") == 0
+        hold.set()
+        await asyncio.gather(first, *rest)
+
+    asyncio.run(run())
+    assert order == ["a1", "a2", "a3", "b1", "b2"]
+    stats = sched.snapshot()
+    assert stats["reordered"] >= 1
+    assert stats["estimated_hit_rate"] > stats["fifo_estimated_hit_rate"]
+
+
+def test_skipped_job_runs_after_max_skips():
+    sched = CacheAffinityScheduler(window=8, max_skips=1, concurrency=1)
+    sig_a = job_signature(_graph("sdxl", "cat", 1))
+    sig_b = job_signature(_graph("sd15", "dog", 1))
+    order = []
+
+    async def job(name, sig, hold=None):
+        async with sched.slot(name, sig):
+            order.append(name)
+            if hold is not None:
+                await hold.wait()
+
+    async def run():
+        hold = asyncio.Event()
+        first = asyncio.create_task(job("a0", sig_a, hold))
+        await asyncio.sleep(0)
+        rest = [asyncio.create_task(job(n, s)) for n, s in (("b", sig_b), ("a1", sig_a), ("a2", sig_a))]
+        await asyncio.sleep(0)
+        hold.set()
+        await asyncio.gather(first, *rest)
+
+    asyncio.run(run())
+    assert order == ["a0", "a1", "b", "a2"]
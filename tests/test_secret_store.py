@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+import types
+
+from cryptography.fernet import Fernet
+
+from backend.secret_store import (
+    DbSecretBackend,
+    EnvSecretBackend,
+    FileSecretBackend,
+    SecretsProvider,
+    build_fernet,
+    create_secrets_provider,
+)
+
+
+class CountingCollection:
+    def __init__(self):
+        self.doc = None
+        self.reads = 0
+
+    async def find_one(self, query):
+        self.reads += 1
+        return self.doc
+
+    async def update_one(self, query, update, upsert=False):
+        self.doc = dict(self.doc or {}, **update["$set"])
+
+
+def test_key_is_read_from_the_store_once(monkeypatch):
+    monkeypatch.delenv("CIVITAI_API_KEY", raising=False)
+    db = types.SimpleNamespace(civitai_key=CountingCollection())
+    provider = create_secrets_provider(db, backend="db")
+
+    async def run():
+        assert await provider.get("civitai_key") is None
+        assert await provider.get("civitai_key") is None
+        assert db.civitai_key.reads == 1  # a missing key is cached too
+
+        await provider.set("civitai_key", "abc")
+        assert db.civitai_key.doc["key"] != "abc"
+        for _ in range(5):
+            assert await provider.get("civitai_key") == "abc"
+        assert db.civitai_key.reads == 1
+
+        db.civitai_key.doc = None  # e.g. a restore without a key
+        provider.invalidate()
+        assert await provider.get("civitai_key") is None
+        assert db.civitai_key.reads == 2
+
+        monkeypatch.setenv("CIVITAI_API_KEY", "from-env")
+        provider.invalidate()
+        assert await provider.get("civitai_key") == "from-env"
+        assert db.civitai_key.reads == 2
+
+    asyncio.run(run())
+    assert provider.snapshot()["backends"] == ["env", "db"]
+
+
+def test_old_keys_decrypt_until_rotated(tmp_path):
+    old, new = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+    path = str(tmp_path / "secrets.json")
+
+    async def run():
+        await FileSecretBackend(path, build_fernet(old, "")).store("civitai_key", "abc")
+        assert oct(os.stat(path).st_mode & 0o777) == "0o600"
+
+        rotating = SecretsProvider([FileSecretBackend(path, build_fernet(new, old))])
+        assert await rotating.get("civitai_key") == "abc"
+        assert await SecretsProvider([FileSecretBackend(path, build_fernet(new, ""))]).get("civitai_key") is None
+
+        assert await rotating.rotate() == ["civitai_key"]
+        token = json.loads(open(path).read())["civitai_key"]
+        assert Fernet(new.encode()).decrypt(token.encode()) == b"abc"
+        assert await SecretsProvider([FileSecretBackend(path, build_fernet(new, ""))]).get("civitai_key") == "abc"
+
+    asyncio.run(run())
+
+
+def test_cached_values_expire_with_ttl(monkeypatch):
+    monkeypatch.setenv("CJ_TEST_SECRET", "one")
+    provider = SecretsProvider([EnvSecretBackend({"token": "CJ_TEST_SECRET"})], ttl=0.05)
+
+    async def run():
+        assert await provider.get("token") == "one"
+        monkeypatch.setenv("CJ_TEST_SECRET", "two")
+        assert await provider.get("token") == "one"
+        await asyncio.sleep(0.06)
+        assert await provider.get("token") == "two"
+
+    asyncio.run(run())
+
+
+def test_stale_load_does_not_overwrite_a_newer_set():
+    collection = CountingCollection()
+    fernet = build_fernet(Fernet.generate_key().decode(), "")
+    provider = SecretsProvider([DbSecretBackend(types.SimpleNamespace(civitai_key=collection), fernet)])
+
+    async def run():
+        release = asyncio.Event()
+        original = collection.find_one
+
+        async def slow_find_one(query):
+            await release.wait()
+            return await original(query)
+
+        collection.find_one = slow_find_one
+        load = asyncio.create_task(provider.get("civitai_key"))
+        await asyncio.sleep(0)
+        await provider.set("civitai_key", "new")
+        collection.doc = None  # the slow read sees the store as it was
+        release.set()
+        assert await load is None
+        assert await provider.get("civitai_key") == "new"
+
+    asyncio.run(run())
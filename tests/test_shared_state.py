@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from backend.shared_state import LocalState, SQLiteState, create_shared_state
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_sqlite_state_is_seen_by_other_instances(tmp_path):
+    path = str(tmp_path / "state.db")
+    assert isinstance(create_shared_state(None), LocalState)
+
+    async def run():
+        a, b = SQLiteState(path), SQLiteState(path)
+        await a.publish_progress("job", {"job": {"status": "generating", "progress": 40}})
+        assert (await b.progress("job"))["job"]["progress"] == 40
+        assert await b.progress("other") is None
+        assert await b.progress_many(["job", "other"]) == {"job": {"job": {"status": "generating", "progress": 40}}}
+
+        await a.cache_set("k", {"items": [1, 2]})
+        assert await b.cache_get("k", ttl=60) == {"items": [1, 2]}
+        assert await b.cache_get("k", ttl=0) is None
+
+        waits = [await a.reserve("civitai", 1.0), await b.reserve("civitai", 1.0), await a.reserve("civitai", 1.0)]
+        assert waits[0] == 0 and 0.9 < waits[1] <= 1.0 and 1.9 < waits[2] <= 2.0
+        assert await a.lease("sync", "a", ttl=60) and await a.lease("sync", "a", ttl=60)
+        assert not await b.lease("sync", "b", ttl=60)
+        assert await a.lease("sync", "a", ttl=-1)  # renewed, but already expired
+        assert await b.lease("sync", "b", ttl=60)
+
+        await b.send_control("worker-a", "job", {"action": "cancel"})
+        assert await a.take_controls("worker-a") == [("job", {"action": "cancel"})]
+        assert await a.take_controls("worker-a") == []
+        await a.close()
+        await b.close()
+
+    asyncio.run(run())
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_worker(port, env):
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=str(ROOT),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _wait_ready(port, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        assert proc.poll() is None, "worker exited"
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health/ready").status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise AssertionError("worker did not become ready")
+
+
+def test_progress_streams_from_another_worker(tmp_path):
+    env = dict(
+        os.environ,
+        CJ_WORKERS="2",
+        CJ_SHARED_STATE=str(tmp_path / "state.db"),
+        DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}",
+        MONGO_URL="mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100",
+        DISABLE_CSRF="true",
+        CJ_HISTORY_SYNC_INTERVAL="0",
+        CJ_OBJECT_INFO_REFRESH="0",
+        CJ_SHARED_CONTROL_POLL="0.05",
+    )
+    ports = [_free_port(), _free_port()]
+    procs = [_start_worker(port, env) for port in ports]
+    try:
+        for port, proc in zip(ports, procs):
+            _wait_ready(port, proc)
+        owner, other = (f"http://127.0.0.1:{port}/api" for port in ports)
+        job_id = httpx.post(f"{owner}/generate", json={"prompt": "shared"}, timeout=10).json()["payload"]["job_id"]
+
+        statuses = []
+        with httpx.stream("GET", f"{other}/progress/stream/{job_id}", timeout=10) as stream:
+            for line in stream.iter_lines():
+                if line.startswith("data: "):
+                    message = json.loads(line[6:])
+                    assert "error" not in message
+                    statuses.append(message["job"]["status"])
+        assert statuses[-1] == "done" and "generating" in statuses
+
+        # Job control sent to the other worker is applied by the owner
+        job_id = httpx.post(f"{owner}/generate", json={"prompt": "stop me"}, timeout=10).json()["payload"]["job_id"]
+        moved = httpx.post(f"{other}/jobs/{job_id}/priority", json={"priority": 5}, timeout=10).json()["payload"]
+        assert moved["forwarded"] is True
+        cancelled = httpx.post(f"{other}/jobs/{job_id}/cancel", timeout=10).json()["payload"]
+        assert cancelled == {"job_id": job_id, "cancelled": True, "forwarded": True}
+        with httpx.stream("GET", f"{other}/progress/stream/{job_id}", timeout=10) as stream:
+            last = [json.loads(line[6:]) for line in stream.iter_lines() if line.startswith("data: ")][-1]
+        assert last["job"]["status"] == "cancelled" and last["job"]["priority"] == 5
+        assert httpx.post(f"{other}/jobs/{job_id}/cancel", timeout=10).status_code == 409
+        assert httpx.post(f"{other}/jobs/nope/cancel", timeout=10).status_code == 404
+
+        # A batch accepted by one worker streams from the other
+        batch = httpx.post(f"{owner}/generate/batch", json={"prompt": "grid", "count": 2}, timeout=10).json()["payload"]
+        with httpx.stream("GET", f"{other}/progress/batch/{batch['batch_id']}", timeout=10) as stream:
+            summaries = [json.loads(line[6:]) for line in stream.iter_lines() if line.startswith("data: ")]
+        assert all("error" not in s for s in summaries)
+        assert summaries[-1]["status"] == "done" and summaries[-1]["completed"] == 2
+        assert [j["job_id"] for j in summaries[-1]["jobs"]] == batch["job_ids"]
+        assert "batch_not_found" in httpx.get(f"{other}/progress/batch/nope", timeout=10).text
+
+        batch = httpx.post(f"{owner}/generate/batch", json={"prompt": "halt", "count": 2}, timeout=10).json()["payload"]
+        halted = httpx.post(f"{other}/generate/batch/{batch['batch_id']}/cancel", timeout=10).json()["payload"]
+        assert halted["forwarded"] == halted["cancelled"] == batch["job_ids"]
+        with httpx.stream("GET", f"{other}/progress/batch/{batch['batch_id']}", timeout=10) as stream:
+            last = [json.loads(line[6:]) for line in stream.iter_lines() if line.startswith("data: ")][-1]
+        assert {j["status"] for j in last["jobs"]} == {"cancelled"}
+
+        missing = httpx.get(f"{other}/progress/stream/nope", timeout=10).text
+        assert "job_not_found" in missing
+        state = httpx.get(f"{other}/maintenance/shared-state").json()["payload"]
+        assert state["backend"] == "sqlite" and state["reads"] > 0
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait(timeout=10)
@@ -0,0 +1,104 @@
+import os
+import sys
+import types
+import asyncio
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["DISABLE_CSRF"] = "true"
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+from PIL import Image
+from fastapi.testclient import TestClient
+from backend import thumbnails
+from backend.models import ImageOutput, Prompt, SessionLocal, init_db
+from backend.server import app
+
+init_db()
+client = TestClient(app)
+
+
+def _make_output(tmp_path, color=(200, 40, 40)):
+    src = tmp_path / "source.png"
+    Image.new("RGB", (640, 480), color).save(src)
+    with SessionLocal() as session:
+        prompt = Prompt(text="thumb test")
+        session.add(prompt)
+        session.flush()
+        out = ImageOutput(prompt_id=prompt.id, file_path=str(src))
+        session.add(out)
+        session.commit()
+        return out.id
+
+
+def test_blurhash_encode_solid_color():
+    value = thumbnails.blurhash_encode(Image.new("RGB", (16, 16), (255, 0, 0)))
+    # Reference output of the upstream blurhash encoder for the same image
+    assert value == "LKTI:j|cfQ|c|co1fQo1fQfQfQfQ"
+
+
+def test_thumbnail_endpoint_serves_cached_derivative(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnails, "THUMB_DIR", str(tmp_path / "thumbs"))
+    output_id = _make_output(tmp_path)
+
+    resp = client.get(f"/api/outputs/{output_id}/thumb?size=200&format=webp")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "image/webp"
+    assert "immutable" in resp.headers["cache-control"]
+    etag = resp.headers["etag"]
+    assert os.path.exists(thumbnails.derivative_path(output_id, 256, "webp"))
+
+    resp = client.get(
+        f"/api/outputs/{output_id}/thumb?size=200&format=webp",
+        headers={"If-None-Match": etag},
+    )
+    assert resp.status_code == 304
+
+    with SessionLocal() as session:
+        assert session.get(ImageOutput, output_id).blurhash
+
+    resp = client.get("/api/outputs/missing/thumb")
+    assert resp.status_code == 404
+    thumbnails.shutdown_pool()
+
+
+def test_corrupt_source_is_not_found(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnails, "THUMB_DIR", str(tmp_path / "thumbs"))
+    output_id = _make_output(tmp_path)
+    src = tmp_path / "source.png"
+    src.write_bytes(src.read_bytes()[:100])  # truncated mid-stream
+
+    assert client.get(f"/api/outputs/{output_id}/thumb?size=200&format=webp").status_code == 404
+    assert str(src) in thumbnails._unrenderable
+    src.write_bytes(b"not an image at all")
+    assert asyncio.run(thumbnails.generate_derivatives(output_id, str(src))) is None
+    thumbnails.shutdown_pool()
+
+
+def test_backfill_resumes_from_cursor(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnails, "THUMB_DIR", str(tmp_path / "thumbs"))
+    output_id = _make_output(tmp_path, color=(10, 120, 200))
+
+    state = asyncio.run(thumbnails.backfill_derivatives(batch_size=5))
+    assert state["done"] is True
+    assert state["cursor"] is not None
+    with SessionLocal() as session:
+        assert session.get(ImageOutput, output_id).blurhash
+
+    # A finished run leaves nothing pending and a rerun starts past the cursor
+    assert not thumbnails.backfill_pending()
+    processed = state["processed"]
+    state = asyncio.run(thumbnails.backfill_derivatives(batch_size=5))
+    assert state["processed"] == processed
+    thumbnails.shutdown_pool()
@@ -12,7 +12,10 @@ class DummyModel:
     def transcribe(self, path):
         return {"text": "hello world"}
 
+loads = []
+
 def load_model(name):
+    loads.append(name)
     return DummyModel()
 
 whisper_mod.load_model = load_model
@@ -31,3 +34,5 @@ def test_transcribe_endpoint():
     resp = client.post("/api/transcribe", files={"file": ("a.webm", b"0")})
     assert resp.status_code == 200
     assert resp.json()["payload"]["text"] == "hello world"
+    client.post("/api/transcribe", files={"file": ("b.webm", b"1")})
+    assert loads == ["base"]
@@ -0,0 +1,133 @@
+import asyncio
+import io
+import os
+import sys
+import types
+
+import httpx
+import pytest
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["DISABLE_CSRF"] = "true"
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+from backend import uploads
+from backend.models import init_db
+import backend.server as server
+
+init_db()
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+MASK = b"\x89PNG\r\n\x1a\n" + b"\xff" * 64
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    uploads._forwarded.clear()
+    return tmp_path
+
+
+def _spool(data):
+    return asyncio.run(uploads.spool_upload(UploadFile(io.BytesIO(data), filename="a.png")))
+
+
+def test_spool_dedupes_by_content_hash(upload_dir):
+    first = _spool(PNG)
+    second = _spool(PNG)
+    assert first["sha256"] == second["sha256"]
+    assert not first["deduplicated"] and second["deduplicated"]
+    assert first["content_type"] == "image/png"
+    assert sorted(os.listdir(upload_dir)) == [f"{first['sha256']}.png"]
+
+
+def test_spool_rejects_unknown_types_and_oversize(upload_dir, monkeypatch):
+    with pytest.raises(Exception) as exc:
+        _spool(b"not an image")
+    assert exc.value.status_code == 415
+    monkeypatch.setattr(uploads, "UPLOAD_MAX_BYTES", 10)
+    with pytest.raises(Exception) as exc:
+        _spool(PNG)
+    assert exc.value.status_code == 413
+    assert os.listdir(upload_dir) == []
+
+
+def test_forward_streams_raw_bytes_once():
+    seen = []
+
+    def handler(request):
+        body = request.read()
+        seen.append((request.url.path, body))
+        return httpx.Response(200, json={"name": "cj.png", "subfolder": "", "type": "input"})
+
+    stored = _spool(PNG)
+    stored_mask = _spool(MASK)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            ref = await uploads.forward_upload("http://comfy", stored, client=client)
+            again = await uploads.forward_upload("http://comfy", stored, client=client)
+            mask = await uploads.forward_upload(
+                "http://comfy", stored_mask, "mask", original_ref=ref, client=client
+            )
+        return ref, again, mask
+
+    ref, again, _ = asyncio.run(run())
+    assert ref == again == {"name": "cj.png", "subfolder": "", "type": "input"}
+    assert [path for path, _ in seen] == ["/upload/image", "/upload/mask"]
+    assert PNG in seen[0][1]
+    assert b'name="original_ref"' in seen[1][1]
+
+
+def test_upload_endpoint_and_multipart_generate(monkeypatch):
+    calls = []
+
+    async def fake_forward(base, stored, kind="image", original_ref=None, client=None):
+        calls.append((kind, stored["sha256"], original_ref))
+        return {"name": f"{kind}.png", "subfolder": "", "type": "input"}
+
+    monkeypatch.setattr(uploads, "forward_upload", fake_forward)
+    client = TestClient(server.app)
+
+    resp = client.post("/api/upload-image", files={"file": ("a.png", PNG, "image/png")})
+    info = resp.json()["payload"]
+    assert info["comfyui"]["name"] == "image.png"
+    assert "path" not in info
+
+    resp = client.post(
+        "/api/generate/multipart",
+        data={"prompt": "inpaint this"},
+        files={
+            "init_image": ("a.png", PNG, "image/png"),
+            "mask": ("m.png", MASK, "image/png"),
+        },
+    )
+    payload = resp.json()["payload"]
+    job = server.jobs[payload["job_id"]]
+    assert job["init_image"]["name"] == "image.png"
+    assert job["mask"]["name"] == "mask.png"
+    assert calls[-1][0] == "mask"
+    assert calls[-1][2] == {"name": "image.png", "subfolder": "", "type": "input"}
+
+    resp = client.post("/api/generate/multipart", data={"prompt": "x"},
+                       files={"mask": ("m.png", MASK, "image/png")})
+    assert resp.status_code == 400
+
+    for ref in ("[1]", '"image.png"', "3"):
+        resp = client.post("/api/upload-image", data={"kind": "mask", "original_ref": ref},
+                           files={"file": ("m.png", MASK, "image/png")})
+        assert resp.status_code == 422
@@ -0,0 +1,137 @@
+import sys
+import types
+from datetime import datetime, timedelta
+
+# stub jose/passlib/motor before importing auth
+jose_module = types.ModuleType("jose")
+jose_module.jwt = types.SimpleNamespace(encode=lambda *a, **k: "token", decode=lambda *a, **k: {})
+jose_module.JWTError = Exception
+sys.modules.setdefault("jose", jose_module)
+
+passlib_module = types.ModuleType("passlib")
+context_sub = types.ModuleType("passlib.context")
+class DummyCryptContext:
+    def __init__(self, *args, **kwargs):
+        pass
+    def verify(self, plain, hashed):
+        return plain == hashed
+    def hash(self, pwd):
+        return pwd
+context_sub.CryptContext = DummyCryptContext
+passlib_module.context = context_sub
+sys.modules.setdefault("passlib", passlib_module)
+sys.modules.setdefault("passlib.context", context_sub)
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+import backend.auth as _auth
+sys.modules.setdefault("auth", _auth)
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import backend.user_router as users
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(_matches(doc, sub) for sub in cond):
+                return False
+        elif isinstance(cond, dict):
+            if not doc.get(key) < cond["$lt"]:
+                return False
+        elif doc.get(key) != cond:
+            return False
+    return True
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+    def sort(self, keys):
+        for key, direction in reversed(keys):
+            self.docs.sort(key=lambda d: d[key], reverse=direction < 0)
+        return self
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+    async def to_list(self, n):
+        return self.docs[:n]
+
+
+class FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.projections = []
+    def find(self, query, projection=None):
+        self.projections.append(projection)
+        found = []
+        for doc in self.docs:
+            if _matches(doc, query):
+                found.append({k: v for k, v in doc.items() if not projection or projection.get(k, 1)})
+        return Cursor(found)
+    async def find_one(self, query, projection=None):
+        docs = await self.find(query, projection).to_list(1)
+        return docs[0] if docs else None
+
+
+base = datetime(2024, 1, 1)
+saved_images = FakeCollection(
+    {
+        "_id": object(),
+        "id": f"img{i:03d}",
+        "user_id": "u1" if i % 5 else "u2",
+        "url": f"http://x/{i}.png",
+        "created_at": base + timedelta(minutes=i // 2),
+        "parameters": {"seed": i},
+        "metadata": {"big": "x" * 100},
+    }
+    for i in range(60)
+)
+users.db = types.SimpleNamespace(saved_images=saved_images, users=FakeCollection())
+
+app = FastAPI()
+app.include_router(users.user_router)
+app.dependency_overrides[users.get_current_active_user] = lambda: _auth.UserInDB(
+    id="u1", username="alice", name="Alice", hashed_password="x"
+)
+
+
+def test_gallery_pages_with_cursor_and_projection():
+    client = TestClient(app)
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 10}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/api/users/images", params=params).json()["payload"]
+        for item in body["items"]:
+            assert "parameters" not in item and "metadata" not in item
+            assert "_id" not in item
+        seen.extend(item["id"] for item in body["items"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+
+    expected = sorted(
+        (d for d in saved_images.docs if d["user_id"] == "u1"),
+        key=lambda d: (d["created_at"], d["id"]),
+        reverse=True,
+    )
+    assert seen == [d["id"] for d in expected]
+    assert len(seen) == 48
+
+    detail = client.get(f"/api/users/images/{seen[0]}").json()["payload"]
+    assert detail["parameters"] == {"seed": int(seen[0][3:])}
+    assert client.get("/api/users/images/img000").status_code == 404
+    assert client.get("/api/users/images", params={"cursor": "bogus"}).status_code == 400
@@ -0,0 +1,229 @@
+import asyncio
+import os
+import sys
+import types
+
+import httpx
+import pytest
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["DISABLE_CSRF"] = "true"
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+from fastapi.testclient import TestClient
+from backend.models import init_db
+from backend.object_info import ObjectInfoCache
+from backend.workflow_compiler import CompileError, compile_workflow, content_hash
+import backend.server as server
+
+init_db()
+
+SCHEMAS = {
+    "CheckpointLoaderSimple": {
+        "input": {"required": {"ckpt_name": [["sdxl.safetensors"]]}},
+        "output": ["MODEL", "CLIP", "VAE"],
+    },
+    "CLIPTextEncode": {
+        "input": {"required": {"text": ["STRING", {"multiline": True}], "clip": ["CLIP"]}},
+        "output": ["CONDITIONING"],
+    },
+    "LoraLoader": {
+        "input": {
+            "required": {
+                "model": ["MODEL"],
+                "clip": ["CLIP"],
+                "lora_name": [["detail.safetensors"]],
+                "strength_model": ["FLOAT", {}],
+                "strength_clip": ["FLOAT", {}],
+            }
+        },
+        "output": ["MODEL", "CLIP"],
+    },
+    "KSampler": {
+        "input": {
+            "required": {
+                "model": ["MODEL"],
+                "seed": ["INT", {"control_after_generate": True}],
+                "steps": ["INT", {}],
+                "positive": ["CONDITIONING"],
+            }
+        },
+        "output": ["LATENT"],
+    },
+    "LoadImage": {
+        "input": {"required": {"image": [["cat.png"], {"image_upload": True}]}},
+        "output": ["IMAGE", "MASK"],
+    },
+    "PreviewImage": {"input": {"required": {"images": ["IMAGE"]}}, "output": []},
+}
+
+
+def _workflow():
+    return {
+        "nodes": [
+            {"id": 4, "type": "CheckpointLoaderSimple", "mode": 0, "widgets_values": ["sdxl.safetensors"],
+             "outputs": [{"type": "MODEL"}, {"type": "CLIP"}, {"type": "VAE"}]},
+            {"id": 10, "type": "LoraLoader", "mode": 4, "widgets_values": ["detail.safetensors", 1.0, 1.0],
+             "inputs": [{"name": "model", "type": "MODEL", "link": 1}, {"name": "clip", "type": "CLIP", "link": 2}],
+             "outputs": [{"type": "MODEL"}, {"type": "CLIP"}]},
+            {"id": 11, "type": "Reroute", "inputs": [{"name": "", "type": "*", "link": 4}],
+             "outputs": [{"type": "CLIP"}]},
+            {"id": 6, "type": "CLIPTextEncode", "mode": 0, "title": "Positive", "widgets_values": ["a cat"],
+             "inputs": [{"name": "clip", "type": "CLIP", "link": 5}]},
+            {"id": 12, "type": "PrimitiveNode", "widgets_values": [42, "fixed"], "outputs": [{"type": "INT"}]},
+            {"id": 3, "type": "KSampler", "mode": 0, "widgets_values": [7, "randomize", 20],
+             "inputs": [
+                 {"name": "model", "type": "MODEL", "link": 3},
+                 {"name": "positive", "type": "CONDITIONING", "link": 6},
+                 {"name": "seed", "type": "INT", "widget": {"name": "seed"}, "link": 7},
+             ]},
+            {"id": 20, "type": "LoadImage", "mode": 2, "widgets_values": ["cat.png", "image"]},
+            {"id": 21, "type": "PreviewImage", "mode": 0, "inputs": [{"name": "images", "type": "IMAGE", "link": 8}]},
+            {"id": 30, "type": "Note", "widgets_values": ["remember the seed"]},
+        ],
+        "links": [
+            [1, 4, 0, 10, 0, "MODEL"],
+            [2, 4, 1, 10, 1, "CLIP"],
+            [3, 10, 0, 3, 0, "MODEL"],
+            [4, 10, 1, 11, 0, "CLIP"],
+            [5, 11, 0, 6, 0, "CLIP"],
+            [6, 6, 0, 3, 1, "CONDITIONING"],
+            [7, 12, 0, 3, 2, "INT"],
+            [8, 20, 0, 21, 0, "IMAGE"],
+        ],
+    }
+
+
+def test_compile_resolves_links_widgets_and_modes():
+    graph = compile_workflow(_workflow(), SCHEMAS.get)
+    assert set(graph) == {"4", "6", "3", "21"}
+    assert graph["4"]["inputs"] == {"ckpt_name": "sdxl.safetensors"}
+    # Bypassed LoRA passes model and clip through; the reroute disappears
+    assert graph["3"]["inputs"]["model"] == ["4", 0]
+    assert graph["6"]["inputs"] == {"text": "a cat", "clip": ["4", 1]}
+    assert graph["6"]["_meta"] == {"title": "Positive"}
+    # The primitive wins over the widget value; the seed control value is skipped
+    assert graph["3"]["inputs"]["seed"] == 42 and graph["3"]["inputs"]["steps"] == 20
+    # Inputs fed by muted nodes are dropped
+    assert graph["21"]["inputs"] == {}
+
+
+def test_compile_rejects_unknown_nodes():
+    data = _workflow()
+    data["nodes"].append({"id": 40, "type": "MysteryNode", "mode": 0})
+    with pytest.raises(CompileError, match="MysteryNode"):
+        compile_workflow(data, SCHEMAS.get)
+    assert content_hash({"a": 1, "b": 2}) == content_hash({"b": 2, "a": 1})
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"nodes": [{"id": 1, "type": "KSampler"}], "links": [[1]]},
+        {"nodes": [{"id": 1, "type": "KSampler", "inputs": [None]}], "links": []},
+        {"nodes": [{"id": 1, "type": "KSampler", "widgets_values": 5}], "links": []},
+        {"nodes": [{"id": 1, "type": "KSampler", "inputs": [{"name": "model", "link": 1}]}], "links": [[[1], 2, 0]]},
+    ],
+)
+def test_compile_rejects_malformed_workflows(data):
+    with pytest.raises(CompileError, match="malformed"):
+        compile_workflow(data, SCHEMAS.get)
+
+
+def test_upload_stores_compiled_graph(monkeypatch):
+    base = server.COMFYUI_INSTANCES[0]
+    cache = ObjectInfoCache(base)
+
+    async def load():
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, json=SCHEMAS))
+        async with httpx.AsyncClient(transport=transport) as client:
+            await cache.refresh(client)
+
+    asyncio.run(load())
+    monkeypatch.setitem(server.object_info_caches, base, cache)
+    monkeypatch.setattr(server, "compiled_graphs", server.CompiledGraphCache())
+    client = TestClient(server.app)
+
+    data = _workflow()
+    first = client.post("/api/relational/workflows/upload", json={"name": "ui.json", "data": data})
+    assert first.json()["payload"]["compiled"] is True
+    second = client.post("/api/relational/workflows/upload", json={"name": "copy.json", "data": data})
+    assert server.compiled_graphs.stats == {"hits": 1, "compiled": 1, "errors": 0}
+    assert server.compiled_graphs.snapshot()["entries"] == 1
+
+    wf_id = second.json()["payload"]["id"]
+    server._workflow_graphs.pop(wf_id, None)
+    compiled = client.get(f"/api/relational/workflows/{wf_id}/compiled").json()["payload"]
+    assert compiled["3"]["inputs"]["seed"] == 42
+
+    bad = dict(data, nodes=data["nodes"] + [{"id": 40, "type": "MysteryNode", "mode": 0}])
+    res = client.post("/api/relational/workflows/upload", json={"name": "bad.json", "data": bad})
+    assert res.json()["payload"]["compiled"] is False
+    assert "MysteryNode" in res.json()["payload"]["compile_error"]
+    bad_id = res.json()["payload"]["id"]
+    assert client.get(f"/api/relational/workflows/{bad_id}/compiled").status_code == 404
+
+    malformed = {"nodes": [{"id": 1, "type": "KSampler", "widgets_values": 5}], "links": []}
+    res = client.post("/api/relational/workflows/upload", json={"name": "odd.json", "data": malformed})
+    assert res.status_code == 200 and res.json()["payload"]["compiled"] is False
+
+
+def test_graph_cache_follows_creates_and_other_workers():
+    client = TestClient(server.app)
+    wf_id = "wf-created-later"
+    assert client.get(f"/api/relational/workflows/{wf_id}/compiled").status_code == 404
+
+    graph = {"1": {"class_type": "KSampler", "inputs": {"seed": 1}}}
+    res = client.post("/api/relational/workflows", json={"id": wf_id, "name": "later", "data": graph})
+    assert res.status_code == 200
+    assert client.get(f"/api/relational/workflows/{wf_id}/compiled").json()["payload"] == graph
+
+    # Another worker saves a new version: its revision mark invalidates this copy
+    changed = {"1": {"class_type": "KSampler", "inputs": {"seed": 2}}}
+
+    async def save_elsewhere():
+        async with server.AsyncSessionLocal() as session:
+            wf = await session.get(server.Workflow, wf_id)
+            wf.data = server.json.dumps(changed)
+            await session.commit()
+        await server.shared_state.cache_set(server._revision_key(wf_id), "elsewhere")
+
+    asyncio.run(save_elsewhere())
+    assert client.get(f"/api/relational/workflows/{wf_id}/compiled").json()["payload"] == changed
+    client.delete(f"/api/relational/workflows/{wf_id}")
+
+
+def test_saving_does_not_wait_for_cold_schemas(monkeypatch):
+    base = server.COMFYUI_INSTANCES[0]
+    cache = ObjectInfoCache(base)
+    fetches = []
+
+    async def unreachable(client=None):
+        fetches.append(True)
+        await asyncio.Event().wait()  # a ComfyUI that never answers
+
+    monkeypatch.setattr(cache, "refresh", unreachable)
+    monkeypatch.setitem(server.object_info_caches, base, cache)
+    monkeypatch.setattr(server, "compiled_graphs", server.CompiledGraphCache())
+
+    async def save():
+        key, graph = await asyncio.wait_for(server._compile_workflow(_workflow(), wait=False), 1)
+        assert key and graph is None
+        await asyncio.sleep(0)
+        assert fetches  # fetched in the background for later compiles
+        for task in list(server._background):
+            task.cancel()
+
+    asyncio.run(save())
@@ -0,0 +1,116 @@
+import os
+import sys
+import types
+import asyncio
+import uuid
+
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ["DISABLE_CSRF"] = "true"
+
+motor_module = types.ModuleType("motor")
+motor_asyncio = types.ModuleType("motor.motor_asyncio")
+
+class DummyClient:
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_database(self, name):
+        return types.SimpleNamespace()
+
+motor_asyncio.AsyncIOMotorClient = DummyClient
+sys.modules["motor"] = motor_module
+sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+from sqlalchemy import select
+from fastapi.testclient import TestClient
+from backend.models import AsyncSessionLocal, ImageOutput, Prompt, dispose_async_engine, init_db
+from backend.server import app
+from backend.write_behind import WriteBehindQueue, write_queue
+
+init_db()
+client = TestClient(app)
+
+
+async def _stored(model, ids):
+    async with AsyncSessionLocal() as session:
+        rows = (await session.scalars(select(model).where(model.id.in_(ids)))).all()
+    return {r.id for r in rows}
+
+
+def test_rows_coalesce_into_one_batch():
+    async def run():
+        queue = WriteBehindQueue(interval_ms=10_000, max_rows=3)
+        prompt = await queue.add(Prompt, text="batched")
+        output = await queue.add(ImageOutput, prompt_id=prompt["id"], file_path="x.png")
+        assert prompt["id"] and prompt["created_at"]
+        assert await _stored(Prompt, [prompt["id"]]) == set()
+        assert queue.get_pending(ImageOutput, output["id"])["prompt_id"] == prompt["id"]
+
+        # Reaching max_rows wakes the flusher without waiting for the interval
+        third = await queue.add(Prompt, text="batched")
+        for _ in range(50):
+            if not queue.pending(Prompt):
+                break
+            await asyncio.sleep(0.01)
+        assert await _stored(Prompt, [prompt["id"], third["id"]]) == {prompt["id"], third["id"]}
+        assert await _stored(ImageOutput, [output["id"]]) == {output["id"]}
+        assert queue.stats["batches"] == 1
+        assert queue.stats["rows_written"] == 3
+        await queue.stop()
+        await dispose_async_engine()
+
+    asyncio.run(run())
+
+
+def test_stop_flushes_and_updates_apply_before_commit():
+    async def run():
+        queue = WriteBehindQueue(interval_ms=10_000, max_rows=100)
+        prompt = await queue.add(Prompt, text="shutdown")
+        output = await queue.add(ImageOutput, prompt_id=prompt["id"], file_path="y.png")
+        assert await queue.update_pending(ImageOutput, output["id"], blurhash="LKTI")
+        assert queue.snapshot()["pending"] == 2
+        await queue.stop()
+        assert queue.snapshot()["pending"] == 0
+        assert not await queue.update_pending(ImageOutput, output["id"], blurhash="other")
+        async with AsyncSessionLocal() as session:
+            stored = await session.get(ImageOutput, output["id"])
+        await dispose_async_engine()
+        return stored
+
+    stored = asyncio.run(run())
+    assert stored.blurhash == "LKTI"
+
+
+def test_rejected_row_is_dead_lettered_without_blocking_the_rest():
+    async def run():
+        queue = WriteBehindQueue(interval_ms=10_000, max_rows=100)
+        good = await queue.add(Prompt, text="kept")
+        bad = await queue.add(ImageOutput, prompt_id=good["id"], file_path=None)
+        later = await queue.add(ImageOutput, prompt_id=good["id"], file_path="z.png")
+        assert await queue.flush() == 3
+        snapshot = queue.snapshot()
+        assert snapshot["pending"] == 0
+        assert snapshot["dead_lettered"] == 1 and snapshot["rows_written"] == 2
+        assert queue.dead_letters[0]["row"]["id"] == bad["id"]
+        assert await _stored(ImageOutput, [bad["id"], later["id"]]) == {later["id"]}
+        await queue.stop()
+        await dispose_async_engine()
+
+    asyncio.run(run())
+
+
+def test_endpoints_read_their_own_writes(monkeypatch):
+    monkeypatch.setattr(write_queue, "interval", 10_000)
+    monkeypatch.setattr(write_queue, "_task", None)
+    resp = client.post("/api/generate", json={"prompt": f"own-write {uuid.uuid4()}"})
+    job_id = resp.json()["payload"]["job_id"]
+
+    prompts = client.get("/api/relational/prompts").json()["payload"]
+    assert [p for p in prompts if p["id"] == job_id]
+    outputs = client.get("/api/relational/outputs").json()["payload"]
+    assert [o for o in outputs if o["prompt_id"] == job_id]
+
+    status = client.get("/api/maintenance/write-behind").json()["payload"]
+    assert status["pending"] >= 1
+    assert status["oldest_pending_ms"] >= 0
+    asyncio.run(write_queue.stop())
+    assert write_queue.snapshot()["pending"] == 0